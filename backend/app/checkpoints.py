@@ -0,0 +1,137 @@
+"""
+Resuming interrupted training runs and limiting the checkpoints they keep.
+
+ultralytics writes `<exp_dir>/train/weights/last.pt` after every epoch and strips
+the optimizer state from it when training finishes, so a `last.pt` that still has
+a non-negative epoch belongs to a run that died and can be continued with
+`resume=True`. CheckpointRetention keeps `last.pt`, `best.pt` and the N best
+`epoch<E>.pt` snapshots by validation fitness; the fitness of every snapshot is
+recorded in `weights/checkpoints.json` so the ranking survives a resume.
+"""
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from parameters import RESULTS_DIR
+
+logger = logging.getLogger("backend")
+RANKING_FILE = "checkpoints.json"
+
+
+def checkpoint_state(path: Path) -> Optional[Dict[str, Any]]:
+    """Progress and training arguments stored in a checkpoint, or None if unreadable."""
+    from ultralytics.utils.patches import torch_load
+
+    try:
+        ckpt = torch_load(str(path), map_location="cpu")
+    except Exception:
+        return None
+    args = ckpt.get("train_args") or {}
+    epoch = ckpt.get("epoch", -1)
+    return {
+        "path": str(path),
+        "experiment_dir": str(Path(path).parents[2]),
+        "resumable": epoch is not None and epoch >= 0,
+        "epochs_done": epoch + 1 if epoch is not None and epoch >= 0 else None,
+        "epochs": args.get("epochs"),
+        "img_size": args.get("imgsz"),
+        "batch_size": args.get("batch"),
+        "device": args.get("device"),
+        "best_fitness": ckpt.get("best_fitness"),
+        "modified": Path(path).stat().st_mtime,
+    }
+
+
+def find_last_checkpoint(exp_dir) -> Optional[Path]:
+    """Newest resumable `*/weights/last.pt` under an experiment dir."""
+    candidates = sorted(Path(exp_dir).glob("*/weights/last.pt"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in candidates:
+        state = checkpoint_state(path)
+        if state is not None and state["resumable"]:
+            return path
+    return None
+
+
+def list_resumable(model_name: Optional[str] = None, root: str = RESULTS_DIR) -> List[Dict[str, Any]]:
+    """Resumable runs under `root`, newest first."""
+    out = []
+    pattern = f"{model_name}_*" if model_name else "*"
+    for exp_dir in Path(root).glob(pattern):
+        last = find_last_checkpoint(exp_dir) if exp_dir.is_dir() else None
+        if last is not None:
+            out.append(checkpoint_state(last))
+    return sorted(out, key=lambda s: s["modified"], reverse=True)
+
+
+def resolve_resume(resume: str, model_name: str, restrict_to: Optional[str] = RESULTS_DIR) -> Path:
+    """
+    last.pt to continue from: `latest` (newest resumable `<model_name>_*` run), an experiment
+    dir (relative to RESULTS_DIR) or a last.pt path. With `restrict_to`, the checkpoint must
+    live under that directory. Raises ValueError when there is nothing to resume.
+    """
+    if resume == "latest":
+        runs = list_resumable(model_name)
+        if not runs:
+            raise ValueError(f"No interrupted '{model_name}' run to resume in {RESULTS_DIR}.")
+        return Path(runs[0]["path"])
+    path = Path(resume)
+    if not path.is_absolute():
+        path = Path(RESULTS_DIR) / path
+    path = path.resolve()
+    if restrict_to is not None and not path.is_relative_to(Path(restrict_to).resolve()):
+        raise ValueError(f"Resume path must be inside {restrict_to}.")
+    last = path if path.is_file() else find_last_checkpoint(path)
+    if last is None:
+        raise ValueError(f"No resumable last.pt in '{resume}'.")
+    state = checkpoint_state(last)
+    if state is None or not state["resumable"]:
+        raise ValueError(f"'{last}' is from a finished run; start a new run instead.")
+    return last
+
+
+class CheckpointRetention:
+    """Keep the `keep_best` highest-fitness epoch snapshots next to last.pt and best.pt."""
+
+    def __init__(self, keep_best: int):
+        self.keep_best = max(0, keep_best)
+
+    def attach(self, model) -> None:
+        model.add_callback("on_model_save", self.on_model_save)
+        model.add_callback("on_train_end", self.on_train_end)
+
+    @staticmethod
+    def _load_ranking(wdir: Path) -> Dict[str, float]:
+        try:
+            return json.loads((wdir / RANKING_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def on_model_save(self, trainer) -> None:
+        wdir = Path(trainer.wdir)
+        ranking = self._load_ranking(wdir)
+        name = f"epoch{trainer.epoch}.pt"
+        ranking[name] = float(trainer.fitness or 0.0)
+        keep = set(sorted(ranking, key=ranking.get, reverse=True)[: self.keep_best])
+        if name in keep and not (wdir / name).exists():
+            shutil.copyfile(trainer.last, wdir / name)
+        # also prunes snapshots written by ultralytics' own save_period
+        for path in wdir.glob("epoch*.pt"):
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
+        ranking = {k: v for k, v in ranking.items() if k in keep}
+        tmp = wdir / f"{RANKING_FILE}.tmp"
+        tmp.write_text(json.dumps(ranking, indent=2), encoding="utf-8")
+        os.replace(tmp, wdir / RANKING_FILE)
+
+    def on_train_end(self, trainer) -> None:
+        """Drop optimizer state from the kept snapshots, as ultralytics does for last/best."""
+        from ultralytics.utils.torch_utils import strip_optimizer
+
+        for path in Path(trainer.wdir).glob("epoch*.pt"):
+            try:
+                strip_optimizer(path)
+            except Exception:
+                logger.warning("could not strip optimizer from %s", path)
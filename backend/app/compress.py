@@ -0,0 +1,289 @@
+"""
+Lightweight "lite" segmentation model for CPU serving, distilled from best.pt.
+
+1. distill: a narrower copy of the teacher architecture (width_multiple scaled
+   down) is trained with ultralytics' feature distillation (`distill_model`).
+2. prune (optional): structured channel pruning of the channels that feed a
+   single consumer -- the hidden channels of every C2f bottleneck, the inner
+   convs of the box/class/mask-coefficient heads and the prototype branch --
+   ranked by BatchNorm scale (network slimming). Channels on residual, split
+   or concat paths are left alone, so no shape outside a pruned pair changes.
+3. fine-tune: the pruned network is trained as-is (PrunedSegmentationTrainer
+   keeps it instead of rebuilding it from its unpruned yaml), again distilled.
+
+`compare_models` reports per-image latency and test-split sensitivity/Dice of
+teacher and student, written to `<exp_dir>/compression.json`.
+"""
+import copy
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+import yaml
+from torch import nn
+from ultralytics import YOLO
+from ultralytics.models.yolo.segment import SegmentationTrainer
+from ultralytics.nn.modules.block import Bottleneck, Proto
+from ultralytics.nn.modules.conv import Conv
+from ultralytics.nn.modules.head import Detect, Segment
+
+import parameters
+from parameters import (
+    CONF_TH,
+    CUSTOM_MODEL_WEIGHTS,
+    IOU_TH,
+    LITE_FINETUNE_EPOCHS,
+    LITE_PRUNE_RATIO,
+    LITE_WIDTH_RATIO,
+    MIN_MASK_AREA,
+    TRAIN_DEVICE,
+)
+from .device import resolve_device
+from .utils import experiment_dir, save_metrics
+
+
+class PrunedSegmentationTrainer(SegmentationTrainer):
+    """Trains a pruned checkpoint as-is instead of re-creating it from its (unpruned) yaml."""
+
+    def get_model(self, cfg=None, weights=None, verbose=True):
+        if isinstance(weights, nn.Module):
+            return self.set_model_names_for_load(weights)
+        return super().get_model(cfg, weights, verbose)
+
+
+def write_student_yaml(teacher: str, out_path: Path, width_ratio: float, depth_ratio: float = 1.0) -> Path:
+    """Teacher architecture with width/depth multiples scaled by the given ratios."""
+    model = YOLO(teacher).model
+    cfg = copy.deepcopy(model.yaml)
+    depth, width, max_channels = 1.0, 1.0, None
+    scales = cfg.pop("scales", None)
+    if scales:
+        depth, width, max_channels = scales[cfg.get("scale") or next(iter(scales))]
+    else:
+        depth, width = cfg.get("depth_multiple", 1.0), cfg.get("width_multiple", 1.0)
+    for key in ("scale", "yaml_file"):
+        cfg.pop(key, None)
+    cfg["depth_multiple"] = depth * depth_ratio
+    cfg["width_multiple"] = width * width_ratio
+    if max_channels is not None:
+        cfg["max_channels"] = max_channels
+    cfg["nc"] = len(model.names)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(yaml.safe_dump(cfg, sort_keys=False), encoding="utf-8")
+    return out_path
+
+
+def _keep_count(channels: int, ratio: float, multiple: int = 8) -> int:
+    keep = int(round(channels * (1.0 - ratio) / multiple)) * multiple
+    return int(min(channels, max(multiple, keep)))
+
+
+def _prune_pair(producer: Conv, consumer: nn.Module, ratio: float) -> int:
+    """Drop the producer's lowest-|gamma| output channels and the matching consumer inputs."""
+    bn = producer.bn
+    n = bn.num_features
+    keep_n = _keep_count(n, ratio)
+    if keep_n >= n or getattr(consumer, "groups", 1) != 1 or getattr(producer.conv, "groups", 1) != 1:
+        return 0
+    keep = torch.argsort(bn.weight.detach().abs(), descending=True)[:keep_n].sort().values
+
+    conv = producer.conv
+    conv.weight = nn.Parameter(conv.weight.data[keep].clone())
+    if conv.bias is not None:
+        conv.bias = nn.Parameter(conv.bias.data[keep].clone())
+    conv.out_channels = keep_n
+    bn.weight = nn.Parameter(bn.weight.data[keep].clone())
+    bn.bias = nn.Parameter(bn.bias.data[keep].clone())
+    bn.running_mean = bn.running_mean[keep].clone()
+    bn.running_var = bn.running_var[keep].clone()
+    bn.num_features = keep_n
+
+    target = consumer.conv if isinstance(consumer, Conv) else consumer
+    # Conv2d weights are (out, in, k, k); ConvTranspose2d weights are (in, out, k, k)
+    dim = 0 if isinstance(target, nn.ConvTranspose2d) else 1
+    target.weight = nn.Parameter(target.weight.data.index_select(dim, keep).clone())
+    target.in_channels = keep_n
+    return n - keep_n
+
+
+def prunable_pairs(model: nn.Module) -> List[tuple]:
+    """(producer Conv, consumer) pairs whose shared channels feed nothing else."""
+    pairs = []
+    for module in model.modules():
+        if isinstance(module, Bottleneck):
+            pairs.append((module.cv1, module.cv2))
+        elif isinstance(module, Proto):
+            pairs.append((module.cv1, module.upsample))
+            pairs.append((module.cv2, module.cv3))
+        elif isinstance(module, Detect):
+            branches = [module.cv2, module.cv3] + ([module.cv4] if isinstance(module, Segment) else [])
+            for branch in branches:
+                for seq in branch:
+                    layers = list(seq)
+                    for a, b in zip(layers, layers[1:]):
+                        if isinstance(a, Conv) and isinstance(b, (Conv, nn.Conv2d)):
+                            pairs.append((a, b))
+    return pairs
+
+
+def prune_model(model: nn.Module, ratio: float) -> Dict[str, int]:
+    """Structured pruning in place; returns parameter counts before and after."""
+    before = sum(p.numel() for p in model.parameters())
+    removed = sum(_prune_pair(a, b, ratio) for a, b in prunable_pairs(model))
+    after = sum(p.numel() for p in model.parameters())
+    return {"params_before": before, "params_after": after, "channels_removed": removed}
+
+
+def prune_checkpoint(weights: str, ratio: float, out_path: Path) -> Dict[str, Any]:
+    """Prune a trained checkpoint and save it in a form YOLO() and the pruned trainer load."""
+    model = YOLO(weights).model.float()
+    stats = prune_model(model, ratio)
+    for p in model.parameters():
+        p.requires_grad = False
+    torch.save({"model": model, "train_args": dict(getattr(model, "args", {}) or {})}, out_path)
+    return {**stats, "path": str(out_path)}
+
+
+def _latency_ms(model: YOLO, images: List[np.ndarray], img_size: int, warmup: int = 3) -> float:
+    kwargs = dict(imgsz=img_size, conf=CONF_TH, iou=IOU_TH, verbose=False, retina_masks=False)
+    for image in images[:warmup]:
+        model.predict(image, **kwargs)
+    start = time.perf_counter()
+    for image in images:
+        model.predict(image, **kwargs)
+    return (time.perf_counter() - start) / max(1, len(images)) * 1000.0
+
+
+def compare_models(
+    teacher: str,
+    student: str,
+    img_size: int,
+    data_yaml: Optional[str] = None,
+    split: str = "test",
+    latency_images: int = 32,
+) -> Dict[str, Any]:
+    """Latency per image and split metrics (sensitivity, Dice) for teacher and student."""
+    import cv2
+    from yolotrainer.custom_predictor import YoloPredictor
+    from yolotrainer.dataset_index import get_index
+    from yolotrainer.evaluation import evaluate_split
+
+    index = get_index(parameters.DATASET_DIR)
+    data_yaml = data_yaml or (str(index.data_yaml) if index.data_yaml else None)
+    split_key = "val" if split in ("valid", "val") else split
+    images_dirs = index.splits.get(split_key, {}).get("images_dirs", [])
+    paths = sorted(p for d in images_dirs for p in Path(d).iterdir())[:latency_images]
+    images = [img for img in (cv2.imread(str(p)) for p in paths) if img is not None]
+
+    report: Dict[str, Any] = {"img_size": img_size, "split": split, "latency_images": len(images)}
+    for name, weights in (("teacher", teacher), ("student", student)):
+        model = YOLO(weights)
+        entry: Dict[str, Any] = {
+            "weights": weights,
+            "params": sum(p.numel() for p in model.model.parameters()),
+            "latency_ms": _latency_ms(model, images, img_size) if images else None,
+        }
+        if data_yaml and images:
+            result = evaluate_split(
+                YoloPredictor(model=model),
+                data_yaml,
+                split=split,
+                img_size=img_size,
+                conf_th=CONF_TH,
+                iou_th=IOU_TH,
+                min_mask_area=MIN_MASK_AREA,
+            )
+            entry["sensitivity"] = result["image_level"]["sensitivity"]
+            entry["specificity"] = result["image_level"]["specificity"]
+            entry["mean_dice"] = result["segmentation"]["mean_dice"]
+        report[name] = entry
+    if report["teacher"]["latency_ms"] and report["student"]["latency_ms"]:
+        report["speedup"] = report["teacher"]["latency_ms"] / report["student"]["latency_ms"]
+    return report
+
+
+def train_lite_model(
+    epochs: int,
+    batch_size: int,
+    img_size: int,
+    device: str = TRAIN_DEVICE,
+    teacher: Optional[str] = None,
+    width_ratio: float = LITE_WIDTH_RATIO,
+    prune_ratio: float = LITE_PRUNE_RATIO,
+    finetune_epochs: int = LITE_FINETUNE_EPOCHS,
+    evaluate: bool = True,
+    on_epoch: Optional[Callable[[Dict[str, Any]], None]] = None,
+    keep_checkpoints: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Distill (and optionally prune + fine-tune) a lite student; same result shape as train_model.
+    The result is not installed: point LITE_MODEL_WEIGHTS at `best_model_path` to serve it.
+    """
+    from .train_predict import train_model
+
+    teacher = teacher or CUSTOM_MODEL_WEIGHTS
+    if not Path(teacher).exists():
+        raise ValueError(f"Teacher weights '{teacher}' not found; the lite model is distilled from them.")
+    if not 0.0 <= prune_ratio < 1.0:
+        raise ValueError("prune_ratio must be in [0, 1).")
+    device = resolve_device(device)
+
+    exp_dir = Path(experiment_dir("lite"))
+    student_yaml = write_student_yaml(teacher, exp_dir / "student.yaml", width_ratio)
+    common = dict(batch_size=batch_size, img_size=img_size, device=device, on_epoch=on_epoch,
+                  keep_checkpoints=keep_checkpoints)
+    stages: Dict[str, Any] = {}
+
+    out = train_model(
+        "lite",
+        epochs=epochs,
+        exp_dir=str(exp_dir / "distill"),
+        weights=str(student_yaml),
+        overrides={"distill_model": teacher},
+        **common,
+    )
+    stages["distill"] = {"epochs": epochs, "best_model_path": out["best_model_path"]}
+
+    if prune_ratio > 0:
+        stages["prune"] = prune_checkpoint(out["best_model_path"], prune_ratio, exp_dir / "pruned.pt")
+        if finetune_epochs > 0:
+            out = train_model(
+                "lite",
+                epochs=finetune_epochs,
+                exp_dir=str(exp_dir / "finetune"),
+                weights=stages["prune"]["path"],
+                trainer=PrunedSegmentationTrainer,
+                overrides={"distill_model": teacher},
+                **common,
+            )
+            stages["finetune"] = {"epochs": finetune_epochs, "best_model_path": out["best_model_path"]}
+        else:
+            out = {**out, "best_model_path": stages["prune"]["path"]}
+
+    final = exp_dir / "best_lite.pt"
+    shutil.copyfile(out["best_model_path"], final)
+    metrics = {
+        "model_name": "lite",
+        "epochs": epochs,
+        "img_size": img_size,
+        "batch_size": batch_size,
+        "device": device,
+        "teacher": teacher,
+        "width_ratio": width_ratio,
+        "prune_ratio": prune_ratio,
+        "finetune_epochs": finetune_epochs,
+        "stages": stages,
+    }
+    if evaluate:
+        metrics["comparison"] = compare_models(teacher, str(final), img_size)
+    (exp_dir / "compression.json").write_text(json.dumps(metrics, indent=2), encoding="utf-8")
+    return {
+        "experiment_dir": str(exp_dir),
+        "best_model_path": str(final),
+        "metrics": metrics,
+        "metrics_path": save_metrics(metrics, str(exp_dir)),
+    }
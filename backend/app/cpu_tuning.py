@@ -0,0 +1,92 @@
+"""
+CPU thread and core-affinity settings for inference.
+
+OMP/MKL variables are read once when torch's native libraries initialise, so
+`apply_thread_env` must run before the first `import torch`; the torch thread
+counts and core pinning are applied when a model is loaded (or per forked
+worker in backend.app.serving).
+"""
+import logging
+import os
+import sys
+from typing import List, Optional
+
+from parameters import (
+    INFER_INTEROP_THREADS,
+    INFER_PIN_CORES,
+    INFER_SET_OMP_ENV,
+    INFER_THREADS,
+    SERVE_WORKERS,
+)
+
+logger = logging.getLogger("backend")
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        return list(range(os.cpu_count() or 1))
+
+
+def default_threads(workers: int = SERVE_WORKERS) -> int:
+    """INFER_THREADS if set, otherwise the usable cores split evenly across workers."""
+    if INFER_THREADS > 0:
+        return INFER_THREADS
+    return max(1, len(available_cores()) // max(1, workers))
+
+
+def cores_for_worker(slot: int, workers: int, cores: Optional[List[int]] = None) -> List[int]:
+    """Contiguous, non-overlapping slice of the usable cores for worker `slot`."""
+    cores = cores if cores is not None else available_cores()
+    workers = max(1, workers)
+    if workers >= len(cores):
+        return [cores[slot % len(cores)]]
+    per = len(cores) // workers
+    return cores[slot * per:(slot + 1) * per]
+
+
+def apply_thread_env(threads: Optional[int] = None) -> None:
+    """Default OMP/MKL/OpenBLAS pool sizes; explicit environment variables win."""
+    if not INFER_SET_OMP_ENV:
+        return
+    if "torch" in sys.modules:
+        logger.debug("torch already imported; OMP/MKL thread env left unchanged")
+        return
+    value = str(threads or default_threads())
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, value)
+
+
+def apply_torch_threads(threads: Optional[int] = None, interop_threads: Optional[int] = None) -> int:
+    import torch
+
+    threads = threads or default_threads()
+    torch.set_num_threads(threads)
+    interop_threads = INFER_INTEROP_THREADS if interop_threads is None else interop_threads
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only allowed before the inter-op pool starts; keep whatever is running.
+            logger.debug("inter-op thread pool already started; keeping %d", torch.get_num_interop_threads())
+    return threads
+
+
+def pin_worker(slot: int, workers: int) -> Optional[List[int]]:
+    """Restrict this process to its core slice when INFER_PIN_CORES is on."""
+    if not INFER_PIN_CORES or not hasattr(os, "sched_setaffinity"):
+        return None
+    cores = cores_for_worker(slot, workers)
+    os.sched_setaffinity(0, cores)
+    return cores
+
+
+def configure_worker(slot: Optional[int] = None, workers: int = SERVE_WORKERS, threads: Optional[int] = None) -> dict:
+    """Apply pinning (when the worker slot is known) and torch thread counts for this process."""
+    cores = pin_worker(slot, workers) if slot is not None else None
+    if threads is None and cores:
+        threads = INFER_THREADS if INFER_THREADS > 0 else len(cores)
+    applied = apply_torch_threads(threads or default_threads(workers))
+    return {"threads": applied, "cores": cores}
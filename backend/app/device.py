@@ -0,0 +1,111 @@
+"""
+Device and precision selection for inference and training, with CPU fallback.
+
+`resolve_device` maps auto / cpu / cuda[:N] / N / mps to a device present on this
+machine; an accelerator that is not there falls back to CPU with a warning, so
+the same configuration runs on CPU-only hosts. `resolve_precision` enables
+reduced precision only where the hardware runs it natively: fp16 on CUDA (auto)
+or MPS (explicit), bf16 on CUDA with bf16 support or on CPUs with AVX512-BF16 /
+AMX. torch is imported on first use.
+"""
+import logging
+from typing import Any, Dict, Union
+
+from parameters import INFER_CHANNELS_LAST, INFER_COMPILE, INFER_DEVICE, INFER_PRECISION
+
+logger = logging.getLogger("backend")
+PRECISIONS = ("auto", "fp32", "fp16", "bf16")
+
+
+def cpu_supports_bf16() -> bool:
+    """Native bf16 matmul/conv on this CPU (Linux /proc/cpuinfo flags)."""
+    try:
+        with open("/proc/cpuinfo", "r", encoding="ascii", errors="ignore") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def _mps_available(torch) -> bool:
+    backend = getattr(torch.backends, "mps", None)
+    return bool(backend is not None and backend.is_available())
+
+
+def resolve_device(requested: str = "auto") -> str:
+    """
+    Device string usable by torch and ultralytics. Multi-GPU training lists ("0,1") are
+    kept as given when CUDA is present. Raises ValueError for an unknown device name.
+    """
+    import torch
+
+    req = (requested or "auto").strip().lower()
+    if req == "auto":
+        if torch.cuda.is_available():
+            return "cuda:0"
+        return "mps" if _mps_available(torch) else "cpu"
+    if req == "cpu":
+        return "cpu"
+    if req == "mps":
+        if _mps_available(torch):
+            return "mps"
+    elif req.startswith("cuda") or req.replace(",", "").isdigit():
+        ids = req.split(":", 1)[1] if req.startswith("cuda:") else ("0" if req == "cuda" else req)
+        if torch.cuda.is_available() and all(int(i) < torch.cuda.device_count() for i in ids.split(",")):
+            return f"cuda:{ids}" if "," not in ids else ids
+    else:
+        raise ValueError(f"Unknown device '{requested}'. Use auto, cpu, cuda[:N], N or mps.")
+    logger.warning("device %s is not available here; falling back to cpu", requested)
+    return "cpu"
+
+
+def resolve_precision(requested: str, device: str) -> str:
+    """fp32, fp16 or bf16 for `device`; unsupported reduced precision falls back to fp32."""
+    import torch
+
+    req = (requested or "auto").strip().lower()
+    if req not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{requested}'. Use one of {list(PRECISIONS)}.")
+    kind = device.split(":")[0]
+    if req == "auto":
+        return "fp16" if kind == "cuda" else "fp32"
+    if req == "fp16" and kind == "cpu":
+        supported = False
+    elif req == "bf16" and kind == "cuda":
+        supported = torch.cuda.is_bf16_supported()
+    elif req == "bf16":
+        supported = kind == "cpu" and cpu_supports_bf16()
+    else:
+        supported = True
+    if not supported:
+        logger.warning("%s is not supported natively on %s; using fp32", req, device)
+        return "fp32"
+    return req
+
+
+def parse_compile(value: Union[str, bool, None]) -> Union[bool, str]:
+    """False, True or a torch.compile mode name (e.g. reduce-overhead)."""
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    text = value.strip().lower()
+    if text in ("", "0", "false", "no", "off"):
+        return False
+    if text in ("1", "true", "yes", "on"):
+        return True
+    return text
+
+
+def inference_options(
+    device: str = INFER_DEVICE,
+    precision: str = INFER_PRECISION,
+    channels_last: bool = INFER_CHANNELS_LAST,
+    compile: Union[str, bool] = INFER_COMPILE,
+) -> Dict[str, Any]:
+    """Resolved YoloPredictor keyword arguments for this machine."""
+    resolved = resolve_device(device)
+    return {
+        "device": resolved,
+        "precision": resolve_precision(precision, resolved),
+        "channels_last": bool(channels_last),
+        "compile": parse_compile(compile),
+    }
@@ -0,0 +1,368 @@
+"""
+Background jobs (batch prediction, training) with Server-Sent Events progress.
+
+Each job keeps its most recent JOB_EVENT_HISTORY events, so a client can
+subscribe late or reconnect with Last-Event-ID and receive what it missed before
+the live events; older events are dropped (the final `done` event still carries
+the job result). Events can be published from worker threads (training) as well
+as from the event loop.
+
+Jobs live in the process that started them. Under the pre-fork server a request
+for a job can reach another worker, so there `jobs.share()` also writes job rows
+and events to a SQLite file; a worker that does not own a job answers from it and
+streams its events by polling.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from parameters import JOB_EVENT_HISTORY
+
+TERMINAL_EVENTS = ("done", "failed")
+KEEPALIVE_SECONDS = 15.0
+POLL_SECONDS = 0.5  # event polling for jobs owned by another worker
+EVENT_HISTORY = max(1, JOB_EVENT_HISTORY)
+
+
+class JobEvent:
+    __slots__ = ("seq", "name", "data")
+
+    def __init__(self, seq: int, name: str, data: Dict[str, Any]):
+        self.seq = seq
+        self.name = name
+        self.data = data
+
+    def sse(self) -> str:
+        return f"id: {self.seq}\nevent: {self.name}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class Job:
+    def __init__(self, kind: str, total: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "running"
+        self.total = total
+        self.completed = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: Deque[JobEvent] = deque(maxlen=EVENT_HISTORY)
+        self.seq = 0  # events published so far; ids keep counting past the history cap
+        self.task = None  # keeps the asyncio task / thread driving the job alive
+        self.log: Optional["SharedJobLog"] = None
+        self._lock = threading.Lock()
+        self._subscribers: List[tuple] = []
+
+    def publish(self, name: str, data: Dict[str, Any], advance: bool = False) -> None:
+        with self._lock:
+            if advance:
+                self.completed += 1
+            self.updated_at = time.time()
+            self.seq += 1
+            event = JobEvent(self.seq, name, data)
+            self.events.append(event)
+            if self.log is not None:
+                self.log.add_event(self, event)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def finish(self, result: Optional[Dict[str, Any]] = None) -> None:
+        self.result = result
+        self.status = "done"
+        self.publish("done", {"result": result})
+
+    def fail(self, error: str) -> None:
+        self.error = error
+        self.status = "failed"
+        self.publish("failed", {"error": error})
+
+    def subscribe(self, last_event_id: int = 0) -> asyncio.Queue:
+        """
+        Queue receiving every retained event after `last_event_id`, backlog first. A finished
+        job with nothing newer to send repeats its terminal event. Call from the event loop.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            backlog = [event for event in self.events if event.seq > last_event_id]
+            if not backlog and self.events and self.events[-1].name in TERMINAL_EVENTS:
+                backlog = [self.events[-1]]
+            for event in backlog:
+                queue.put_nowait(event)
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not queue]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "events": self.seq,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    async def stream(self, last_event_id: int = 0) -> AsyncIterator[str]:
+        """SSE frames for this job until it finishes, with keep-alive comments while idle."""
+        queue = self.subscribe(last_event_id)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.sse()
+                if event.name in TERMINAL_EVENTS:
+                    return
+        finally:
+            self.unsubscribe(queue)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedJobLog:
+    """Job rows and events in SQLite, readable by every worker of a pre-fork server."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        total INTEGER,
+        completed INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        result_json TEXT,
+        error TEXT,
+        owner_pid INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS job_events (
+        job_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        data_json TEXT NOT NULL,
+        PRIMARY KEY (job_id, seq)
+    );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def reset(self) -> None:
+        """Create the schema and forget jobs of earlier server runs. Call before forking."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            conn.execute("DELETE FROM job_events")
+            conn.execute("DELETE FROM jobs")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread: events are written from the loop and from job threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def add_job(self, job: Job) -> None:
+        conn = self._db()
+        conn.execute(
+            "INSERT INTO jobs (id, kind, status, total, completed, created_at, updated_at, owner_pid)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.kind, job.status, job.total, job.completed, job.created_at, job.updated_at, os.getpid()),
+        )
+        conn.commit()
+
+    def add_event(self, job: Job, event: JobEvent) -> None:
+        conn = self._db()
+        conn.execute(
+            "INSERT INTO job_events (job_id, seq, name, data_json) VALUES (?, ?, ?, ?)",
+            (job.id, event.seq, event.name, json.dumps(event.data)),
+        )
+        conn.execute("DELETE FROM job_events WHERE job_id = ? AND seq <= ?", (job.id, event.seq - EVENT_HISTORY))
+        conn.execute(
+            "UPDATE jobs SET status = ?, completed = ?, updated_at = ?, result_json = ?, error = ? WHERE id = ?",
+            (job.status, job.completed, job.updated_at, json.dumps(job.result), job.error, job.id),
+        )
+        conn.commit()
+
+    def prune(self, max_jobs: int) -> None:
+        conn = self._db()
+        conn.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status != 'running'"
+            " ORDER BY created_at ASC LIMIT MAX(0, (SELECT COUNT(*) FROM jobs) - ?))",
+            (max_jobs,),
+        )
+        conn.execute("DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)")
+        conn.commit()
+
+    def load(self, job_id: str) -> Optional["RemoteJob"]:
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return RemoteJob(self, row) if row is not None else None
+
+    def running(self, kind: str) -> Optional["RemoteJob"]:
+        rows = self._db().execute(
+            "SELECT * FROM jobs WHERE kind = ? AND status = 'running' ORDER BY created_at", (kind,)
+        ).fetchall()
+        return next((job for job in (RemoteJob(self, row) for row in rows) if job.status == "running"), None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        rows = self._db().execute("SELECT * FROM jobs ORDER BY created_at DESC").fetchall()
+        return [RemoteJob(self, row).snapshot() for row in rows]
+
+    def events(self, job_id: str, after: int) -> List[JobEvent]:
+        rows = self._db().execute(
+            "SELECT seq, name, data_json FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after),
+        ).fetchall()
+        return [JobEvent(row["seq"], row["name"], json.loads(row["data_json"])) for row in rows]
+
+    def last_event(self, job_id: str) -> Optional[JobEvent]:
+        row = self._db().execute(
+            "SELECT seq, name, data_json FROM job_events WHERE job_id = ? ORDER BY seq DESC LIMIT 1", (job_id,)
+        ).fetchone()
+        return JobEvent(row["seq"], row["name"], json.loads(row["data_json"])) if row is not None else None
+
+
+class RemoteJob:
+    """Read-only view of a job owned by another worker, as last written to the shared log."""
+
+    def __init__(self, log: SharedJobLog, row: sqlite3.Row):
+        self.log = log
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.status = row["status"]
+        self.total = row["total"]
+        self.completed = row["completed"]
+        self.created_at = row["created_at"]
+        self.updated_at = row["updated_at"]
+        self.result = json.loads(row["result_json"]) if row["result_json"] else None
+        self.error = row["error"]
+        self.owner_pid = row["owner_pid"]
+        if self.status == "running" and not _pid_alive(self.owner_pid):
+            self.status = "failed"
+            self.error = "The worker running this job exited."
+
+    def snapshot(self) -> Dict[str, Any]:
+        events = self.log._db().execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?", (self.id,)
+        ).fetchone()[0]
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "events": events,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    async def stream(self, last_event_id: int = 0) -> AsyncIterator[str]:
+        """SSE frames polled from the shared log until the job finishes or its worker exits."""
+        last, idle = last_event_id, 0.0
+        final = await asyncio.to_thread(self.log.last_event, self.id)
+        if final is not None and final.name in TERMINAL_EVENTS and final.seq <= last:
+            yield final.sse()  # already finished and the client has seen everything
+            return
+        while True:
+            events = await asyncio.to_thread(self.log.events, self.id, last)
+            for event in events:
+                yield event.sse()
+                last = event.seq
+                if event.name in TERMINAL_EVENTS:
+                    return
+            if not events and not _pid_alive(self.owner_pid):
+                yield JobEvent(last + 1, "failed", {"error": "The worker running this job exited."}).sse()
+                return
+            idle = 0.0 if events else idle + POLL_SECONDS
+            if idle >= KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(POLL_SECONDS)
+
+
+class JobRegistry:
+    """Recent jobs, oldest finished ones dropped beyond `max_jobs`."""
+
+    def __init__(self, max_jobs: int = 50):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.log: Optional[SharedJobLog] = None
+
+    def share(self, path: str) -> None:
+        """Publish jobs through a SQLite log at `path` (pre-fork serving). Call before forking."""
+        self.log = SharedJobLog(path)
+        self.log.reset()
+
+    def create(self, kind: str, total: Optional[int] = None) -> Job:
+        job = Job(kind, total=total)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j.id for j in self._jobs.values() if j.status != "running"]
+            for job_id in finished[: max(0, len(self._jobs) - self.max_jobs)]:
+                del self._jobs[job_id]
+        if self.log is not None:
+            job.log = self.log
+            self.log.add_job(job)
+            self.log.prune(self.max_jobs)
+        return job
+
+    def get(self, job_id: str):
+        """The local Job, else (pre-fork) a RemoteJob view of another worker's job, else None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.log is not None:
+            job = self.log.load(job_id)
+        return job
+
+    def running(self, kind: str):
+        with self._lock:
+            job = next((j for j in self._jobs.values() if j.kind == kind and j.status == "running"), None)
+        if job is None and self.log is not None:
+            job = self.log.running(kind)
+        return job
+
+    def list(self) -> List[Dict[str, Any]]:
+        if self.log is not None:
+            return self.log.list()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.snapshot() for j in reversed(jobs)]
+
+
+jobs = JobRegistry()
@@ -1,53 +1,69 @@
-import shutil
-from pathlib import Path
+import asyncio
 import logging
 import base64
 import io
-import datetime
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Response
+import json
+import threading
+import time
+from contextlib import nullcontext
+from functools import partial
+from typing import List
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from PIL import Image
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-from .schemas import TrainRequest, TrainResponse, PredictResult, ReportRequest
-from .train_predict import train_model
+
+from .schemas import TrainRequest, TrainResponse, PredictResult, ReportRequest, StudyReportRequest
 from .models import registry
-from .utils import safe_filename, dataset_ready, dataset_path, dataset_dir
+from .jobs import jobs
+from .utils import safe_filename, dataset_ready, dataset_path, dataset_dir, dataset_splits
 from .routers import router as misc_router
-from yolotrainer.custom_predictor import YoloPredictor
+from .store import content_hash, get_store, params_key
+from .profiling import artifact_path, open_profile, requested_mode
+from .scheduler import AdmissionError, get_scheduler, normalize_priority
+from .singleflight import SingleFlight
+from .device import resolve_device
+from .metrics import (
+    REGISTRY as METRICS,
+    CACHE_HITS_TOTAL,
+    DETECTIONS_TOTAL,
+    ERRORS_TOTAL,
+    GATE_INFO,
+    GATE_TOTAL,
+    MODEL_INFO,
+    PREDICTIONS_TOTAL,
+    PROCESS_RSS,
+    REQUEST_SECONDS,
+    REQUESTS_TOTAL,
+    observe_stage_ms,
+    process_rss_bytes,
+    stage,
+)
+from yolotrainer.custom_predictor import YoloPredictor, encode_png, load_image_bgr
+from yolotrainer.mask_codec import MASK_FORMATS, format_instances
 from parameters import (
-    RESULTS_DIR,
-    CUSTOM_MODEL_WEIGHTS,
     CONF_TH,
     IOU_TH,
     MIN_MASK_AREA,
     DEBUG,
     IMG_SIZE,
+    PREVIEW_MAX_SIDE,
+    CALIBRATED,
+    CALIBRATION_FILE,
+    DEFAULT_MODEL,
+    GATE_IMG_SIZE,
+    GATE_THRESHOLD,
+    REPORT_MAX_SLICES,
+    REPORT_WORKERS,
+    SCHED_FORWARDED_HOPS,
+    TRAIN_KEEP_CHECKPOINTS,
 )
 
 app = FastAPI(title="YOLOv12 Brain Tumor Segmentation API")
 logger = logging.getLogger("backend")
 DISPLAY_MODEL_NAME = "Brain MRI Segmentation"
-PDF_FONT = "Helvetica"
-
-def _init_pdf_font() -> None:
-    global PDF_FONT
-    candidates = [
-        Path("C:/Windows/Fonts/DejaVuSans.ttf"),
-        Path("C:/Windows/Fonts/Arial.ttf"),
-    ]
-    for path in candidates:
-        if path.exists():
-            name = path.stem
-            pdfmetrics.registerFont(TTFont(name, str(path)))
-            PDF_FONT = name
-            return
+_inflight = SingleFlight()
 
-_init_pdf_font()
 
 def _decode_data_url(data_url: str) -> Image.Image | None:
     if not data_url:
@@ -62,33 +78,6 @@ def _decode_data_url(data_url: str) -> Image.Image | None:
     except Exception:
         return None
 
-def _draw_image_block(c: canvas.Canvas, title: str, image: Image.Image, y: float) -> float:
-    page_w, page_h = A4
-    margin = 50
-    if image is None:
-        return y
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, title)
-    y -= 14
-
-    max_w = page_w - margin * 2
-    max_h = (page_h - margin * 2) / 2.2
-    w, h = image.size
-    scale = min(max_w / w, max_h / h, 1.0)
-    draw_w = w * scale
-    draw_h = h * scale
-
-    if y - draw_h < margin:
-        c.showPage()
-        y = page_h - margin
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(margin, y, title)
-        y -= 14
-
-    c.drawImage(ImageReader(image), margin, y - draw_h, width=draw_w, height=draw_h)
-    return y - draw_h - 24
-
 
 @app.get("/")
 def root():
@@ -105,6 +94,31 @@ app.add_middleware(
 
 app.include_router(misc_router)
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        endpoint = _endpoint_label(request)
+        REQUESTS_TOTAL.inc(endpoint=endpoint, status="500")
+        ERRORS_TOTAL.inc(endpoint=endpoint, kind="server")
+        raise
+    endpoint = _endpoint_label(request)
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    REQUESTS_TOTAL.inc(endpoint=endpoint, status=str(response.status_code))
+    if response.status_code >= 500:
+        ERRORS_TOTAL.inc(endpoint=endpoint, kind="server")
+    elif response.status_code >= 400:
+        ERRORS_TOTAL.inc(endpoint=endpoint, kind="client")
+    return response
+
+
+def _endpoint_label(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
 @app.get("/health")
 def health():
     try:
@@ -113,94 +127,72 @@ def health():
     except Exception:
         gpu_available = False
     try:
-        model_names = getattr(registry.get("custom"), "names", None)
+        model_names = getattr(registry.get(), "names", None)
     except Exception:
         model_names = None
 
     return {
         "status": "ok",
-        "models": ["custom"],
-        "weights": {"custom": CUSTOM_MODEL_WEIGHTS},
-        "model_status": {"custom": registry.status()},
+        "models": registry.names(),
+        "default_model": DEFAULT_MODEL,
+        "weights": {name: registry.weights_path(name) for name in registry.names()},
+        # only the default model is loaded here; the others report whether their weights exist
+        "model_status": {name: registry.status(name, load=name == DEFAULT_MODEL) for name in registry.names()},
         "model_names": model_names,
         "conf_th": CONF_TH,
         "iou_th": IOU_TH,
         "min_mask_area": MIN_MASK_AREA,
+        "calibration_file": CALIBRATION_FILE if CALIBRATED else None,
+        "gate": _gate_status(),
         "img_size": IMG_SIZE,
         "dataset_ready": dataset_ready(),
         "dataset_path": dataset_path(),
         "dataset_dir": dataset_dir(),
+        "dataset_splits": dataset_splits(),
         "gpu_available": gpu_available,
+        "inference": registry.device_config,
+        "cpu": registry.cpu_config,
     }
 
+def _decode_image_bytes(raw: bytes | None) -> Image.Image | None:
+    if not raw:
+        return None
+    try:
+        return Image.open(io.BytesIO(raw)).convert("RGB")
+    except Exception:
+        return None
+
+
 @app.post("/report")
 def report_endpoint(req: ReportRequest):
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    page_w, page_h = A4
-    margin = 50
-    y = page_h - margin
-
-    c.setFont(PDF_FONT, 16)
-    c.drawString(margin, y, "Izvještaj segmentacije")
-    y -= 26
-
-    c.setFont(PDF_FONT, 11)
-    ts = datetime.datetime.now().strftime("%d.%m.%Y. %H:%M")
-    lines = [
-        f"Datum: {ts}",
-        f"Datoteka: {req.filename}",
-        f"Model: {req.model_used}",
-        f"Tumor detektiran: {'Da' if req.has_tumor else 'Ne'}",
-    ]
-    for line in lines:
-        c.drawString(margin, y, line)
-        y -= 16
-
-    original = _decode_data_url(req.image_original)
-    overlay = _decode_data_url(req.image_overlay) if req.image_overlay else None
-
-    if original and overlay:
-        y -= 10
-        max_w = (page_w - margin * 2 - 20) / 2
-        max_h = (page_h - margin * 2) / 2.0
-        ow, oh = original.size
-        ow_scale = min(max_w / ow, max_h / oh, 1.0)
-        ow_draw = ow * ow_scale
-        oh_draw = oh * ow_scale
-        vw, vh = overlay.size
-        vw_scale = min(max_w / vw, max_h / vh, 1.0)
-        vw_draw = vw * vw_scale
-        vh_draw = vh * vw_scale
-
-        row_h = max(oh_draw, vh_draw)
-        if y - row_h < margin:
-            c.showPage()
-            y = page_h - margin
-
-        c.setFont(PDF_FONT, 11)
-        c.drawString(margin, y, "Izvorna slika")
-        c.drawString(margin + max_w + 20, y, "Segmentacija")
-        y -= 12
-        c.drawImage(ImageReader(original), margin, y - oh_draw, width=ow_draw, height=oh_draw)
-        c.drawImage(
-            ImageReader(overlay),
-            margin + max_w + 20,
-            y - vh_draw,
-            width=vw_draw,
-            height=vh_draw,
+    if req.prediction_id:
+        store = get_store()
+        record = store.get(req.prediction_id) if store is not None else None
+        if record is None:
+            raise HTTPException(status_code=404, detail="Prediction not found.")
+        req = req.model_copy(
+            update={
+                "filename": req.filename or record["filename"],
+                "model_used": record["model_used"] or req.model_used,
+                "conf_th": record["conf_th"],
+                "iou_th": record["iou_th"],
+                "min_mask_area": record["min_mask_area"],
+                "has_tumor": record["has_tumor"],
+                "confidence": record["confidence"],
+                "description": record["description"] or "",
+            }
         )
-        y -= row_h + 10
+        original = _decode_image_bytes(store.read_blob(record["image_hash"]))
+        overlay = _decode_image_bytes(store.read_blob(record["overlay_hash"]))
     else:
-        if original:
-            y = _draw_image_block(c, "Izvorna slika", original, y)
-        if overlay:
-            y = _draw_image_block(c, "Segmentacija", overlay, y)
+        if not req.image_original:
+            raise HTTPException(status_code=400, detail="Provide prediction_id or image_original.")
+        original = _decode_data_url(req.image_original)
+        overlay = _decode_data_url(req.image_overlay) if req.image_overlay else None
 
-    c.showPage()
-    c.save()
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
+    from .report import render_report_pdf
+
+    pdf_bytes = render_report_pdf(req, original, overlay)
 
     safe_name = safe_filename(req.filename)
     filename = f"izvjestaj_{safe_name or 'predikcija'}.pdf"
@@ -208,100 +200,492 @@ def report_endpoint(req: ReportRequest):
     return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
 
-@app.post("/train", response_model=TrainResponse)
-def train_endpoint(req: TrainRequest):
+def _iter_file(f, chunk_size: int = 64 * 1024):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class _FileStreamingResponse(StreamingResponse):
+    """Streams an open temp file and closes it when the response ends, including on disconnect."""
+
+    def __init__(self, f, **kwargs):
+        super().__init__(_iter_file(f), **kwargs)
+        self._file = f
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # a disconnect cancels the stream without closing the generator, so close the file here
+            self._file.close()
+
+
+@app.post("/report/study")
+async def study_report_endpoint(req: StudyReportRequest):
+    """One PDF for many stored predictions: summary table, thumbnails, positive slices in full."""
+    ids = list(dict.fromkeys(req.prediction_ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Provide at least one prediction_id.")
+    if len(ids) > REPORT_MAX_SLICES:
+        raise HTTPException(status_code=400, detail=f"At most {REPORT_MAX_SLICES} predictions per report.")
+    store = get_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Prediction store is disabled.")
+    records = [await asyncio.to_thread(store.get, pid) for pid in ids]
+    missing = [pid for pid, record in zip(ids, records) if record is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Predictions not found: {missing}")
+
+    from .report import render_study_pdf
+
+    pdf = await asyncio.to_thread(render_study_pdf, req.study, records, store.read_blob, REPORT_WORKERS)
+    filename = f"izvjestaj_{safe_filename(req.study) or 'studija'}.pdf"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    return _FileStreamingResponse(pdf, media_type="application/pdf", headers=headers)
+
+
+def _validate_train_request(req: TrainRequest) -> None:
     if req.epochs < 1 or req.epochs > 500:
         raise HTTPException(status_code=400, detail="Epochs must be between 1 and 500.")
     if req.batch_size < 1 or req.batch_size > 128:
         raise HTTPException(status_code=400, detail="Batch size must be between 1 and 128.")
     if req.img_size < 64 or req.img_size > 2048:
         raise HTTPException(status_code=400, detail="Image size must be between 64 and 2048.")
+    if req.keep_checkpoints is not None and not 0 <= req.keep_checkpoints <= 50:
+        raise HTTPException(status_code=400, detail="keep_checkpoints must be between 0 and 50.")
     try:
-        out = train_model(
-            model_name=req.model_name,
-            epochs=req.epochs,
-            batch_size=req.batch_size,
-            img_size=req.img_size,
-            device=req.device,
-        )
+        resolve_device(req.device)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    from .train_predict import COMPRESSED_MODELS
 
-    return TrainResponse(
+    if req.resume and req.model_name in COMPRESSED_MODELS:
+        raise HTTPException(status_code=400, detail=f"A '{req.model_name}' run cannot be resumed; start a new one.")
+
+
+def _resume_checkpoint(req: TrainRequest):
+    """Checkpoint state of the run named by req.resume (confined to RESULTS_DIR), or None."""
+    if not req.resume:
+        return None
+    from .checkpoints import checkpoint_state, resolve_resume
+
+    try:
+        return checkpoint_state(resolve_resume(req.resume, req.model_name))
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+def _train_kwargs(req: TrainRequest, resume_state) -> dict:
+    return dict(
         model_name=req.model_name,
         epochs=req.epochs,
+        batch_size=req.batch_size,
+        img_size=req.img_size,
+        device=req.device,
+        resume=resume_state["path"] if resume_state else None,
+        keep_checkpoints=TRAIN_KEEP_CHECKPOINTS if req.keep_checkpoints is None else req.keep_checkpoints,
+    )
+
+
+def _train_response(req: TrainRequest, out: dict) -> TrainResponse:
+    return TrainResponse(
+        model_name=req.model_name,
+        epochs=out["metrics"]["epochs"],
         best_model_path=out["best_model_path"],
         metrics_path=out["metrics_path"],
         metrics=out["metrics"],
     )
 
 
-@app.post("/predict", response_model=PredictResult)
-async def predict_endpoint(
-    model_choice: str = Form("custom"),
-    conf_th: float = Form(None),
-    iou_th: float = Form(None),
-    file: UploadFile = File(...),
-):
-    if model_choice != "custom":
-        raise HTTPException(status_code=400, detail="Only custom model is allowed for inference.")
-    if file.content_type not in ("image/jpeg", "image/png", "image/jpg"):
-        raise HTTPException(status_code=400, detail="Only image files are supported.")
+@app.post("/train", response_model=TrainResponse)
+def train_endpoint(req: TrainRequest):
+    _validate_train_request(req)
+    resume_state = _resume_checkpoint(req)
+    from .train_predict import train_model
+
+    try:
+        out = train_model(**_train_kwargs(req, resume_state))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    return _train_response(req, out)
+
 
-    tmp_dir = Path(RESULTS_DIR) / "uploads"
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-    safe_name = safe_filename(file.filename)
-    tmp_path = tmp_dir / safe_name
+@app.post("/train/jobs", status_code=202)
+def train_job_endpoint(req: TrainRequest):
+    """
+    Start training in the background; per-epoch metrics stream from GET /jobs/{job_id}/events.
+    With `resume`, progress starts at the epochs already completed by the interrupted run.
+    """
+    _validate_train_request(req)
+    if jobs.running("train") is not None:
+        raise HTTPException(status_code=409, detail="A training job is already running.")
+    resume_state = _resume_checkpoint(req)
+    from .train_predict import train_model
 
-    with tmp_path.open("wb") as f:
-        shutil.copyfileobj(file.file, f)
+    total = resume_state["epochs"] if resume_state else req.epochs
+    job = jobs.create("train", total=total)
+    if resume_state:
+        job.completed = resume_state["epochs_done"]
 
+    def _train():
+        try:
+            out = train_model(
+                **_train_kwargs(req, resume_state),
+                on_epoch=lambda m: job.publish("final_eval" if m["final"] else "epoch", m, advance=not m["final"]),
+            )
+        except Exception as exc:
+            logger.exception("train job failed job=%s", job.id)
+            job.fail(str(exc))
+            return
+        job.finish(_train_response(req, out).model_dump())
+
+    job.task = threading.Thread(target=_train, name=f"train-{job.id[:8]}", daemon=True)
+    job.task.start()
+    return {"job_id": job.id, "total": total, "events_url": f"/jobs/{job.id}/events"}
+
+
+@app.get("/train/checkpoints")
+def train_checkpoints(model_name: str = "custom"):
+    """Interrupted runs that POST /train or /train/jobs can continue with `resume`."""
+    from .checkpoints import list_resumable
+    from .train_predict import COMPRESSED_MODELS
+
+    return {"resumable": [] if model_name in COMPRESSED_MODELS else list_resumable(model_name)}
+
+
+def _run_predict_pipeline(predictor: YoloPredictor, raw: bytes, conf: float, iou: float, profile=None):
+    """
+    Decode -> model -> tumor rule -> RLE masks + preview overlay PNG.
+
+    The Results object (full-resolution mask tensors, original image) is reduced to a
+    LeanResult right after the tumor rule and freed before rendering, so peak memory
+    per request is one model output instead of model output + overlay + PNG buffers.
+    """
+    model_stage = profile.model_stage() if profile is not None else nullcontext()
+    with stage("decode"):
+        try:
+            image = load_image_bgr(raw)
+        except Exception as exc:
+            raise HTTPException(status_code=400, detail="Uploaded file is not a readable image.") from exc
+
+    gate_score = None
+    if GATE_THRESHOLD > 0:
+        with stage("gate"):
+            gate_score = float(predictor.gate_scores([image], img_size=GATE_IMG_SIZE)[0])
+        if gate_score < GATE_THRESHOLD:
+            GATE_TOTAL.inc(outcome="bypassed")
+            return _gated_result(gate_score)
+        GATE_TOTAL.inc(outcome="passed")
+
+    with model_stage:
+        result = predictor.predict_image(
+            image,
+            img_size=IMG_SIZE,
+            conf_th=conf,
+            iou_th=iou,
+            retina_masks=True,
+            max_det=50,
+        )
+    speed = getattr(result, "speed", None) or {}
+    observe_stage_ms("preprocess", speed.get("preprocess"))
+    observe_stage_ms("model_forward", speed.get("inference"))
+    observe_stage_ms("nms", speed.get("postprocess"))
+
+    with stage("postprocess"):
+        has_tumor, conf_out, debug_info = predictor.decide(
+            result,
+            predictor._resolve_tumor_class_idx(default_idx=0),
+            MIN_MASK_AREA,
+        )
+    if gate_score is not None:
+        debug_info["gate_score"] = gate_score
+    with stage("mask_encode"):
+        lean = predictor.to_lean(result, debug_info.get("kept_indices", []), PREVIEW_MAX_SIDE)
+    predictor.release(result)
+    del result, image
+    with stage("overlay_render"):
+        overlay = predictor.render_preview(lean)
+    with stage("png_encode"):
+        overlay_png = encode_png(overlay)
+    del overlay
+    mask_json = None
+    if lean.union_rle is not None:
+        mask_json = json.dumps(
+            {"size": lean.union_rle["size"], "union": lean.union_rle, "instances": lean.instances}
+        ).encode()
+    return {
+        "has_tumor": has_tumor,
+        "confidence": conf_out,
+        "debug_info": debug_info,
+        "overlay_png": overlay_png,
+        "mask_json": mask_json,
+        "instances": lean.instances,
+    }
+
+
+def _gated_result(gate_score: float) -> dict:
+    """Result for a slice the early-exit gate marked negative: no segmentation, no overlay."""
+    return {
+        "has_tumor": False,
+        "confidence": gate_score,
+        "debug_info": {
+            "gated": True,
+            "gate_score": gate_score,
+            "gate_threshold": GATE_THRESHOLD,
+            "gate_img_size": GATE_IMG_SIZE,
+            "raw_detections": 0,
+            "tumor_detections_after_filter": 0,
+            "max_confidence_tumor": gate_score,
+            "mask_count": 0,
+            "avg_mask_area": 0,
+        },
+        "overlay_png": None,
+        "mask_json": None,
+        "instances": [],
+    }
+
+
+def _gate_status() -> dict:
+    bypassed = GATE_TOTAL.value(outcome="bypassed")
+    total = bypassed + GATE_TOTAL.value(outcome="passed")
+    return {
+        "enabled": GATE_THRESHOLD > 0,
+        "threshold": GATE_THRESHOLD,
+        "img_size": GATE_IMG_SIZE,
+        "bypass_rate": bypassed / total if total else None,
+    }
+
+
+def _peer_address(request: Request) -> str:
+    """Client address for per-client limits: the peer, or the one the trusted proxies forwarded."""
+    if SCHED_FORWARDED_HOPS > 0:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if len(hops) >= SCHED_FORWARDED_HOPS:
+            return hops[-SCHED_FORWARDED_HOPS]
+    return request.client.host if request.client else "anonymous"
+
+
+def _admission_params(request: Request, default_priority: str = "interactive"):
+    """Priority class, client id and optional deadline from X-Priority / X-Client-Id / X-Deadline-Ms."""
     try:
-        model = registry.get("custom")
+        priority = normalize_priority(request.headers.get("x-priority") or default_priority)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    client_id = request.headers.get("x-client-id") or _peer_address(request)
+    deadline_ms = request.headers.get("x-deadline-ms")
+    try:
+        deadline_s = float(deadline_ms) / 1000.0 if deadline_ms else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="X-Deadline-Ms must be a number.") from exc
+    return priority, client_id, deadline_s
+
+
+def _png_data_url(png: bytes | None) -> str | None:
+    if not png:
+        return None
+    return f"data:image/png;base64,{base64.b64encode(png).decode('ascii')}"
+
+
+def _get_predictor(model_name: str = DEFAULT_MODEL) -> YoloPredictor:
+    try:
+        model = registry.get(model_name)
     except FileNotFoundError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
     try:
-        predictor = YoloPredictor(model=model)
+        return YoloPredictor(model=model, **registry.predictor_options())
     except Exception as exc:  # pragma: no cover - simple construction check
         raise HTTPException(
             status_code=400,
             detail="Failed to initialize predictor.",
         ) from exc
 
+
+def _resolve_thresholds(conf_th: float | None, iou_th: float | None):
     conf = CONF_TH if conf_th is None else float(conf_th)
     iou = IOU_TH if iou_th is None else float(iou_th)
     if conf < 0 or conf > 1:
         raise HTTPException(status_code=400, detail="conf_th must be between 0 and 1.")
     if iou < 0 or iou > 1:
         raise HTTPException(status_code=400, detail="iou_th must be between 0 and 1.")
+    return conf, iou
+
+
+def _check_upload(file: UploadFile) -> None:
+    if file.content_type not in ("image/jpeg", "image/png", "image/jpg"):
+        raise HTTPException(status_code=400, detail="Only image files are supported.")
 
-    logger.info(
-        "predict model=custom weights_used=%s model_names=%s",
-        registry.loaded_weights,
-        getattr(model, "names", None),
-    )
 
+def _cached_instances(store, cached: dict) -> list | None:
+    """Stored per-instance RLE masks for a cached prediction; None if they cannot be read."""
+    if cached["mask_hash"] is None:
+        return []
+    data = store.read_blob(cached["mask_hash"])
     try:
-        has_tumor, conf_out, result, debug_info = predictor.predict_tumor_binary(
-            str(tmp_path),
-            img_size=IMG_SIZE,
-            conf_th=conf,
-            iou_th=iou,
-            min_mask_area=MIN_MASK_AREA,
-            retina_masks=True,
-            max_det=50,
+        return json.loads(data)["instances"] if data is not None else None
+    except (ValueError, KeyError, TypeError):
+        return None  # e.g. a PNG mask stored before masks were kept as RLE
+
+
+def _store_lookup(store, image_hash: str, store_key: str, mask_format: str | None):
+    """(record, overlay PNG, instances) for a usable stored prediction, else None. Blocking IO."""
+    cached = store.find(image_hash, store_key)
+    if cached is None:
+        return None
+    overlay = store.read_blob(cached["overlay_hash"])
+    masks = _cached_instances(store, cached) if mask_format else []
+    if (overlay is None and cached["overlay_hash"] is not None) or masks is None:
+        return None
+    return cached, overlay, masks
+
+
+def _check_mask_format(mask_format: str | None) -> str | None:
+    if mask_format in (None, "", "none"):
+        return None
+    if mask_format not in MASK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"mask_format must be one of {list(MASK_FORMATS)}.")
+    return mask_format
+
+
+def _check_model_choice(model_choice: str | None) -> str:
+    if not model_choice:
+        return DEFAULT_MODEL
+    if model_choice not in registry.names():
+        raise HTTPException(status_code=400, detail=f"model_choice must be one of {registry.names()}.")
+    return model_choice
+
+
+async def _predict_upload(
+    predictor: YoloPredictor,
+    raw: bytes,
+    safe_name: str,
+    content_type: str,
+    conf: float,
+    iou: float,
+    priority: str,
+    client_id: str,
+    deadline_s: float | None,
+    profile=None,
+    mask_format: str | None = None,
+    model_name: str = DEFAULT_MODEL,
+):
+    """
+    Store lookup -> scheduled inference -> store write. Returns (PredictResult, profile_id).
+    Identical uploads (same content, parameters, model and priority) that arrive while one is
+    still computing share its result instead of running the model again.
+    """
+    store = get_store()
+    image_hash = content_hash(raw)
+    model_version = registry.versions.get(model_name)
+    gate = (GATE_THRESHOLD, GATE_IMG_SIZE) if GATE_THRESHOLD > 0 else None
+    store_key = params_key(conf, iou, MIN_MASK_AREA, IMG_SIZE, model_version, PREVIEW_MAX_SIDE, gate)
+    if store is not None and not DEBUG:
+        with stage("store_lookup"):
+            hit = await asyncio.to_thread(_store_lookup, store, image_hash, store_key, mask_format)
+        if hit is not None:
+            cached, cached_overlay, cached_masks = hit
+            CACHE_HITS_TOTAL.inc(cache="prediction_store")
+            result = PredictResult(
+                filename=safe_name,
+                model_used=cached["model_used"] or DISPLAY_MODEL_NAME,
+                conf_th=conf,
+                iou_th=iou,
+                min_mask_area=MIN_MASK_AREA,
+                has_tumor=cached["has_tumor"],
+                confidence=cached["confidence"],
+                description=cached["description"] or "",
+                overlay_image=_png_data_url(cached_overlay),
+                prediction_id=cached["id"],
+                mask_format=mask_format,
+                masks=format_instances(cached_masks, mask_format) if mask_format else None,
+            )
+            return result, None
+
+    flight_key = (model_name, image_hash, store_key, priority)
+    compute = partial(
+        _compute_prediction,
+        predictor,
+        raw,
+        safe_name,
+        content_type,
+        conf,
+        iou,
+        priority,
+        client_id,
+        deadline_s,
+        store,
+        store_key,
+        model_version,
+        profile,
+    )
+    if profile is not None:
+        # a profiled request measures its own run
+        result, instances, profile_id = await compute()
+    else:
+        (result, instances, profile_id), shared = await _inflight.run(
+            flight_key, compute, retry_if=_is_admission_error
         )
-    finally:
-        try:
-            tmp_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+        if shared:
+            CACHE_HITS_TOTAL.inc(cache="inflight")
+            result = result.model_copy(update={"filename": safe_name})
+    if mask_format:
+        result = result.model_copy(
+            update={"mask_format": mask_format, "masks": format_instances(instances, mask_format)}
+        )
+    return result, profile_id
+
+
+def _is_admission_error(exc: BaseException) -> bool:
+    """A 429/503/504 from the scheduler is about the caller that hit it, not the upload."""
+    return isinstance(exc, HTTPException) and isinstance(exc.__cause__, AdmissionError)
+
+
+async def _compute_prediction(
+    predictor: YoloPredictor,
+    raw: bytes,
+    safe_name: str,
+    content_type: str,
+    conf: float,
+    iou: float,
+    priority: str,
+    client_id: str,
+    deadline_s: float | None,
+    store,
+    store_key: str,
+    model_version: str | None,
+    profile,
+):
+    """Scheduled inference -> store write. Returns (PredictResult without masks, instances, profile_id)."""
 
-    overlay_b64 = predictor.render_overlay_base64(result)
-    overlay_image = f"data:image/png;base64,{overlay_b64}" if overlay_b64 else None
+    def _infer(data: bytes):
+        with profile.attach() if profile is not None else nullcontext():
+            return _run_predict_pipeline(predictor, data, conf, iou, profile=profile)
+
+    try:
+        out = await get_scheduler().submit(
+            partial(_infer, raw), priority=priority, client=client_id, deadline_s=deadline_s
+        )
+    except AdmissionError as exc:
+        headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail, headers=headers) from exc
+    has_tumor = out["has_tumor"]
+    conf_out = out["confidence"]
+    debug_info = out["debug_info"]
+    profile_id = profile.profile_id if profile is not None else None
+    if profile_id:
+        debug_info["profile_id"] = profile_id
+        logger.info("predict_profile id=%s file=%s", profile_id, safe_name)
+
+    overlay_image = _png_data_url(out["overlay_png"])
+    DETECTIONS_TOTAL.inc(debug_info.get("raw_detections", 0), kind="raw")
+    DETECTIONS_TOTAL.inc(debug_info.get("tumor_detections_after_filter", 0), kind="tumor")
+    PREDICTIONS_TOTAL.inc(outcome="tumor" if has_tumor else "no_tumor")
 
     mask_count = debug_info.get("mask_count") if debug_info else None
     avg_mask_area = debug_info.get("avg_mask_area") if debug_info else None
@@ -338,7 +722,7 @@ async def predict_endpoint(
             debug_info.get("classes_present"),
         )
 
-    return PredictResult(
+    result = PredictResult(
         filename=safe_name,
         model_used=DISPLAY_MODEL_NAME,
         conf_th=conf,
@@ -350,10 +734,195 @@ async def predict_endpoint(
         overlay_image=overlay_image,
         debug_info=debug_info if DEBUG else None,
     )
+    if store is not None:
+        with stage("store_write"):
+            try:
+                result.prediction_id = await asyncio.to_thread(
+                    store.save,
+                    filename=safe_name,
+                    key=store_key,
+                    image=raw,
+                    image_media_type=content_type,
+                    overlay_png=out["overlay_png"],
+                    mask_json=out["mask_json"],
+                    result=result.model_dump(exclude={"overlay_image", "masks"}),
+                    model_version=model_version,
+                )
+            except Exception:
+                logger.exception("predict store write failed file=%s", safe_name)
+    instances = out["instances"]
+    del out
+
+    return result, instances, profile_id
+
+
+@app.post("/predict", response_model=PredictResult)
+async def predict_endpoint(
+    request: Request,
+    model_choice: str = Form(None),
+    conf_th: float = Form(None),
+    iou_th: float = Form(None),
+    mask_format: str = Form(None),
+    file: UploadFile = File(...),
+):
+    model_name = _check_model_choice(model_choice)
+    _check_upload(file)
+
+    profile_mode = None
+    if DEBUG:
+        profile_mode = requested_mode(request.headers.get("x-profile"), request.query_params.get("profile"))
+
+    # The event-loop thread is sampled for the whole request (upload read, store, serialization);
+    # the inference thread attaches itself while it runs this request's job.
+    with open_profile(profile_mode) as profile, profile.attach() if profile is not None else nullcontext():
+        safe_name = safe_filename(file.filename)
+        with stage("upload_read"):
+            raw = await file.read()
+
+        predictor = _get_predictor(model_name)
+        conf, iou = _resolve_thresholds(conf_th, iou_th)
+        mask_format = _check_mask_format(mask_format)
+        priority, client_id, deadline_s = _admission_params(request)
+
+        logger.info(
+            "predict model=%s weights_used=%s model_names=%s",
+            model_name,
+            registry.weights.get(model_name),
+            getattr(predictor.model, "names", None),
+        )
+
+        result, _ = await _predict_upload(
+            predictor,
+            raw,
+            safe_name,
+            file.content_type,
+            conf,
+            iou,
+            priority,
+            client_id,
+            deadline_s,
+            profile=profile,
+            mask_format=mask_format,
+            model_name=model_name,
+        )
+        del raw
+
+        with stage("serialize"):
+            body = result.model_dump_json()
+    headers = {"X-Profile-Id": profile.profile_id} if profile is not None else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _batch_event(index: int, result: PredictResult) -> dict:
+    """Per-slice SSE payload; stored results link the overlay instead of inlining it."""
+    if result.prediction_id:
+        data = result.model_dump(exclude={"overlay_image"})
+        # slices bypassed by the early-exit gate have no overlay
+        data["overlay_url"] = f"/predictions/{result.prediction_id}/overlay" if result.overlay_image else None
+    else:
+        data = result.model_dump()
+    return {"index": index, "result": data}
+
+
+async def _run_batch(
+    job, predictor, uploads, conf, iou, priority, client_id, mask_format=None, model_name=DEFAULT_MODEL
+):
+    succeeded = 0
+    for index, (safe_name, content_type, raw) in enumerate(uploads):
+        try:
+            result, _ = await _predict_upload(
+                predictor,
+                raw,
+                safe_name,
+                content_type,
+                conf,
+                iou,
+                priority,
+                client_id,
+                None,
+                mask_format=mask_format,
+                model_name=model_name,
+            )
+        except HTTPException as exc:
+            job.publish(
+                "item_error",
+                {"index": index, "filename": safe_name, "status_code": exc.status_code, "detail": exc.detail},
+                advance=True,
+            )
+        except Exception as exc:
+            logger.exception("batch predict failed job=%s file=%s", job.id, safe_name)
+            job.publish(
+                "item_error",
+                {"index": index, "filename": safe_name, "status_code": 500, "detail": str(exc)},
+                advance=True,
+            )
+        else:
+            succeeded += 1
+            job.publish("result", _batch_event(index, result), advance=True)
+        uploads[index] = None  # release the upload once its slice is done
+    job.finish({"total": len(uploads), "succeeded": succeeded, "failed": len(uploads) - succeeded})
+
+
+@app.post("/predict/batch", status_code=202)
+async def predict_batch_endpoint(
+    request: Request,
+    model_choice: str = Form(None),
+    conf_th: float = Form(None),
+    iou_th: float = Form(None),
+    mask_format: str = Form(None),
+    files: List[UploadFile] = File(...),
+):
+    """
+    Start a batch/volume prediction. Per-slice results stream from
+    GET /jobs/{job_id}/events as they finish. Defaults to the batch priority class.
+    """
+    model_name = _check_model_choice(model_choice)
+    for file in files:
+        _check_upload(file)
+    predictor = _get_predictor(model_name)
+    conf, iou = _resolve_thresholds(conf_th, iou_th)
+    mask_format = _check_mask_format(mask_format)
+    priority, client_id, _ = _admission_params(request, default_priority="batch")
+
+    uploads = []
+    with stage("upload_read"):
+        for file in files:
+            uploads.append((safe_filename(file.filename), file.content_type, await file.read()))
+
+    job = jobs.create("predict_batch", total=len(uploads))
+    job.task = asyncio.create_task(
+        _run_batch(job, predictor, uploads, conf, iou, priority, client_id, mask_format, model_name)
+    )
+    return {"job_id": job.id, "total": len(uploads), "events_url": f"/jobs/{job.id}/events"}
+
+
+@app.get("/debug/profiles/{name}")
+def profile_artifact(name: str):
+    """Download a saved profile artifact (`<id>.json`, `<id>.folded.txt`, ...); DEBUG only."""
+    path = artifact_path(name) if DEBUG else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found.")
+    media_type = "application/json" if path.suffix == ".json" else "text/plain"
+    return Response(content=path.read_bytes(), media_type=media_type)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    MODEL_INFO.clear()
+    for name, weights in registry.weights.items():
+        MODEL_INFO.set(1, name=name, weights=weights, version=registry.versions.get(name) or "")
+    GATE_INFO.clear()
+    GATE_INFO.set(GATE_THRESHOLD, img_size=GATE_IMG_SIZE)
+    PROCESS_RSS.set(process_rss_bytes())
+    return Response(content=METRICS.render(), media_type="text/plain; version=0.0.4")
 
 
 # Provide /api/* aliases for convenience / proxies.
 app.add_api_route("/api/health", health, methods=["GET"])
 app.add_api_route("/api/train", train_endpoint, methods=["POST"], response_model=TrainResponse)
 app.add_api_route("/api/predict", predict_endpoint, methods=["POST"], response_model=PredictResult)
+app.add_api_route("/api/predict/batch", predict_batch_endpoint, methods=["POST"], status_code=202)
+app.add_api_route("/api/train/jobs", train_job_endpoint, methods=["POST"], status_code=202)
 app.add_api_route("/api/report", report_endpoint, methods=["POST"])
+app.add_api_route("/api/report/study", study_report_endpoint, methods=["POST"])
+app.add_api_route("/api/metrics", metrics_endpoint, methods=["GET"])
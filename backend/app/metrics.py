@@ -0,0 +1,229 @@
+"""
+Minimal Prometheus text-format metrics (counters, gauges, histograms) for the API.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[Tuple[str, ...], list] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, list(v), self._sums[k]) for k, v in self._counts.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for upper, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(upper)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+def process_rss_bytes() -> int:
+    """Resident set size of this process (Linux /proc, 0 elsewhere)."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "tumorseg_stage_seconds",
+        "Latency of each /predict pipeline stage.",
+        ("stage",),
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "tumorseg_request_seconds",
+        "End-to-end HTTP request latency.",
+        ("endpoint",),
+    )
+)
+REQUESTS_TOTAL = REGISTRY.register(
+    Counter("tumorseg_requests_total", "HTTP requests by endpoint and status code.", ("endpoint", "status"))
+)
+ERRORS_TOTAL = REGISTRY.register(
+    Counter("tumorseg_errors_total", "Failed requests by endpoint and kind (client, server).", ("endpoint", "kind"))
+)
+CACHE_HITS_TOTAL = REGISTRY.register(
+    Counter("tumorseg_cache_hits_total", "Requests answered without recomputation.", ("cache",))
+)
+DETECTIONS_TOTAL = REGISTRY.register(
+    Counter(
+        "tumorseg_detections_total",
+        "Detections returned by the model (raw) and kept by the tumor rule (tumor).",
+        ("kind",),
+    )
+)
+PREDICTIONS_TOTAL = REGISTRY.register(
+    Counter("tumorseg_predictions_total", "Completed predictions by outcome.", ("outcome",))
+)
+GATE_TOTAL = REGISTRY.register(
+    Counter(
+        "tumorseg_gate_total",
+        "Predictions by early-exit gate outcome (bypassed = segmentation skipped, passed).",
+        ("outcome",),
+    )
+)
+GATE_INFO = REGISTRY.register(
+    Gauge("tumorseg_gate_threshold", "Early-exit gate threshold (0 = gate off).", ("img_size",))
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge("tumorseg_queue_depth", "Predict requests currently waiting or running.")
+)
+SCHED_WAIT_SECONDS = REGISTRY.register(
+    Histogram("tumorseg_scheduler_wait_seconds", "Time spent queued before inference.", ("priority",))
+)
+SCHED_REJECTED_TOTAL = REGISTRY.register(
+    Counter(
+        "tumorseg_scheduler_rejected_total",
+        "Requests refused or dropped by the scheduler (client_limit, queue_full, deadline).",
+        ("priority", "reason"),
+    )
+)
+MODEL_INFO = REGISTRY.register(
+    Gauge("tumorseg_model_info", "Loaded model weights (value is always 1).", ("name", "weights", "version"))
+)
+PROCESS_RSS = REGISTRY.register(
+    Gauge("tumorseg_process_resident_memory_bytes", "Resident memory of the API process.")
+)
+
+
+@contextmanager
+def stage(name: str):
+    with STAGE_SECONDS.time(stage=name):
+        yield
+
+
+def observe_stage_ms(name: str, milliseconds) -> None:
+    if milliseconds is not None:
+        STAGE_SECONDS.observe(float(milliseconds) / 1000.0, stage=name)
@@ -1,41 +1,110 @@
-from typing import Dict, Optional
+import hashlib
+from typing import TYPE_CHECKING, Dict, List, Optional
 from pathlib import Path
-from ultralytics import YOLO
-from parameters import CUSTOM_MODEL_WEIGHTS
+from parameters import CUSTOM_MODEL_WEIGHTS, DEFAULT_MODEL, LITE_MODEL_WEIGHTS, STUB_MODEL, STUB_MODEL_LATENCY_MS
+from .cpu_tuning import apply_thread_env, configure_worker
+
+if TYPE_CHECKING:  # ultralytics/torch load on first model use, not at API import
+    from ultralytics import YOLO
+
+def weights_version(path: str) -> str:
+    """Short content hash identifying a weights file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+MODEL_WEIGHTS = {
+    "custom": ("CUSTOM_MODEL_WEIGHTS", CUSTOM_MODEL_WEIGHTS),
+    "lite": ("LITE_MODEL_WEIGHTS", LITE_MODEL_WEIGHTS),  # backend/app/compress.py
+}
+
 
 class ModelRegistry:
     def __init__(self):
-        self.models: Dict[str, YOLO] = {}
+        self.models: Dict[str, "YOLO"] = {}
         self.last_error: Optional[str] = None
-        self.loaded_weights: Optional[str] = None
+        self.weights: Dict[str, str] = {}  # loaded weights path per model name
+        self.versions: Dict[str, str] = {}
+        self.cpu_config: Optional[dict] = None
+        self.device_config: Optional[dict] = None
+        # OMP/MKL read their pool size when torch first loads, which happens after this.
+        apply_thread_env()
+
+    @property
+    def loaded_weights(self) -> Optional[str]:
+        return self.weights.get(DEFAULT_MODEL)
+
+    @property
+    def loaded_version(self) -> Optional[str]:
+        return self.versions.get(DEFAULT_MODEL)
 
-    def _resolve_custom_weights(self) -> str:
-        path = Path(CUSTOM_MODEL_WEIGHTS)
-        if path.exists():
+    def predictor_options(self) -> dict:
+        """Device/precision/channels_last/compile for YoloPredictor, resolved once per process."""
+        if STUB_MODEL:
+            return {}
+        if self.device_config is None:
+            from .device import inference_options
+
+            self.device_config = inference_options()
+        return self.device_config
+
+    def names(self) -> List[str]:
+        return list(MODEL_WEIGHTS)
+
+    def weights_path(self, name: str) -> str:
+        return MODEL_WEIGHTS[name][1]
+
+    def _resolve_weights(self, name: str) -> str:
+        env, path = MODEL_WEIGHTS[name]
+        if Path(path).exists():
             return str(path)
-        raise FileNotFoundError(
-            "Custom model weights missing. Set CUSTOM_MODEL_WEIGHTS or place best.pt in project root."
-        )
-
-    def get(self, name: str = "custom") -> YOLO:
-        if name != "custom":
-            raise ValueError("Only 'custom' model is allowed for inference.")
-        if "custom" in self.models:
-            return self.models["custom"]
-        resolved = self._resolve_custom_weights()
+        if name == "custom":
+            raise FileNotFoundError(
+                "Custom model weights missing. Set CUSTOM_MODEL_WEIGHTS or place best.pt in project root."
+            )
+        raise FileNotFoundError(f"Weights for model '{name}' missing. Set {env} (expected {path}).")
+
+    def get(self, name: str = DEFAULT_MODEL) -> "YOLO":
+        if name not in MODEL_WEIGHTS:
+            raise ValueError(f"Unknown model '{name}'. Use one of: {self.names()}")
+        if name in self.models:
+            return self.models[name]
+        if STUB_MODEL:
+            from .stub_model import StubModel
+
+            model = StubModel(latency_ms=STUB_MODEL_LATENCY_MS)
+            self.models[name] = model
+            self.weights[name] = "stub"
+            self.versions[name] = "stub"
+            self.last_error = None
+            return model
+        resolved = self._resolve_weights(name)
+        from ultralytics import YOLO
+
+        if self.cpu_config is None:
+            self.cpu_config = configure_worker()
         model = YOLO(resolved)
-        self.models["custom"] = model
-        self.loaded_weights = resolved
+        self.models[name] = model
+        self.weights[name] = resolved
+        self.versions[name] = weights_version(resolved)
         self.last_error = None
         return model
 
-    def status(self) -> Dict[str, Optional[str]]:
+    def status(self, name: str = DEFAULT_MODEL, load: bool = True) -> Dict[str, Optional[str]]:
+        """Loads the model unless `load` is False, in which case only the weights file is checked."""
+        if not load and name not in self.models:
+            path = self.weights_path(name)
+            ok = STUB_MODEL or Path(path).exists()
+            return {"ok": ok, "error": None if ok else "weights missing", "weights_used": None, "loaded": False}
         try:
-            self.get("custom")
-            return {"ok": True, "error": None, "weights_used": self.loaded_weights}
+            self.get(name)
+            return {"ok": True, "error": None, "weights_used": self.weights.get(name), "loaded": True}
         except Exception as exc:
             msg = str(exc)
             self.last_error = msg
-            return {"ok": False, "error": msg, "weights_used": None}
+            return {"ok": False, "error": msg, "weights_used": None, "loaded": False}
 
 registry = ModelRegistry()
@@ -0,0 +1,174 @@
+"""
+Opt-in per-request profiling (DEBUG only).
+
+A stdlib sampling profiler records folded call stacks of the threads doing the
+request's work: the event-loop thread for the whole request (other requests it
+serves meanwhile show up too) and the inference thread while it runs the job.
+The output loads directly into flamegraph.pl or speedscope.
+Optionally the model forward pass is also traced with torch.profiler.
+"""
+import datetime
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Optional
+
+from parameters import RESULTS_DIR
+
+PROFILES_DIR = Path(RESULTS_DIR) / "profiles"
+TRUTHY = {"1", "true", "yes", "on"}
+TORCH_MODES = {"torch", "model"}
+
+
+def requested_mode(header_value: Optional[str], query_value: Optional[str]) -> Optional[str]:
+    """Return "sampling", "torch" or None from the X-Profile header / ?profile= flag."""
+    for value in (header_value, query_value):
+        if value is None:
+            continue
+        value = value.strip().lower()
+        if value in TORCH_MODES:
+            return "torch"
+        if value in TRUTHY:
+            return "sampling"
+    return None
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._threads = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    @contextmanager
+    def attach(self):
+        """Sample the calling thread while inside the block."""
+        tid = threading.get_ident()
+        self._threads.add(tid)
+        try:
+            yield
+        finally:
+            self._threads.discard(tid)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in list(self._threads):
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def top_self(self, limit: int = 25) -> list:
+        leaf = Counter()
+        for stack, count in self.samples.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        total = max(sum(leaf.values()), 1)
+        return [
+            {"frame": frame, "samples": count, "fraction": count / total}
+            for frame, count in leaf.most_common(limit)
+        ]
+
+
+class RequestProfile:
+    """Profiling session for one request; saves artifacts under RESULTS_DIR/profiles."""
+
+    def __init__(self, mode: str, interval: float = 0.005):
+        self.mode = mode
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.profile_id = f"{stamp}_{uuid.uuid4().hex[:8]}"
+        self.sampler = SamplingProfiler(interval=interval)
+        self._torch_prof = None
+
+    def __enter__(self):
+        self.sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.sampler.stop()
+        self.save()
+        return False
+
+    def attach(self):
+        return self.sampler.attach()
+
+    @contextmanager
+    def model_stage(self):
+        if self.mode != "torch":
+            yield
+            return
+        try:
+            from torch.profiler import ProfilerActivity, profile
+        except ImportError:
+            yield
+            return
+        with profile(activities=[ProfilerActivity.CPU]) as prof:
+            yield
+        self._torch_prof = prof
+
+    def save(self) -> Path:
+        out_dir = PROFILES_DIR
+        out_dir.mkdir(parents=True, exist_ok=True)
+        (out_dir / f"{self.profile_id}.folded.txt").write_text(self.sampler.folded(), encoding="utf-8")
+        summary = {
+            "profile_id": self.profile_id,
+            "mode": self.mode,
+            "wall_seconds": self.sampler.elapsed,
+            "interval_seconds": self.sampler.interval,
+            "samples": sum(self.sampler.samples.values()),
+            "top_self": self.sampler.top_self(),
+            "artifacts": [f"{self.profile_id}.folded.txt"],
+        }
+        if self._torch_prof is not None:
+            trace_name = f"{self.profile_id}.torch_trace.json"
+            self._torch_prof.export_chrome_trace(str(out_dir / trace_name))
+            summary["artifacts"].append(trace_name)
+            summary["torch_top_ops"] = self._torch_prof.key_averages().table(
+                sort_by="self_cpu_time_total", row_limit=20
+            )
+        path = out_dir / f"{self.profile_id}.json"
+        path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        return path
+
+
+def open_profile(mode: Optional[str]):
+    """Context manager yielding a RequestProfile, or None when profiling is off."""
+    return RequestProfile(mode) if mode else nullcontext()
+
+
+def artifact_path(name: str) -> Optional[Path]:
+    """Resolve a saved artifact by file name, refusing anything outside PROFILES_DIR."""
+    path = (PROFILES_DIR / name).resolve()
+    if path.parent != PROFILES_DIR.resolve() or not path.is_file():
+        return None
+    return path
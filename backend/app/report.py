@@ -0,0 +1,298 @@
+"""
+PDF report rendering (ReportLab is imported only when a report is requested).
+
+`render_study_pdf` builds one multi-page report from many stored predictions: a
+summary table, a thumbnail grid of every slice and the positive slices at full
+size. Each distinct image blob is decoded, downscaled and JPEG-encoded once, in a
+thread pool; the JPEG goes into the PDF as-is and every later drawImage of the same
+ImageReader reuses the embedded XObject.
+"""
+import datetime
+import io
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+PDF_FONT = None
+
+
+def pdf_font() -> str:
+    """Register a Unicode TTF on first use (falls back to Helvetica)."""
+    global PDF_FONT
+    if PDF_FONT is not None:
+        return PDF_FONT
+    PDF_FONT = "Helvetica"
+    candidates = [
+        Path("C:/Windows/Fonts/DejaVuSans.ttf"),
+        Path("C:/Windows/Fonts/Arial.ttf"),
+    ]
+    for path in candidates:
+        if path.exists():
+            name = path.stem
+            pdfmetrics.registerFont(TTFont(name, str(path)))
+            PDF_FONT = name
+            break
+    return PDF_FONT
+
+
+def _draw_image_block(c: canvas.Canvas, title: str, image, y: float) -> float:
+    page_w, page_h = A4
+    margin = 50
+    if image is None:
+        return y
+
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(margin, y, title)
+    y -= 14
+
+    max_w = page_w - margin * 2
+    max_h = (page_h - margin * 2) / 2.2
+    reader = image if isinstance(image, ImageReader) else ImageReader(image)
+    w, h = reader.getSize()
+    scale = min(max_w / w, max_h / h, 1.0)
+    draw_w = w * scale
+    draw_h = h * scale
+
+    if y - draw_h < margin:
+        c.showPage()
+        y = page_h - margin
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(margin, y, title)
+        y -= 14
+
+    c.drawImage(reader, margin, y - draw_h, width=draw_w, height=draw_h)
+    return y - draw_h - 24
+
+
+def _draw_image_pair(c: canvas.Canvas, font: str, original: ImageReader, overlay: ImageReader, y: float) -> float:
+    """Original and segmentation side by side, each at most half the page."""
+    page_w, page_h = A4
+    margin = 50
+    max_w = (page_w - margin * 2 - 20) / 2
+    max_h = (page_h - margin * 2) / 2.0
+    ow, oh = original.getSize()
+    ow_scale = min(max_w / ow, max_h / oh, 1.0)
+    ow_draw = ow * ow_scale
+    oh_draw = oh * ow_scale
+    vw, vh = overlay.getSize()
+    vw_scale = min(max_w / vw, max_h / vh, 1.0)
+    vw_draw = vw * vw_scale
+    vh_draw = vh * vw_scale
+
+    row_h = max(oh_draw, vh_draw)
+    if y - row_h < margin:
+        c.showPage()
+        y = page_h - margin
+
+    c.setFont(font, 11)
+    c.drawString(margin, y, "Izvorna slika")
+    c.drawString(margin + max_w + 20, y, "Segmentacija")
+    y -= 12
+    c.drawImage(original, margin, y - oh_draw, width=ow_draw, height=oh_draw)
+    c.drawImage(overlay, margin + max_w + 20, y - vh_draw, width=vw_draw, height=vh_draw)
+    return y - row_h - 10
+
+
+def render_report_pdf(req, original: Image.Image | None, overlay: Image.Image | None) -> bytes:
+    font = pdf_font()
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    page_w, page_h = A4
+    margin = 50
+    y = page_h - margin
+
+    c.setFont(font, 16)
+    c.drawString(margin, y, "Izvještaj segmentacije")
+    y -= 26
+
+    c.setFont(font, 11)
+    ts = datetime.datetime.now().strftime("%d.%m.%Y. %H:%M")
+    lines = [
+        f"Datum: {ts}",
+        f"Datoteka: {req.filename}",
+        f"Model: {req.model_used}",
+        f"Tumor detektiran: {'Da' if req.has_tumor else 'Ne'}",
+    ]
+    for line in lines:
+        c.drawString(margin, y, line)
+        y -= 16
+
+    if original and overlay:
+        y = _draw_image_pair(c, font, ImageReader(original), ImageReader(overlay), y - 10)
+    else:
+        if original:
+            y = _draw_image_block(c, "Izvorna slika", original, y)
+        if overlay:
+            y = _draw_image_block(c, "Segmentacija", overlay, y)
+
+    c.showPage()
+    c.save()
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
+    return pdf_bytes
+
+
+THUMB_MAX_SIDE = 240
+FULL_MAX_SIDE = 768
+GRID_COLUMNS = 4
+POSITIVE_RGB = (0.8, 0, 0)
+
+
+def _encode_jpeg(raw: Optional[bytes], max_side: int) -> Optional[bytes]:
+    if not raw:
+        return None
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            img.draft("RGB", (max_side, max_side))  # JPEG: decode at reduced scale
+            img = img.convert("RGB")
+    except Exception:
+        return None
+    img.thumbnail((max_side, max_side), Image.BILINEAR)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def prepare_study_images(
+    records: List[dict],
+    read_blob: Callable[[Optional[str]], Optional[bytes]],
+    workers: int = 4,
+) -> Dict[tuple, ImageReader]:
+    """
+    ImageReader per (blob hash, max side): thumbnails of every slice (overlay, else the
+    original) and full-size original + overlay of positive slices.
+    """
+    wanted = set()
+    for record in records:
+        wanted.add((record["overlay_hash"] or record["image_hash"], THUMB_MAX_SIDE))
+        if record["has_tumor"]:
+            wanted.add((record["image_hash"], FULL_MAX_SIDE))
+            if record["overlay_hash"]:
+                wanted.add((record["overlay_hash"], FULL_MAX_SIDE))
+    wanted = sorted(wanted)
+
+    def _job(key):
+        digest, max_side = key
+        return _encode_jpeg(read_blob(digest), max_side)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        encoded = list(pool.map(_job, wanted))
+    return {key: ImageReader(io.BytesIO(jpeg)) for key, jpeg in zip(wanted, encoded) if jpeg}
+
+
+def _new_page(c: canvas.Canvas, font: str, title: str) -> float:
+    page_w, page_h = A4
+    c.showPage()
+    c.setFont(font, 14)
+    c.drawString(50, page_h - 50, title)
+    return page_h - 76
+
+
+def _draw_summary_table(c: canvas.Canvas, font: str, records: List[dict], y: float) -> float:
+    margin = 50
+    columns = [(margin, "#"), (margin + 30, "Datoteka"), (margin + 300, "Tumor"), (margin + 360, "Pouzdanost")]
+
+    def _header(y):
+        c.setFont("Helvetica-Bold", 10)
+        for x, label in columns:
+            c.drawString(x, y, label)
+        c.line(margin, y - 4, A4[0] - margin, y - 4)
+        return y - 16
+
+    y = _header(y)
+    for i, record in enumerate(records, start=1):
+        if y < margin:
+            y = _header(_new_page(c, font, "Sažetak (nastavak)"))
+        c.setFont(font, 10)
+        c.setFillColorRGB(*(POSITIVE_RGB if record["has_tumor"] else (0, 0, 0)))
+        values = [str(i), (record["filename"] or "")[:48], "Da" if record["has_tumor"] else "Ne",
+                  f"{record['confidence']:.3f}"]
+        for (x, _), value in zip(columns, values):
+            c.drawString(x, y, value)
+        c.setFillColorRGB(0, 0, 0)
+        y -= 14
+    return y
+
+
+def _draw_thumbnail_grid(c: canvas.Canvas, font: str, records: List[dict], images: Dict[tuple, ImageReader]) -> None:
+    page_w, page_h = A4
+    margin = 50
+    cell_w = (page_w - margin * 2) / GRID_COLUMNS
+    cell_h = cell_w + 14
+    y = _new_page(c, font, "Pregled presjeka")
+    for i, record in enumerate(records):
+        col = i % GRID_COLUMNS
+        if col == 0 and i and y - cell_h < margin:
+            y = _new_page(c, font, "Pregled presjeka (nastavak)")
+        x = margin + col * cell_w
+        box = cell_w - 8
+        thumb = images.get((record["overlay_hash"] or record["image_hash"], THUMB_MAX_SIDE))
+        if thumb is not None:
+            c.drawImage(thumb, x, y - box, width=box, height=box, preserveAspectRatio=True)
+        if record["has_tumor"]:
+            c.setStrokeColorRGB(*POSITIVE_RGB)
+            c.setLineWidth(2)
+            c.rect(x, y - box, box, box)
+            c.setStrokeColorRGB(0, 0, 0)
+            c.setLineWidth(1)
+        c.setFont(font, 8)
+        c.drawString(x, y - box - 10, f"{i + 1}. {'Da' if record['has_tumor'] else 'Ne'} {record['confidence']:.2f}")
+        if col == GRID_COLUMNS - 1:
+            y -= cell_h
+
+
+def render_study_pdf(
+    study: str,
+    records: List[dict],
+    read_blob: Callable[[Optional[str]], Optional[bytes]],
+    workers: int = 4,
+):
+    """Multi-page study report written to a spooled temp file, rewound for streaming."""
+    font = pdf_font()
+    images = prepare_study_images(records, read_blob, workers)
+    out = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    c = canvas.Canvas(out, pagesize=A4)
+    page_w, page_h = A4
+    margin = 50
+    y = page_h - margin
+
+    c.setFont(font, 16)
+    c.drawString(margin, y, "Izvještaj studije")
+    y -= 26
+    c.setFont(font, 11)
+    positives = [(i, r) for i, r in enumerate(records, start=1) if r["has_tumor"]]
+    lines = [
+        f"Studija: {study}" if study else None,
+        f"Datum: {datetime.datetime.now().strftime('%d.%m.%Y. %H:%M')}",
+        f"Broj presjeka: {len(records)}",
+        f"Tumor detektiran: {len(positives)}",
+    ]
+    for line in filter(None, lines):
+        c.drawString(margin, y, line)
+        y -= 16
+    _draw_summary_table(c, font, records, y - 10)
+    _draw_thumbnail_grid(c, font, records, images)
+
+    for i, record in positives:
+        y = _new_page(c, font, f"Presjek {i}: {record['filename'] or ''}")
+        c.setFont(font, 11)
+        c.drawString(margin, y, f"Pouzdanost: {record['confidence']:.3f}")
+        original = images.get((record["image_hash"], FULL_MAX_SIDE))
+        overlay = images.get((record["overlay_hash"], FULL_MAX_SIDE))
+        if original is not None and overlay is not None:
+            _draw_image_pair(c, font, original, overlay, y - 24)
+        elif original is not None:
+            _draw_image_block(c, "Izvorna slika", original, y - 24)
+
+    c.showPage()
+    c.save()
+    out.seek(0)
+    return out
@@ -1,20 +1,175 @@
 """
 Lightweight router helpers to keep main.py clean.
 """
-from fastapi import APIRouter, HTTPException
+import json
+import threading
+from typing import Optional
 
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from PIL import Image
+
+import parameters
+from yolotrainer.custom_predictor import encode_png
+from yolotrainer.download_manager import dataset_present
+from yolotrainer.mask_codec import decode_rle
 from yolotrainer.utils import download_dataset_if_needed
+from .jobs import jobs
+from .scheduler import get_scheduler
+from .schemas import PredictionPage, PredictionRecord
+from .store import BLOB_KINDS, MASK_MEDIA_TYPE, get_store
 
 router = APIRouter()
+_dataset_job_lock = threading.Lock()
 
 
 @router.post("/dataset/download")
 def trigger_dataset_download():
     """
-    Download the Roboflow dataset if missing and return the local path.
+    Return the local dataset path if it is present; otherwise start a background
+    download (202) whose `progress` events stream from GET /jobs/{job_id}/events.
+    """
+    if dataset_present(parameters.DATASET_DIR):
+        return {"dataset_path": parameters.DATASET_DIR, "status": "ready"}
+    with _dataset_job_lock:
+        job = jobs.running("dataset_download") or _start_dataset_download()
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status": job.status, "events_url": f"/jobs/{job.id}/events"},
+    )
+
+
+@router.get("/dataset/stats")
+def get_dataset_stats(refresh: bool = Query(False)):
+    """
+    Per-split image/label counts, polygons and images per class, mask-area histograms
+    and image sizes. Cached until a dataset file changes.
+    """
+    from yolotrainer.dataset_stats import dataset_stats
+
+    try:
+        return dataset_stats(parameters.DATASET_DIR, refresh=refresh)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+def _start_dataset_download():
+    job = jobs.create("dataset_download")
+    reported = {}
+
+    def _progress(phase: str, done: int, total: int) -> None:
+        pct = int(100 * done / total) if total else 0
+        if reported.get(phase) != pct:  # one event per percent, not per block
+            reported[phase] = pct
+            job.publish("progress", {"phase": phase, "done": done, "total": total, "percent": pct})
+
+    def _download():
+        try:
+            path = download_dataset_if_needed(progress=_progress)
+        except Exception as exc:
+            job.fail(str(exc))
+            return
+        job.finish({"dataset_path": path})
+
+    job.task = threading.Thread(target=_download, name=f"dataset-{job.id[:8]}", daemon=True)
+    job.task.start()
+    return job
+
+
+@router.get("/scheduler/stats")
+def scheduler_stats():
+    """
+    Inference queue state per priority class (queued, running, shed and rejected counts).
+    """
+    return get_scheduler().stats()
+
+
+@router.get("/jobs")
+def list_jobs():
+    return jobs.list()
+
+
+def _require_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    return _require_job(job_id).snapshot()
+
+
+@router.get("/jobs/{job_id}/events")
+def job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events: `result`/`item_error` per slice, or `epoch` per training epoch
+    and `final_eval` for the best.pt validation, then `done` or `failed`. Reconnects resume after Last-Event-ID.
     """
+    job = _require_job(job_id)
     try:
-        path = download_dataset_if_needed()
-    except Exception as exc:  # pragma: no cover - just surfacing errors
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
-    return {"dataset_path": path}
+        after = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        after = 0
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(job.stream(after), media_type="text/event-stream", headers=headers)
+
+
+def _require_store():
+    store = get_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Prediction store is disabled.")
+    return store
+
+
+@router.get("/predictions", response_model=PredictionPage)
+def list_predictions(
+    has_tumor: Optional[bool] = None,
+    filename: Optional[str] = None,
+    since: Optional[float] = Query(None, description="Unix timestamp, inclusive."),
+    until: Optional[float] = Query(None, description="Unix timestamp, exclusive."),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Stored predictions, newest first.
+    """
+    return _require_store().query(
+        has_tumor=has_tumor,
+        filename=filename,
+        since=since,
+        until=until,
+        limit=limit,
+        offset=offset,
+    )
+
+
+@router.get("/predictions/{prediction_id}", response_model=PredictionRecord)
+def get_prediction(prediction_id: str):
+    record = _require_store().get(prediction_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Prediction not found.")
+    return record
+
+
+@router.get("/predictions/{prediction_id}/{kind}")
+def get_prediction_blob(prediction_id: str, kind: str, fmt: Optional[str] = Query(None, alias="format")):
+    """
+    Raw stored artifact: `image` (original upload), `overlay` or `mask` (RLE JSON;
+    `?format=png` renders the union mask as a PNG).
+    """
+    if kind not in BLOB_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown artifact '{kind}'.")
+    store = _require_store()
+    record = store.get(prediction_id)
+    digest = record.get(BLOB_KINDS[kind]) if record else None
+    data = store.read_blob(digest)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Artifact not found.")
+    media_type = store.blob_media_type(digest)
+    if kind == "mask" and fmt == "png" and media_type == MASK_MEDIA_TYPE:
+        data = encode_png(Image.fromarray(decode_rle(json.loads(data)["union"])))
+        media_type = "image/png"
+    headers = {"Cache-Control": "private, max-age=31536000, immutable", "ETag": f'"{digest}{fmt or ""}"'}
+    return Response(content=data, media_type=media_type, headers=headers)
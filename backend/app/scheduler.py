@@ -0,0 +1,222 @@
+"""
+Admission control and priority scheduling in front of the inference stage.
+
+Requests are queued per priority class (interactive before batch) and run on a
+single inference lane per process: the ultralytics predictor is not thread-safe,
+so parallelism comes from workers (backend.app.serving), not from this queue.
+Per-client in-flight limits and per-class queue caps reject early; a request
+whose deadline passes while it is still queued is dropped without running.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from parameters import (
+    SCHED_CLIENT_LIMIT,
+    SCHED_DEADLINE_BATCH_S,
+    SCHED_DEADLINE_INTERACTIVE_S,
+    SCHED_MAX_QUEUE,
+)
+from .metrics import QUEUE_DEPTH, SCHED_REJECTED_TOTAL, SCHED_WAIT_SECONDS
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class AdmissionError(Exception):
+    """Request refused by the scheduler; carries the HTTP status to report."""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("fn", "priority", "client", "deadline", "enqueued", "future", "started", "queued")
+
+    def __init__(self, fn, priority, client, deadline, future):
+        self.fn = fn
+        self.priority = priority
+        self.client = client
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.future = future
+        self.started = False
+        self.queued = True  # counted in _queued; False once popped or dropped while waiting
+
+
+def normalize_priority(value: Optional[str]) -> str:
+    value = (value or "interactive").strip().lower()
+    if value not in PRIORITIES:
+        raise ValueError(f"priority must be one of {sorted(PRIORITIES)}")
+    return value
+
+
+class InferenceScheduler:
+    def __init__(
+        self,
+        concurrency: int = 1,
+        client_limit: int = 4,
+        max_queue: int = 64,
+        deadlines: Optional[Dict[str, float]] = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.client_limit = client_limit
+        self.max_queue = max_queue
+        self.deadlines = deadlines or {}
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="inference")
+        self._heap = []  # (priority rank, arrival seq, ticket)
+        self._dead = 0  # heap entries dropped while queued, not yet popped
+        self._seq = itertools.count()
+        self._queued = Counter()
+        self._running = Counter()
+        self._clients = Counter()
+        self._counts = {p: Counter() for p in PRIORITIES}
+
+    async def submit(
+        self,
+        fn: Callable[[], Any],
+        priority: str = "interactive",
+        client: str = "anonymous",
+        deadline_s: Optional[float] = None,
+    ) -> Any:
+        """Queue `fn` and return its result once it has run on the inference lane."""
+        priority = normalize_priority(priority)
+        if self.client_limit > 0 and self._clients[client] >= self.client_limit:
+            self._reject(priority, "client_limit")
+            raise AdmissionError(
+                429, "client_limit", f"Too many concurrent requests for client (limit {self.client_limit}).", 1
+            )
+        if self.max_queue > 0 and self._queued[priority] >= self.max_queue:
+            self._reject(priority, "queue_full")
+            raise AdmissionError(503, "queue_full", f"The {priority} queue is full.", 1)
+
+        budget = self.deadlines.get(priority, 0.0) if deadline_s is None else deadline_s
+        deadline = time.monotonic() + budget if budget and budget > 0 else None
+        ticket = _Ticket(fn, priority, client, deadline, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), ticket))
+        self._queued[priority] += 1
+        self._clients[client] += 1
+        self._counts[priority]["admitted"] += 1
+        self._update_depth()
+        self._dispatch()
+        try:
+            if deadline is not None:
+                await asyncio.wait({ticket.future}, timeout=max(0.0, deadline - time.monotonic()))
+                if not ticket.future.done() and not ticket.started:
+                    # Still queued past its deadline: drop it here, _dispatch skips it.
+                    ticket.future.cancel()
+                    self._unqueue(ticket)
+                    self._shed(ticket)
+            return await ticket.future
+        except asyncio.CancelledError:
+            if not ticket.started:
+                ticket.future.cancel()
+                self._unqueue(ticket)
+                self._update_depth()
+                if ticket.deadline is not None and time.monotonic() >= ticket.deadline:
+                    raise AdmissionError(504, "deadline", "Request deadline expired while queued.") from None
+            raise
+        finally:
+            self._clients[client] -= 1
+            if self._clients[client] <= 0:
+                del self._clients[client]
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._heap and sum(self._running.values()) < self.concurrency:
+            _, _, ticket = heapq.heappop(self._heap)
+            if not ticket.queued:  # cancelled by the caller or already shed
+                self._dead -= 1
+                continue
+            ticket.queued = False
+            self._queued[ticket.priority] -= 1
+            now = time.monotonic()
+            if ticket.deadline is not None and now >= ticket.deadline:
+                ticket.future.cancel()
+                self._shed(ticket)
+                continue
+            SCHED_WAIT_SECONDS.observe(now - ticket.enqueued, priority=ticket.priority)
+            ticket.started = True
+            self._running[ticket.priority] += 1
+            job = loop.run_in_executor(self._executor, ticket.fn)
+            job.add_done_callback(lambda job, ticket=ticket: self._finished(ticket, job))
+        self._update_depth()
+
+    def _finished(self, ticket: _Ticket, job: asyncio.Future) -> None:
+        self._running[ticket.priority] -= 1
+        self._counts[ticket.priority]["completed"] += 1
+        if not ticket.future.done():
+            if job.exception() is not None:
+                ticket.future.set_exception(job.exception())
+            else:
+                ticket.future.set_result(job.result())
+        self._dispatch()
+
+    def _unqueue(self, ticket: _Ticket) -> None:
+        """Stop counting a ticket dropped while queued; its heap entry is skipped on pop."""
+        if not ticket.queued:
+            return
+        ticket.queued = False
+        self._queued[ticket.priority] -= 1
+        self._dead += 1
+        if self._dead > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if entry[2].queued]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def _shed(self, ticket: _Ticket) -> None:
+        self._counts[ticket.priority]["shed_deadline"] += 1
+        SCHED_REJECTED_TOTAL.inc(priority=ticket.priority, reason="deadline")
+        self._update_depth()
+
+    def _reject(self, priority: str, reason: str) -> None:
+        self._counts[priority][f"rejected_{reason}"] += 1
+        SCHED_REJECTED_TOTAL.inc(priority=priority, reason=reason)
+
+    def _update_depth(self) -> None:
+        QUEUE_DEPTH.set(sum(self._queued.values()) + sum(self._running.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        classes = {}
+        for priority in PRIORITIES:
+            waiting = [t.enqueued for _, _, t in self._heap if t.priority == priority and not t.future.done()]
+            classes[priority] = {
+                "queued": len(waiting),
+                "running": self._running[priority],
+                "oldest_wait_seconds": now - min(waiting) if waiting else 0.0,
+                "deadline_seconds": self.deadlines.get(priority) or None,
+                "admitted": self._counts[priority]["admitted"],
+                "completed": self._counts[priority]["completed"],
+                "shed_deadline": self._counts[priority]["shed_deadline"],
+                "rejected_client_limit": self._counts[priority]["rejected_client_limit"],
+                "rejected_queue_full": self._counts[priority]["rejected_queue_full"],
+            }
+        return {
+            "concurrency": self.concurrency,
+            "client_limit": self.client_limit,
+            "max_queue": self.max_queue,
+            "classes": classes,
+            "clients": dict(self._clients),
+        }
+
+
+_scheduler: Optional[InferenceScheduler] = None
+
+
+def get_scheduler() -> InferenceScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = InferenceScheduler(
+            client_limit=SCHED_CLIENT_LIMIT,
+            max_queue=SCHED_MAX_QUEUE,
+            deadlines={"interactive": SCHED_DEADLINE_INTERACTIVE_S, "batch": SCHED_DEADLINE_BATCH_S},
+        )
+    return _scheduler
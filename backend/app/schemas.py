@@ -1,13 +1,18 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
+from parameters import BATCH_SIZE, EPOCHS, IMG_SIZE, TRAIN_DEVICE
+
 
 class TrainRequest(BaseModel):
     model_name: str
-    epochs: int
-    batch_size: int
-    img_size: int
-    device: str = "cpu"
+    epochs: int = EPOCHS
+    batch_size: int = BATCH_SIZE
+    img_size: int = IMG_SIZE
+    device: str = TRAIN_DEVICE  # auto, cpu, cuda[:N], N or mps
+    # "latest" or an experiment dir under RESULTS_DIR; epochs/batch/img size then come from its last.pt
+    resume: Optional[str] = None
+    keep_checkpoints: Optional[int] = None
 
     model_config = {"protected_namespaces": ()}
 
@@ -57,20 +62,60 @@ class PredictResult(BaseModel):
     description: str
     overlay_image: Optional[str] = None
     debug_info: Optional[dict] = None
+    prediction_id: Optional[str] = None
+    # Per-instance masks when requested: {"class_id", "class_name", "confidence", "area",
+    # "bbox": [x, y, w, h], "rle": {"size", "counts"} | "polygons": [[x1, y1, ...], ...]}
+    mask_format: Optional[str] = None
+    masks: Optional[List[dict]] = None
 
     model_config = {"protected_namespaces": ()}
 
 
 class ReportRequest(BaseModel):
+    # Either a stored prediction id, or the full prediction + images inline.
+    prediction_id: Optional[str] = None
+    filename: str = ""
+    model_used: str = ""
+    conf_th: Optional[float] = None
+    iou_th: Optional[float] = None
+    min_mask_area: Optional[int] = None
+    has_tumor: bool = False
+    confidence: float = 0.0
+    description: str = ""
+    image_original: Optional[str] = None
+    image_overlay: Optional[str] = None
+
+    model_config = {"protected_namespaces": ()}
+
+
+class StudyReportRequest(BaseModel):
+    # Stored predictions, in the order they appear in the report.
+    prediction_ids: List[str]
+    study: str = ""
+
+
+class PredictionRecord(BaseModel):
+    id: str
+    created_at: float
+    last_access: float
     filename: str
-    model_used: str
-    conf_th: float
-    iou_th: float
-    min_mask_area: int
+    model_used: Optional[str] = None
+    model_version: Optional[str] = None
+    conf_th: Optional[float] = None
+    iou_th: Optional[float] = None
+    min_mask_area: Optional[int] = None
     has_tumor: bool
     confidence: float
-    description: str = ""
-    image_original: str
-    image_overlay: Optional[str] = None
+    description: Optional[str] = None
+    image_hash: str
+    overlay_hash: Optional[str] = None
+    mask_hash: Optional[str] = None
 
     model_config = {"protected_namespaces": ()}
+
+
+class PredictionPage(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    items: List[PredictionRecord]
@@ -0,0 +1,208 @@
+"""
+Pre-fork serving: load the model once, then fork uvicorn workers from it.
+
+The parent loads and warms the YOLO model (weights read, layers fused, predictor
+built), freezes the GC so later collections do not dirty the shared pages, binds
+the listening socket and forks the workers. The weights stay shared
+copy-on-write, so each extra worker costs its private working memory instead of
+another model copy. Each worker gets its own torch thread budget. With more than
+one worker, background jobs are shared through JOBS_DB so any worker can report
+or stream a job another worker started.
+
+    python -m backend.app.serving --workers 4
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import uvicorn
+
+from parameters import IMG_SIZE, INFER_THREADS, JOBS_DB, SERVE_HOST, SERVE_PORT, SERVE_WORKERS
+from .cpu_tuning import configure_worker
+
+logger = logging.getLogger("backend.serving")
+STARTUP_FAILURE = 3  # worker exit code when the app fails to start, as uvicorn.run reports it
+
+
+def preload_model() -> bool:
+    """
+    Load and warm the model in the parent. Returns False when the model has to be
+    loaded per worker instead (a CUDA context cannot be inherited across fork).
+    """
+    import torch
+    from yolotrainer.custom_predictor import YoloPredictor
+    from .models import registry
+
+    if registry.predictor_options().get("device", "cpu").startswith("cuda"):
+        logger.warning("Inference runs on CUDA; workers load their own model instead of sharing the parent's.")
+        return False
+    model = registry.get()
+    # Warm up on one thread so the OpenMP pool is first started in the workers, after fork.
+    torch.set_num_threads(1)
+    blank = np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+    YoloPredictor(model=model, **registry.predictor_options()).predict_image(
+        blank, img_size=IMG_SIZE, conf_th=0.5, iou_th=0.5
+    )
+    return True
+
+
+def memory_footprint(pids: List[int]) -> Dict[int, Dict[str, int]]:
+    """Rss/Pss/private bytes per process from /proc/<pid>/smaps_rollup (Linux only)."""
+    out = {}
+    for pid in pids:
+        fields = {}
+        try:
+            with open(f"/proc/{pid}/smaps_rollup", "r", encoding="ascii") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                        fields[parts[0][:-1]] = int(parts[1]) * 1024
+        except OSError:
+            continue
+        out[pid] = {
+            "rss": fields.get("Rss", 0),
+            "pss": fields.get("Pss", 0),
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        }
+    return out
+
+
+def _run_worker(config: uvicorn.Config, sock, slot: int, workers: int, threads: Optional[int]) -> None:
+    from .models import registry
+
+    registry.cpu_config = configure_worker(slot, workers, threads)
+    logger.info(
+        "worker %d: %d torch threads, cores %s",
+        slot,
+        registry.cpu_config["threads"],
+        registry.cpu_config["cores"] or "unpinned",
+    )
+    code = 1
+    try:
+        server = uvicorn.Server(config)
+        server.run(sockets=[sock])
+        code = 0 if server.started else STARTUP_FAILURE
+    except Exception:
+        logger.exception("worker %d crashed", slot)
+    finally:
+        os._exit(code)
+
+
+class PreforkServer:
+    def __init__(self, host: str, port: int, workers: int, threads: Optional[int] = None, log_level: str = "info"):
+        from .main import app
+
+        self.workers = max(1, workers)
+        self.threads = threads
+        self.config = uvicorn.Config(app, host=host, port=port, log_level=log_level, lifespan="on")
+        self.children: Dict[int, int] = {}  # pid -> worker slot
+        self._stopping = False
+
+    def _spawn(self, slot: int, sock) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            _run_worker(self.config, sock, slot, self.workers, self.threads)
+        self.children[pid] = slot
+        logger.info("worker %d started (pid %d)", slot, pid)
+
+    def _stop(self, signum, _frame) -> None:
+        self._stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        shared = preload_model()
+        if self.workers > 1:
+            from .jobs import jobs
+
+            jobs.share(JOBS_DB)
+        # Move everything allocated so far out of GC tracking: collections in the
+        # workers would otherwise touch (and un-share) these objects' pages.
+        gc.collect()
+        gc.freeze()
+        sock = self.config.bind_socket()
+        logger.info(
+            "serving on %s:%d with %d workers (model %s)",
+            self.config.host,
+            self.config.port,
+            self.workers,
+            "shared copy-on-write" if shared else "loaded per worker",
+        )
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.workers):
+            self._spawn(slot, sock)
+
+        reported = False
+        started = time.monotonic()
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if not reported and time.monotonic() - started > 5.0:
+                    reported = True
+                    for child, mem in memory_footprint([os.getpid(), *self.children]).items():
+                        logger.info(
+                            "pid %d: rss %.0f MiB, pss %.0f MiB, private %.0f MiB",
+                            child,
+                            mem["rss"] / 2**20,
+                            mem["pss"] / 2**20,
+                            mem["private"] / 2**20,
+                        )
+                time.sleep(0.5)
+                continue
+            slot = self.children.pop(pid, None)
+            if slot is None or self._stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)  # -N when killed by signal N
+            if code == 0:
+                logger.info("worker %d (pid %d) stopped", slot, pid)
+            elif code == STARTUP_FAILURE:
+                # a restart would fail the same way
+                logger.error("worker %d (pid %d) failed to start; shutting down", slot, pid)
+                self._stop(None, None)
+            else:
+                logger.warning("worker %d (pid %d) exited with code %d; restarting", slot, pid, code)
+                self._spawn(slot, sock)
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked workers sharing one model copy.")
+    parser.add_argument("--host", type=str, default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=INFER_THREADS,
+        help="Torch threads per worker (0 = cores / workers, or the pinned core count).",
+    )
+    parser.add_argument("--log-level", type=str, default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    server = PreforkServer(
+        args.host,
+        args.port,
+        args.workers,
+        args.threads or None,
+        log_level=args.log_level,
+    )
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+A double-click or a client retry after a timeout sends the same upload again
+before the first request has produced anything the prediction store could
+answer from. Callers that arrive with the same key while a computation is
+running await that computation instead of starting their own. The work runs as
+its own task, so a leader whose client disconnects does not cancel it for the
+followers. Only a result is shared: a follower whose leader failed with an error
+matching `retry_if` (e.g. the leader's own deadline or client limit) runs `fn`
+itself. Coalescing is per process; pre-fork workers do not share flights.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        retry_if: Optional[Callable[[BaseException], bool]] = None,
+    ) -> Tuple[Any, bool]:
+        """Result of `fn()` for `key`, and whether it was shared with an earlier caller."""
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            return await asyncio.shield(task), False
+        try:
+            return await asyncio.shield(task), True
+        except Exception as exc:
+            if retry_if is None or not retry_if(exc):
+                raise
+        # the leader's failure was its own; this caller submits its own work
+        return await fn(), False
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller went away
@@ -0,0 +1,375 @@
+"""
+Local prediction store: SQLite metadata plus content-addressed blobs on disk.
+
+Blobs (upload, overlay PNG, RLE mask JSON) are keyed by SHA-256 so identical content is
+stored once. Predictions are keyed by image hash + parameters + model version,
+so re-submitting the same image returns the stored result. Disk use is bounded
+by a TTL on last access plus LRU eviction down to a byte budget.
+
+The bytes held by blobs are a counter in the database, kept in step with blob
+inserts and deletes and recomputed only when a process opens the store. Saves and
+eviction run in write transactions (BEGIN IMMEDIATE), so one pre-fork worker cannot
+unlink a blob that another worker has just referenced.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from parameters import STORE_DIR, STORE_ENABLED, STORE_MAX_BYTES, STORE_TTL_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    media_type TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    filename TEXT NOT NULL,
+    params_key TEXT NOT NULL,
+    image_hash TEXT NOT NULL,
+    overlay_hash TEXT,
+    mask_hash TEXT,
+    model_used TEXT,
+    model_version TEXT,
+    conf_th REAL,
+    iou_th REAL,
+    min_mask_area INTEGER,
+    has_tumor INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    description TEXT,
+    debug_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_lookup ON predictions (image_hash, params_key);
+CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions (created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_access ON predictions (last_access);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+MASK_MEDIA_TYPE = "application/json"  # {"size", "union": RLE, "instances": [...]}
+BLOB_KINDS = {"image": "image_hash", "overlay": "overlay_hash", "mask": "mask_hash"}
+RECORD_FIELDS = (
+    "id",
+    "created_at",
+    "last_access",
+    "filename",
+    "model_used",
+    "model_version",
+    "conf_th",
+    "iou_th",
+    "min_mask_area",
+    "has_tumor",
+    "confidence",
+    "description",
+    "image_hash",
+    "overlay_hash",
+    "mask_hash",
+)
+
+
+@contextmanager
+def _write_transaction(conn: sqlite3.Connection):
+    """BEGIN IMMEDIATE: take the database write lock up front, commit or roll back on exit."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def params_key(
+    conf_th: float,
+    iou_th: float,
+    min_mask_area: int,
+    img_size: int,
+    model_version: Optional[str],
+    preview_max_side: Optional[int] = None,
+    gate: Optional[tuple] = None,
+) -> str:
+    """`gate` is (threshold, img_size) when the early-exit gate is on."""
+    key = f"conf={conf_th:.6f};iou={iou_th:.6f};area={int(min_mask_area)};img={int(img_size)};model={model_version}"
+    if preview_max_side is not None:
+        key = f"{key};preview={int(preview_max_side)}"
+    if gate:
+        key = f"{key};gate={float(gate[0]):.6f}@{int(gate[1])}"
+    return key
+
+
+class PredictionStore:
+    def __init__(self, root: str, max_bytes: int, ttl_seconds: float):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.blob_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.root / "predictions.sqlite3"), timeout=30.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            with _write_transaction(conn):
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+                conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('blob_bytes', ?)", (total,))
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _blob_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM store_meta WHERE key = 'blob_bytes'").fetchone()[0]
+
+    @staticmethod
+    def _add_blob_bytes(conn: sqlite3.Connection, delta: int) -> None:
+        conn.execute("UPDATE store_meta SET value = value + ? WHERE key = 'blob_bytes'", (delta,))
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def _put_blob(self, conn: sqlite3.Connection, data: Optional[bytes], media_type: str) -> Optional[str]:
+        if data is None:
+            return None
+        digest = content_hash(data)
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{digest}.{uuid.uuid4().hex}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO blobs (hash, size, media_type, created_at) VALUES (?, ?, ?, ?)",
+            (digest, len(data), media_type, time.time()),
+        ).rowcount
+        if inserted:
+            self._add_blob_bytes(conn, len(data))
+        return digest
+
+    def find(self, image_hash: str, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored prediction for this image + parameters, refreshing its LRU stamp."""
+        with self._lock:
+            conn = self._db()
+            row = conn.execute(
+                "SELECT * FROM predictions WHERE image_hash = ? AND params_key = ? ORDER BY created_at DESC LIMIT 1",
+                (image_hash, key),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE predictions SET last_access = ? WHERE id = ?", (time.time(), row["id"]))
+            conn.commit()
+            return self._record(row)
+
+    def save(
+        self,
+        *,
+        filename: str,
+        key: str,
+        image: bytes,
+        image_media_type: str,
+        overlay_png: Optional[bytes],
+        mask_json: Optional[bytes],
+        result: Dict[str, Any],
+        model_version: Optional[str],
+    ) -> str:
+        now = time.time()
+        prediction_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._db()
+            # the blob files and the row referencing them land in one write transaction
+            with _write_transaction(conn):
+                image_hash = self._put_blob(conn, image, image_media_type)
+                overlay_hash = self._put_blob(conn, overlay_png, "image/png")
+                mask_hash = self._put_blob(conn, mask_json, MASK_MEDIA_TYPE)
+                conn.execute(
+                    """
+                    INSERT INTO predictions (
+                        id, created_at, last_access, filename, params_key, image_hash, overlay_hash, mask_hash,
+                        model_used, model_version, conf_th, iou_th, min_mask_area, has_tumor, confidence,
+                        description, debug_json
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        prediction_id,
+                        now,
+                        now,
+                        filename,
+                        key,
+                        image_hash,
+                        overlay_hash,
+                        mask_hash,
+                        result.get("model_used"),
+                        model_version,
+                        result.get("conf_th"),
+                        result.get("iou_th"),
+                        result.get("min_mask_area"),
+                        int(bool(result.get("has_tumor"))),
+                        float(result.get("confidence", 0.0)),
+                        result.get("description"),
+                        json.dumps(result.get("debug_info")) if result.get("debug_info") is not None else None,
+                    ),
+                )
+            self._evict_locked(conn)
+        return prediction_id
+
+    def get(self, prediction_id: str, touch: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._db()
+            row = conn.execute("SELECT * FROM predictions WHERE id = ?", (prediction_id,)).fetchone()
+            if row is None:
+                return None
+            if touch:
+                conn.execute("UPDATE predictions SET last_access = ? WHERE id = ?", (time.time(), prediction_id))
+                conn.commit()
+            return self._record(row)
+
+    def read_blob(self, digest: Optional[str]) -> Optional[bytes]:
+        if not digest:
+            return None
+        try:
+            return self._blob_path(digest).read_bytes()
+        except OSError:
+            return None
+
+    def blob_media_type(self, digest: str) -> str:
+        with self._lock:
+            row = self._db().execute("SELECT media_type FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        return row["media_type"] if row else "application/octet-stream"
+
+    def query(
+        self,
+        has_tumor: Optional[bool] = None,
+        filename: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        clauses, args = [], []
+        if has_tumor is not None:
+            clauses.append("has_tumor = ?")
+            args.append(int(has_tumor))
+        if filename:
+            clauses.append("filename LIKE ?")
+            args.append(f"%{filename}%")
+        if since is not None:
+            clauses.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            args.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            conn = self._db()
+            total = conn.execute(f"SELECT COUNT(*) FROM predictions {where}", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM predictions {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*args, limit, offset),
+            ).fetchall()
+        return {"total": total, "limit": limit, "offset": offset, "items": [self._record(r) for r in rows]}
+
+    def evict(self) -> Dict[str, int]:
+        with self._lock:
+            return self._evict_locked(self._db())
+
+    def _evict_locked(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        with _write_transaction(conn):
+            return self._evict_in_transaction(conn)
+
+    def _evict_in_transaction(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        expired = 0
+        removed_blobs = 0
+        if self.ttl_seconds > 0:
+            expired = conn.execute(
+                "DELETE FROM predictions WHERE last_access < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            if expired:
+                removed_blobs += self._remove_orphans(conn)
+
+        evicted = 0
+        if self.max_bytes > 0:
+            used = self._blob_bytes(conn)
+            if used > self.max_bytes:
+                # Walk the LRU order once: a blob frees its bytes when its last referencing row goes.
+                sizes = {row["hash"]: row["size"] for row in conn.execute("SELECT hash, size FROM blobs")}
+                rows = conn.execute(
+                    "SELECT image_hash, overlay_hash, mask_hash FROM predictions ORDER BY last_access ASC, id ASC"
+                ).fetchall()
+                refs = Counter(h for row in rows for h in set(row) if h)
+                for row in rows:
+                    if used <= self.max_bytes:
+                        break
+                    evicted += 1
+                    for h in set(row):
+                        if h:
+                            refs[h] -= 1
+                            if refs[h] == 0:
+                                used -= sizes.get(h, 0)
+                conn.execute(
+                    "DELETE FROM predictions WHERE id IN "
+                    "(SELECT id FROM predictions ORDER BY last_access ASC, id ASC LIMIT ?)",
+                    (evicted,),
+                )
+                removed_blobs += self._remove_orphans(conn)
+        return {"expired": expired, "evicted": evicted, "blobs_removed": removed_blobs}
+
+    def _remove_orphans(self, conn: sqlite3.Connection) -> int:
+        """Delete blobs no prediction references. Call inside the eviction write transaction."""
+        orphans = conn.execute(
+            """
+            SELECT hash, size FROM blobs WHERE hash NOT IN (
+                SELECT image_hash FROM predictions
+                UNION SELECT overlay_hash FROM predictions WHERE overlay_hash IS NOT NULL
+                UNION SELECT mask_hash FROM predictions WHERE mask_hash IS NOT NULL
+            )
+            """
+        ).fetchall()
+        removed = 0
+        for row in orphans:
+            try:
+                self._blob_path(row["hash"]).unlink(missing_ok=True)
+            except OSError:
+                continue
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (row["hash"],))
+            self._add_blob_bytes(conn, -row["size"])
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = {name: row[name] for name in RECORD_FIELDS}
+        record["has_tumor"] = bool(record["has_tumor"])
+        return record
+
+
+_store: Optional[PredictionStore] = None
+
+
+def get_store() -> Optional[PredictionStore]:
+    """Process-wide store, or None when PREDICTION_STORE is disabled."""
+    global _store
+    if not STORE_ENABLED:
+        return None
+    if _store is None:
+        _store = PredictionStore(STORE_DIR, STORE_MAX_BYTES, STORE_TTL_SECONDS)
+    return _store
@@ -0,0 +1,70 @@
+"""
+Stand-in for the YOLO model when STUB_MODEL is set (load tests, CI, no best.pt).
+
+It returns ultralytics-shaped results (boxes, masks, orig_img, speed) from a cheap
+intensity threshold, so the whole request path — tumor rule, RLE, preview, store —
+runs unchanged. STUB_MODEL_LATENCY_MS adds a fixed sleep per image to stand in
+for the forward pass.
+"""
+import time
+
+import numpy as np
+
+STUB_NAMES = {0: "meningioma", 1: "notumor"}
+
+
+class _StubBoxes:
+    def __init__(self, xyxy: np.ndarray, cls: np.ndarray, conf: np.ndarray):
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+
+class _StubMasks:
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+
+class _StubResult:
+    def __init__(self, orig_img: np.ndarray, boxes: _StubBoxes, masks, speed: dict):
+        self.orig_img = orig_img
+        self.orig_shape = orig_img.shape[:2]
+        self.boxes = boxes
+        self.masks = masks
+        self.speed = speed
+
+
+class StubModel:
+    names = STUB_NAMES
+    predictor = None
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    def _detect(self, image: np.ndarray, conf_th: float) -> _StubResult:
+        t0 = time.perf_counter()
+        gray = image.mean(axis=2, dtype=np.float32)
+        mask = gray > gray.mean() + 2.0 * gray.std()
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+        ys, xs = np.nonzero(mask)
+        conf = float(min(0.95, 0.5 + 20.0 * mask.mean())) if len(xs) else 0.0
+        if conf > conf_th:
+            boxes = _StubBoxes(
+                np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]], dtype=np.float32),
+                np.zeros(1, dtype=np.float32),
+                np.array([conf], dtype=np.float32),
+            )
+            masks = _StubMasks(mask[None].astype(np.float32))
+        else:
+            empty = np.zeros(0, dtype=np.float32)
+            boxes, masks = _StubBoxes(np.zeros((0, 4), dtype=np.float32), empty, empty), None
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        return _StubResult(image, boxes, masks, {"preprocess": 0.0, "inference": elapsed_ms, "postprocess": 0.0})
+
+    def predict(self, source, conf: float = 0.25, **_kwargs):
+        sources = source if isinstance(source, list) else [source]
+        return [self._detect(np.asarray(image), conf) for image in sources]
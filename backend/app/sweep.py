@@ -0,0 +1,317 @@
+"""
+Hyperparameter sweep over `train_model` with asynchronous successive halving (ASHA).
+
+Trials are sampled from a search space (img_size, batch_size, lr0 and ultralytics
+augmentation gains) and trained in parallel worker processes. Each trial runs the
+full epoch schedule, but at every rung epoch (min_epochs * eta**k) it reports its
+validation mAP and stops unless it is in the top 1/eta of all trials that reached
+that rung so far. Everything lands in one experiment dir:
+
+    results/sweep_<timestamp>/
+        sweep.json              search space, budget, rungs and the ranked trials
+        trials.jsonl            one line per finished trial
+        trial_000/train/...     ultralytics run (weights, results.csv)
+        trial_000/metrics.json
+
+    python -m backend.app.sweep --trials 16 --workers 2 --min-epochs 3 --eta 3 --max-epochs 27
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import yaml
+
+from parameters import BATCH_SIZE, EPOCHS, IMG_SIZE, SEED, TRAIN_DEVICE
+from .cpu_tuning import apply_thread_env, available_cores
+from .utils import experiment_dir
+
+DEFAULT_METRIC = "metrics/mAP50-95(M)"
+TRAIN_ARGS = {"img_size", "batch_size"}  # train_model arguments; everything else goes to ultralytics
+
+DEFAULT_SPACE: Dict[str, Any] = {
+    "img_size": [256, 320, 416],
+    "batch_size": [8, 16],
+    "lr0": {"loguniform": [1e-4, 1e-2]},
+    "fliplr": [0.0, 0.5],
+    "degrees": {"uniform": [0.0, 15.0]},
+    "scale": {"uniform": [0.2, 0.6]},
+    "hsv_v": {"uniform": [0.0, 0.4]},
+    "mosaic": [0.0, 1.0],
+}
+
+
+def load_space(path: Optional[str]) -> Dict[str, Any]:
+    """Search space from a JSON/YAML file, or DEFAULT_SPACE."""
+    if not path:
+        return dict(DEFAULT_SPACE)
+    with open(path, "r", encoding="utf-8") as f:
+        space = yaml.safe_load(f)  # JSON is valid YAML
+    if not isinstance(space, dict) or not space:
+        raise ValueError(f"{path}: expected a mapping of parameter -> values.")
+    return space
+
+
+def check_space(space: Dict[str, Any]) -> None:
+    """Reject keys ultralytics would not accept before any trial starts."""
+    from ultralytics.cfg import DEFAULT_CFG_DICT
+
+    unknown = sorted(k for k in space if k not in TRAIN_ARGS and k not in DEFAULT_CFG_DICT)
+    if unknown:
+        raise ValueError(f"Unknown training arguments in search space: {unknown}")
+    for key, spec in space.items():
+        if isinstance(spec, dict) and not (len(spec) == 1 and next(iter(spec)) in ("uniform", "loguniform", "int")):
+            raise ValueError(f"{key}: use a list of choices, a constant or one of uniform/loguniform/int [lo, hi].")
+
+
+def sample_config(space: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    """
+    One configuration: lists are choices, {"uniform"|"loguniform"|"int": [lo, hi]} are
+    ranges and anything else is a constant.
+    """
+    config = {}
+    for key, spec in space.items():
+        if isinstance(spec, list):
+            config[key] = rng.choice(spec)
+        elif isinstance(spec, dict):
+            kind, (lo, hi) = next(iter(spec.items()))
+            if kind == "uniform":
+                config[key] = rng.uniform(lo, hi)
+            elif kind == "loguniform":
+                config[key] = math.exp(rng.uniform(math.log(lo), math.log(hi)))
+            else:
+                config[key] = rng.randint(int(lo), int(hi))
+        else:
+            config[key] = spec
+    return config
+
+
+def rung_epochs(min_epochs: int, eta: int, max_epochs: int) -> List[int]:
+    """Epochs at which trials are compared: min_epochs * eta**k below max_epochs."""
+    rungs, epoch = [], max(1, min_epochs)
+    while epoch < max_epochs:
+        rungs.append(epoch)
+        epoch *= max(2, eta)
+    return rungs
+
+
+def asha_continue(score: float, recorded: List[float], eta: int) -> bool:
+    """Keep a trial when its score is not below the (1 - 1/eta) quantile of its rung."""
+    cutoff = np.nanpercentile(np.asarray(recorded, dtype=np.float64), (1.0 - 1.0 / eta) * 100.0)
+    return bool(score >= cutoff) or math.isnan(cutoff)
+
+
+def run_trial(
+    trial_id: int,
+    config: Dict[str, Any],
+    sweep_dir: str,
+    data_yaml: str,
+    model_name: str,
+    device: str,
+    max_epochs: int,
+    rungs: List[int],
+    eta: int,
+    metric: str,
+    threads: int,
+    rung_scores,
+    lock,
+    stop_event,
+) -> Dict[str, Any]:
+    """Train one configuration in a worker process; `rung_scores` is shared by all trials."""
+    apply_thread_env(threads)
+    import torch
+
+    torch.set_num_threads(threads)
+    from .train_predict import train_model
+
+    trial_dir = Path(sweep_dir) / f"trial_{trial_id:03d}"
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    overrides = {k: v for k, v in config.items() if k not in TRAIN_ARGS}
+    overrides.setdefault("workers", threads)
+    overrides.setdefault("seed", SEED)
+    record: Dict[str, Any] = {
+        "trial": trial_id,
+        "config": config,
+        "dir": str(trial_dir),
+        "status": "completed",
+        "history": [],
+        "rungs": {},
+    }
+
+    def should_stop(m: Dict[str, Any]) -> bool:
+        score = float(m["metrics"].get(metric, float("nan")))
+        record["history"].append({"epoch": m["epoch"], "score": score, "train_loss": m["train_loss"]})
+        if stop_event.is_set():
+            record["status"] = "budget"
+            return True
+        if m["epoch"] not in rungs:
+            return False
+        with lock:
+            recorded = rung_scores.get(m["epoch"], []) + [score]
+            rung_scores[m["epoch"]] = recorded
+        record["rungs"][str(m["epoch"])] = score
+        if asha_continue(score, recorded, eta):
+            return False
+        record["status"] = "stopped"
+        return True
+
+    start = time.perf_counter()
+    try:
+        out = train_model(
+            model_name,
+            epochs=max_epochs,
+            batch_size=int(config.get("batch_size", BATCH_SIZE)),
+            img_size=int(config.get("img_size", IMG_SIZE)),
+            device=device,
+            should_stop=should_stop,
+            exp_dir=str(trial_dir),
+            data_yaml=data_yaml,
+            overrides=overrides,
+            keep_checkpoints=0,
+        )
+        record["best_model_path"] = out["best_model_path"]
+    except Exception as exc:  # one bad configuration should not end the sweep
+        record["status"] = "failed"
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    scores = [h["score"] for h in record["history"] if not math.isnan(h["score"])]
+    record["epochs_run"] = len(record["history"])
+    record["best_score"] = max(scores) if scores else None
+    record["seconds"] = round(time.perf_counter() - start, 1)
+    return record
+
+
+def run_sweep(
+    space: Dict[str, Any],
+    trials: int,
+    workers: int = 1,
+    min_epochs: int = 3,
+    eta: int = 3,
+    max_epochs: int = EPOCHS,
+    time_budget_s: float = 0.0,
+    metric: str = DEFAULT_METRIC,
+    model_name: str = "custom",
+    device: str = TRAIN_DEVICE,
+    seed: int = SEED,
+    threads: int = 0,
+) -> Dict[str, Any]:
+    """
+    Run `trials` sampled configurations, `workers` at a time. With a time budget no new
+    trial starts after the deadline and running trials stop at their next epoch end.
+    """
+    from yolotrainer.build_data import prepare_yolo_data
+
+    check_space(space)
+    data_yaml = prepare_yolo_data(classes=["meningioma", "notumor"])
+    sweep_dir = experiment_dir("sweep")
+    rungs = rung_epochs(min_epochs, eta, max_epochs)
+    threads = threads or max(1, len(available_cores()) // max(1, workers))
+    summary: Dict[str, Any] = {
+        "sweep_dir": sweep_dir,
+        "data_yaml": data_yaml,
+        "space": space,
+        "metric": metric,
+        "budget": {"trials": trials, "workers": workers, "threads_per_trial": threads, "time_budget_s": time_budget_s},
+        "asha": {"min_epochs": min_epochs, "eta": eta, "max_epochs": max_epochs, "rungs": rungs},
+        "seed": seed,
+        "trials": [],
+    }
+    summary_path = Path(sweep_dir) / "sweep.json"
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    rng = random.Random(seed)
+    deadline = time.monotonic() + time_budget_s if time_budget_s > 0 else None
+    ctx = mp.get_context("spawn")  # fresh torch state per trial
+    manager = ctx.Manager()
+    rung_scores, lock, stop_event = manager.dict(), manager.Lock(), manager.Event()
+    results: List[Dict[str, Any]] = []
+    submitted = 0
+    with manager, ProcessPoolExecutor(max_workers=workers, mp_context=ctx, max_tasks_per_child=1) as pool:
+        running = set()
+
+        def submit():
+            nonlocal submitted
+            config = sample_config(space, rng)
+            running.add(pool.submit(
+                run_trial, submitted, config, sweep_dir, data_yaml, model_name, device, max_epochs,
+                rungs, eta, metric, threads, rung_scores, lock, stop_event,
+            ))
+            submitted += 1
+
+        try:
+            while submitted < min(trials, workers):
+                submit()
+            while running:
+                timeout = max(0.0, deadline - time.monotonic()) if deadline and not stop_event.is_set() else None
+                done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                if deadline and time.monotonic() >= deadline:
+                    stop_event.set()
+                for future in done:
+                    record = future.result()
+                    results.append(record)
+                    with open(Path(sweep_dir) / "trials.jsonl", "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record) + "\n")
+                    print(
+                        f"trial {record['trial']:03d} {record['status']:<9} epochs={record['epochs_run']:<3} "
+                        f"score={record['best_score']} {record['config']}",
+                        flush=True,
+                    )
+                    if submitted < trials and not stop_event.is_set():
+                        submit()
+        except KeyboardInterrupt:
+            stop_event.set()
+            done, _ = wait(running)
+            results.extend(f.result() for f in done if not f.cancelled() and f.exception() is None)
+
+    ranked = sorted(results, key=lambda r: -1.0 if r["best_score"] is None else r["best_score"], reverse=True)
+    summary["trials"] = [
+        {k: r.get(k) for k in ("trial", "status", "best_score", "epochs_run", "seconds", "config", "best_model_path")}
+        for r in ranked
+    ]
+    summary["best"] = summary["trials"][0] if summary["trials"] else None
+    summary["epochs_total"] = sum(r["epochs_run"] for r in results)
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep with ASHA early stopping.")
+    parser.add_argument("--space", type=str, default=None, help="JSON/YAML search space (default: built-in).")
+    parser.add_argument("--trials", type=int, default=16, help="Configurations to sample.")
+    parser.add_argument("--workers", type=int, default=1, help="Trials trained in parallel.")
+    parser.add_argument("--threads", type=int, default=0, help="Torch threads per trial (0 = cores / workers).")
+    parser.add_argument("--min-epochs", type=int, default=3, help="First rung.")
+    parser.add_argument("--eta", type=int, default=3, help="Reduction factor: keep the top 1/eta per rung.")
+    parser.add_argument("--max-epochs", type=int, default=EPOCHS, help="Epochs for trials that are never stopped.")
+    parser.add_argument("--time-budget-hours", type=float, default=0.0, help="Wall-clock budget (0 = none).")
+    parser.add_argument("--metric", type=str, default=DEFAULT_METRIC, help="Validation metric to maximise.")
+    parser.add_argument("--device", type=str, default=TRAIN_DEVICE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    summary = run_sweep(
+        load_space(args.space),
+        trials=args.trials,
+        workers=args.workers,
+        min_epochs=args.min_epochs,
+        eta=args.eta,
+        max_epochs=args.max_epochs,
+        time_budget_s=args.time_budget_hours * 3600,
+        metric=args.metric,
+        device=args.device,
+        seed=args.seed,
+        threads=args.threads,
+    )
+    print(f"sweep dir: {summary['sweep_dir']}  epochs trained: {summary['epochs_total']}")
+    if summary["best"]:
+        print(f"best: trial {summary['best']['trial']:03d} {args.metric}={summary['best']['best_score']}")
+        print(json.dumps(summary["best"]["config"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,93 @@
 from pathlib import Path
-from typing import Dict, Any
-from ultralytics import YOLO
+from typing import Any, Callable, Dict, Optional
 
-from parameters import RESULTS_DIR, CUSTOM_MODEL_WEIGHTS
+from parameters import RESULTS_DIR, CUSTOM_MODEL_WEIGHTS, TRAIN_DEVICE, TRAIN_KEEP_CHECKPOINTS
 from yolotrainer.build_data import prepare_yolo_data
+from .checkpoints import CheckpointRetention, resolve_resume
+from .device import resolve_device
 from .utils import experiment_dir, save_metrics
 
 MODEL_WEIGHTS = {
     "custom": CUSTOM_MODEL_WEIGHTS,
 }
+# Trained from scratch by backend/app/compress.py (distilled from "custom"), no starting weights
+COMPRESSED_MODELS = ("lite",)
+
+
+def epoch_metrics(trainer) -> Dict[str, Any]:
+    """
+    Per-epoch losses, validation metrics and learning rates from an ultralytics trainer.
+    ultralytics fires the same callback once more after the last epoch when it validates
+    best.pt; that call is flagged with final=True.
+    """
+    losses = trainer.label_loss_items(trainer.tloss, prefix="train") if trainer.tloss is not None else {}
+    final = trainer.epoch >= trainer.epochs
+    return {
+        "epoch": min(trainer.epoch + 1, trainer.epochs),
+        "epochs": trainer.epochs,
+        "final": final,
+        "train_loss": {k: float(v) for k, v in losses.items()},
+        "metrics": {k: float(v) for k, v in (trainer.metrics or {}).items()},
+        "lr": {k: float(v) for k, v in (getattr(trainer, "lr", None) or {}).items()},
+    }
+
 
 def train_model(
     model_name: str,
     epochs: int,
     batch_size: int,
     img_size: int,
-    device: str = "cpu",
+    device: str = TRAIN_DEVICE,
+    on_epoch: Optional[Callable[[Dict[str, Any]], None]] = None,
+    should_stop: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    exp_dir: Optional[str] = None,
+    data_yaml: Optional[str] = None,
+    overrides: Optional[Dict[str, Any]] = None,
+    resume: Optional[str] = None,
+    keep_checkpoints: Optional[int] = TRAIN_KEEP_CHECKPOINTS,
+    weights: Optional[str] = None,
+    trainer: Optional[type] = None,
 ) -> Dict[str, Any]:
-    if model_name not in MODEL_WEIGHTS:
-        raise ValueError(f"Unsupported model_name '{model_name}'. Use one of: {list(MODEL_WEIGHTS.keys())}")
+    """
+    Train one configuration. `overrides` are extra ultralytics train arguments (lr0,
+    augmentation gains, ...); `should_stop` sees the same per-epoch metrics as `on_epoch`
+    and ends training after that epoch when it returns True.
+
+    `resume` continues an interrupted run (see checkpoints.resolve_resume) in its own
+    experiment dir with the epochs, image size and batch size stored in its last.pt.
+    `keep_checkpoints` best epoch snapshots are kept besides last.pt/best.pt (None: no pruning).
 
-    exp_dir = experiment_dir(model_name)
+    `weights` (a .pt or model yaml) and `trainer` (an ultralytics trainer class) replace the
+    defaults for `model_name`; "lite" without `weights` runs compress.train_lite_model, and
+    cannot be resumed: its distill, prune and fine-tune stages only run as one pipeline.
+    `device` "auto" picks an available GPU; a GPU that is not present falls back to cpu.
+    """
+    if model_name not in MODEL_WEIGHTS and model_name not in COMPRESSED_MODELS:
+        supported = list(MODEL_WEIGHTS) + list(COMPRESSED_MODELS)
+        raise ValueError(f"Unsupported model_name '{model_name}'. Use one of: {supported}")
+    if model_name in COMPRESSED_MODELS and resume:
+        raise ValueError(f"A '{model_name}' run cannot be resumed; start a new one instead.")
+    device = resolve_device(device)
+    if model_name in COMPRESSED_MODELS and weights is None:
+        from .compress import train_lite_model
+
+        return train_lite_model(
+            epochs,
+            batch_size,
+            img_size,
+            device=device,
+            on_epoch=on_epoch,
+            keep_checkpoints=keep_checkpoints,
+        )
+
+    last = resolve_resume(resume, model_name, restrict_to=None) if resume else None
+    exp_dir = str(last.parents[2]) if last else exp_dir or experiment_dir(model_name)
     classes = ["meningioma", "notumor"]
-    data_yaml = prepare_yolo_data(classes=classes)
+    data_yaml = data_yaml or prepare_yolo_data(classes=classes)
+
+    weights_path = str(last) if last else weights or MODEL_WEIGHTS[model_name]
+    from ultralytics import YOLO
 
-    weights_path = MODEL_WEIGHTS[model_name]
     try:
         model = YOLO(weights_path)
     except Exception as exc:
@@ -32,18 +95,47 @@ def train_model(
             f"Failed to load weights '{weights_path}'. Ensure the file exists or can be downloaded."
         ) from exc
 
-    results = model.train(
-        data=data_yaml,
-        epochs=epochs,
-        imgsz=img_size,
-        batch=batch_size,
-        project=exp_dir,
-        name="train",
-        device=device,
-        verbose=False,
-    )
+    if on_epoch is not None or should_stop is not None:
+        stopped = False
+
+        def _on_fit_epoch_end(trainer):
+            nonlocal stopped
+            metrics = epoch_metrics(trainer)
+            if stopped and not metrics["final"]:
+                # best.pt validation after an early stop (patience or should_stop)
+                metrics.update(epoch=trainer.epoch, final=True)
+            if on_epoch is not None:
+                on_epoch(metrics)
+            if should_stop is not None and not metrics["final"] and should_stop(metrics):
+                trainer.stop = True
+            stopped = bool(trainer.stop)
+
+        model.add_callback("on_fit_epoch_end", _on_fit_epoch_end)
+    if keep_checkpoints is not None:
+        CheckpointRetention(keep_checkpoints).attach(model)
 
-    best_model_path = Path(exp_dir) / "train" / "weights" / "best.pt"
+    if last:
+        # ultralytics restores every other argument (epochs, imgsz, batch, project) from last.pt
+        results = model.train(
+            resume=True, data=data_yaml, device=device, verbose=False, trainer=trainer, **(overrides or {})
+        )
+        args = model.trainer.args
+        epochs, img_size, batch_size = args.epochs, args.imgsz, args.batch
+        best_model_path = last.parent / "best.pt"
+    else:
+        results = model.train(
+            data=data_yaml,
+            epochs=epochs,
+            imgsz=img_size,
+            batch=batch_size,
+            project=exp_dir,
+            name="train",
+            device=device,
+            verbose=False,
+            trainer=trainer,
+            **(overrides or {}),
+        )
+        best_model_path = Path(exp_dir) / "train" / "weights" / "best.pt"
 
     metrics = {
         "model_name": model_name,
@@ -51,7 +143,10 @@ def train_model(
         "img_size": img_size,
         "batch_size": batch_size,
         "device": device,
+        **(overrides or {}),
     }
+    if last:
+        metrics["resumed_from"] = str(last)
 
     metrics_path = save_metrics(metrics, exp_dir)
 
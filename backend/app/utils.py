@@ -1,9 +1,10 @@
-import os
 import datetime
 import json
 from pathlib import Path
 from typing import Dict, Any
-from parameters import RESULTS_DIR, DATA_DIR, DATASET_DIR
+import parameters
+from parameters import RESULTS_DIR, DATA_DIR
+from yolotrainer.dataset_index import get_index
 
 def timestamp() -> str:
     return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -25,7 +26,7 @@ def safe_filename(name: str) -> str:
 
 def dataset_dir() -> str:
     """Return preferred dataset directory (env DATASET_DIR or default DATA_DIR)."""
-    return DATASET_DIR
+    return parameters.DATASET_DIR
 
 def dataset_ready() -> bool:
     """Dataset is ready if data.yaml exists and train/images is present."""
@@ -36,13 +37,16 @@ def dataset_ready() -> bool:
     return train_images.exists()
 
 def dataset_path() -> str | None:
-    """Return the first found data.yaml path in DATASET_DIR or fallback DATA_DIR."""
-    for root, _, files in os.walk(DATASET_DIR):
-        for f in files:
-            if f.endswith((".yaml", ".yml")):
-                return str(Path(root) / f)
-    for root, _, files in os.walk(DATA_DIR):
-        for f in files:
-            if f.endswith((".yaml", ".yml")):
-                return str(Path(root) / f)
+    """Return the data.yaml path in DATASET_DIR or fallback DATA_DIR (cached dataset index)."""
+    for root in (parameters.DATASET_DIR, DATA_DIR):
+        data_yaml = get_index(root).data_yaml
+        if data_yaml is not None:
+            return str(data_yaml)
     return None
+
+def dataset_splits() -> dict:
+    """Image/label counts per split of DATASET_DIR."""
+    return {
+        name: {"images": split["images"], "labels": split["labels"]}
+        for name, split in get_index(parameters.DATASET_DIR).splits.items()
+    }
@@ -5,37 +5,28 @@ from pathlib import Path
 import yaml
 from PIL import Image, ImageDraw
 
+from yolotrainer.dataset_index import split_dirs
+from yolotrainer.labels import load_labels
+
 IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
 
 
-def resolve_train_images(data_yaml: Path):
+SPLIT_ALIASES = {"valid": "val", "validation": "val"}
+
+
+def resolve_split_images(data_yaml: Path, split: str = "train"):
     data = yaml.safe_load(data_yaml.read_text(encoding="utf-8"))
-    train = data.get("train")
-    if not train:
-        raise ValueError("data.yaml missing 'train' entry.")
+    key = SPLIT_ALIASES.get(split, split)
+    entry = data.get(key)
+    if not entry:
+        raise ValueError(f"data.yaml missing '{key}' entry.")
 
-    base = data_yaml.parent
     paths = []
-
-    def add_path(p):
-        if isinstance(p, (list, tuple)):
-            for item in p:
-                add_path(item)
-            return
-        p = str(p)
-        has_glob = any(ch in p for ch in ["*", "?", "["])
-        if has_glob:
-            root = Path(p)
-            if not root.is_absolute():
-                root = base / root
-            paths.extend(root.parent.glob(root.name))
-            return
-        path = Path(p)
-        if not path.is_absolute():
-            path = base / path
-        paths.append(path)
-
-    add_path(train)
+    for path in split_dirs(data_yaml, data, entry):
+        if any(ch in path.name for ch in ["*", "?", "["]):
+            paths.extend(path.parent.glob(path.name))
+        else:
+            paths.append(path)
 
     images = []
     for p in paths:
@@ -44,7 +35,11 @@ def resolve_train_images(data_yaml: Path):
                 images.extend(p.rglob(f"*{ext}"))
         elif p.is_file() and p.suffix.lower() in IMG_EXTS:
             images.append(p)
-    return images
+    return sorted(images)
+
+
+def resolve_train_images(data_yaml: Path):
+    return resolve_split_images(data_yaml, "train")
 
 
 def resolve_expected_class_ids(data: dict) -> set[int]:
@@ -117,45 +112,34 @@ def main():
     bad_format = 0
     out_of_range = 0
 
+    label_sets = {}
     for img_path in sample:
         label_path = label_path_for_image(img_path)
-        if not label_path.exists() or label_path.stat().st_size == 0:
+        if label_path.parent not in label_sets:
+            labels = load_labels(label_path.parent)
+            label_sets[label_path.parent] = (labels, labels.poly_out_of_range())
+        labels, poly_out_of_range = label_sets[label_path.parent]
+        fid = labels.file_id(label_path)
+        first, last = (labels.file_offsets[fid], labels.file_offsets[fid + 1]) if fid >= 0 else (0, 0)
+        if fid < 0 or (first == last and labels.bad_lines[fid] == 0):
             empty_labels += 1
             continue
+        bad_format += int(labels.bad_lines[fid])
 
         polygons = []
-        lines = label_path.read_text(encoding="utf-8").strip().splitlines()
-        for line in lines:
-            parts = line.strip().split()
-            if len(parts) < 3:
-                bad_format += 1
-                continue
-            try:
-                cls_id = int(float(parts[0]))
-                coords = [float(x) for x in parts[1:]]
-            except Exception:
-                bad_format += 1
-                continue
-
-            if cls_id not in expected_class_ids:
+        points = labels.points()
+        w, h = Image.open(img_path).size
+        for p in range(first, last):
+            if int(labels.poly_class[p]) not in expected_class_ids:
                 bad_class += 1
                 continue
 
-            if len(coords) % 2 != 0:
-                bad_format += 1
-                continue
-
-            if any(c < 0.0 or c > 1.0 for c in coords):
+            if poly_out_of_range[p]:
                 out_of_range += 1
                 continue
 
-            w, h = Image.open(img_path).size
-            pts = []
-            for i in range(0, len(coords), 2):
-                x = coords[i] * w
-                y = coords[i + 1] * h
-                pts.append((x, y))
-            polygons.append(pts)
+            pts = points[labels.poly_offsets[p]:labels.poly_offsets[p + 1]] * (w, h)
+            polygons.append([tuple(pt) for pt in pts.tolist()])
 
         if polygons:
             out_path = debug_dir / img_path.name
@@ -3,6 +3,54 @@ import axios from 'axios'
 // Allow overriding via env; default to direct FastAPI dev server.
 const baseURL = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000'
 
+// One id per browser, so the backend's per-client limit does not lump together
+// everyone behind the same NAT or proxy address.
+function clientId() {
+  let id = localStorage.getItem('clientId')
+  if (!id) {
+    // randomUUID is only available in secure contexts (https or localhost)
+    id = crypto.randomUUID?.() ?? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+    localStorage.setItem('clientId', id)
+  }
+  return id
+}
+
 export const api = axios.create({
   baseURL,
+  headers: { 'X-Client-Id': clientId() },
 })
+
+export const absoluteUrl = (path) => (path && path.startsWith('/') ? `${baseURL}${path}` : path)
+
+// Start a batch/volume prediction; per-slice results arrive through streamJob().
+export async function startBatchPredict(files, { priority = 'interactive' } = {}) {
+  const formData = new FormData()
+  for (const f of files) formData.append('files', f)
+  const { data } = await api.post('/predict/batch', formData, {
+    headers: { 'Content-Type': 'multipart/form-data', 'X-Priority': priority },
+  })
+  return data
+}
+
+export async function startTrainingJob(params) {
+  const { data } = await api.post('/train/jobs', params)
+  return data
+}
+
+// Subscribe to a job's Server-Sent Events. EventSource reconnects on its own and
+// resumes after the last received event id. Returns a function that closes the stream.
+export function streamJob(jobId, handlers = {}) {
+  const source = new EventSource(`${baseURL}/jobs/${jobId}/events`)
+  for (const name of ['result', 'item_error', 'epoch', 'final_eval']) {
+    if (handlers[name]) {
+      source.addEventListener(name, (e) => handlers[name](JSON.parse(e.data)))
+    }
+  }
+  for (const name of ['done', 'failed']) {
+    source.addEventListener(name, (e) => {
+      source.close()
+      handlers[name]?.(JSON.parse(e.data))
+    })
+  }
+  return () => source.close()
+}
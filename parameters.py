@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -14,6 +15,10 @@ ROBOFLOW_FORMAT = "yolov8"
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_BEST = Path(PROJECT_ROOT) / "best.pt"
 CUSTOM_MODEL_WEIGHTS = os.getenv("CUSTOM_MODEL_WEIGHTS", str(DEFAULT_BEST))
+# Distilled/pruned CPU model (backend/app/compress.py), served as model_choice=lite
+LITE_MODEL_WEIGHTS = os.getenv("LITE_MODEL_WEIGHTS", str(Path(PROJECT_ROOT) / "best_lite.pt"))
+# Model used by /predict when the request does not choose one
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "custom")
 
 # Training parameters
 IMG_SIZE = 256
@@ -21,13 +26,40 @@ BATCH_SIZE = 8
 EPOCHS = 50
 LEARNING_RATE = 1e-3
 SEED = 42
+# Best epoch snapshots kept next to last.pt/best.pt (backend/app/checkpoints.py)
+TRAIN_KEEP_CHECKPOINTS = int(os.getenv("TRAIN_KEEP_CHECKPOINTS", "2"))
+# Lite model compression: student width relative to best.pt, channel pruning, fine-tune epochs
+LITE_WIDTH_RATIO = float(os.getenv("LITE_WIDTH_RATIO", "0.5"))
+LITE_PRUNE_RATIO = float(os.getenv("LITE_PRUNE_RATIO", "0.5"))
+LITE_FINETUNE_EPOCHS = int(os.getenv("LITE_FINETUNE_EPOCHS", "10"))
+
+# Threshold calibration written by scripts/calibrate_thresholds.py (env vars still win)
+CALIBRATION_FILE = os.getenv("CALIBRATION_FILE", str(Path(PROJECT_ROOT) / "calibration.json"))
+
+
+def _load_calibration(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            selected = json.load(f).get("selected") or {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+    return selected if isinstance(selected, dict) else {}
+
+
+CALIBRATED = _load_calibration(CALIBRATION_FILE)
 
 # Inference parameters (aggressive defaults for higher recall)
 INFER_IMG_SIZE = int(os.getenv("INFER_IMG_SIZE", "1024"))
-CONF_TH = float(os.getenv("CONF_TH", "0.01"))
-IOU_TH = float(os.getenv("IOU_TH", "0.30"))
-MIN_MASK_AREA = int(os.getenv("MIN_MASK_AREA", "0"))
+CONF_TH = float(os.getenv("CONF_TH", CALIBRATED.get("conf_th", "0.01")))
+IOU_TH = float(os.getenv("IOU_TH", CALIBRATED.get("iou_th", "0.30")))
+MIN_MASK_AREA = int(os.getenv("MIN_MASK_AREA", CALIBRATED.get("min_mask_area", "0")))
+# Early-exit gate written by scripts/calibrate_gate.py: slices whose low-resolution tumor
+# score is below GATE_THRESHOLD skip segmentation and the overlay (0 = gate off)
+GATE_THRESHOLD = float(os.getenv("GATE_THRESHOLD", CALIBRATED.get("gate_threshold", "0")))
+GATE_IMG_SIZE = int(os.getenv("GATE_IMG_SIZE", CALIBRATED.get("gate_img_size", "128")))
 DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+# Longest side of the overlay returned by /predict; 0 = original image size
+PREVIEW_MAX_SIDE = int(os.getenv("PREVIEW_MAX_SIDE", "512"))
 
 # Paths
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
@@ -47,10 +79,72 @@ def _find_local_dataset_dir() -> str | None:
     return str(candidates[0])
 
 
-DEFAULT_DATASET_DIR = _find_local_dataset_dir() or DATA_DIR
-DATASET_DIR = os.getenv("DATASET_DIR", DEFAULT_DATASET_DIR)
+def __getattr__(name: str):
+    # DEFAULT_DATASET_DIR / DATASET_DIR scan PROJECT_ROOT, so resolve them on first access
+    # instead of at import time.
+    if name == "DEFAULT_DATASET_DIR":
+        value = _find_local_dataset_dir() or DATA_DIR
+    elif name == "DATASET_DIR":
+        env = os.getenv("DATASET_DIR")
+        value = env if env is not None else __getattr__("DEFAULT_DATASET_DIR")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
 RESULTS_DIR = os.path.join(PROJECT_ROOT, "results")
 REPORTS_DIR = os.path.join(PROJECT_ROOT, "reports")
 
-for d in [DATA_DIR, RESULTS_DIR, REPORTS_DIR]:
-    os.makedirs(d, exist_ok=True)
+# Dataset downloads (yolotrainer/download_manager.py)
+ROBOFLOW_API_URL = os.getenv("ROBOFLOW_API_URL", "https://api.roboflow.com")
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache", "datasets"))
+DATASET_DOWNLOAD_WORKERS = int(os.getenv("DATASET_DOWNLOAD_WORKERS", "4"))
+DATASET_DOWNLOAD_CHUNK_MB = float(os.getenv("DATASET_DOWNLOAD_CHUNK_MB", "8"))
+
+# Prediction store (SQLite metadata + content-addressed blobs)
+STORE_ENABLED = os.getenv("PREDICTION_STORE", "true").lower() in ("1", "true", "yes")
+STORE_DIR = os.getenv("PREDICTION_STORE_DIR", os.path.join(RESULTS_DIR, "store"))
+STORE_MAX_BYTES = int(float(os.getenv("PREDICTION_STORE_MAX_MB", "2048")) * 1024 * 1024)
+STORE_TTL_SECONDS = float(os.getenv("PREDICTION_STORE_TTL_HOURS", "168")) * 3600
+
+# Study reports (POST /report/study)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))  # threads decoding and downscaling images
+REPORT_MAX_SLICES = int(os.getenv("REPORT_MAX_SLICES", "500"))
+
+# Pre-fork serving (python -m backend.app.serving)
+SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "1"))
+# Job state and events shared by the workers when SERVE_WORKERS > 1 (backend/app/jobs.py)
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(RESULTS_DIR, "jobs.sqlite3"))
+JOB_EVENT_HISTORY = int(os.getenv("JOB_EVENT_HISTORY", "256"))  # most recent events kept per job for replay
+
+# CPU inference threading (backend/app/cpu_tuning.py), applied when a model is loaded
+INFER_THREADS = int(os.getenv("INFER_THREADS", "0"))  # torch intra-op threads per worker; 0 = cores / workers
+INFER_INTEROP_THREADS = int(os.getenv("INFER_INTEROP_THREADS", "0"))  # 0 = torch default
+INFER_PIN_CORES = os.getenv("INFER_PIN_CORES", "false").lower() in ("1", "true", "yes")
+INFER_SET_OMP_ENV = os.getenv("INFER_SET_OMP_ENV", "true").lower() in ("1", "true", "yes")
+
+# Inference device and precision (backend/app/device.py): auto picks CUDA, then MPS, then CPU and
+# a missing accelerator falls back to CPU; precision auto = fp16 on CUDA, fp32 elsewhere
+INFER_DEVICE = os.getenv("INFER_DEVICE", "auto")
+INFER_PRECISION = os.getenv("INFER_PRECISION", "auto")  # auto, fp32, fp16, bf16
+INFER_CHANNELS_LAST = os.getenv("INFER_CHANNELS_LAST", "false").lower() in ("1", "true", "yes")
+INFER_COMPILE = os.getenv("INFER_COMPILE", "false")  # false, true or a torch.compile mode
+TRAIN_DEVICE = os.getenv("TRAIN_DEVICE", "auto")
+
+# Inference admission control (backend/app/scheduler.py)
+SCHED_CLIENT_LIMIT = int(os.getenv("SCHED_CLIENT_LIMIT", "4"))  # queued + running per client; 0 = unlimited
+SCHED_MAX_QUEUE = int(os.getenv("SCHED_MAX_QUEUE", "64"))  # per priority class; 0 = unbounded
+SCHED_DEADLINE_INTERACTIVE_S = float(os.getenv("SCHED_DEADLINE_INTERACTIVE_S", "30"))  # 0 = no deadline
+SCHED_DEADLINE_BATCH_S = float(os.getenv("SCHED_DEADLINE_BATCH_S", "0"))
+# Without X-Client-Id the client is the peer address. Behind N trusted reverse proxies set this to N
+# to take the address they appended to X-Forwarded-For instead; 0 ignores the header (it can be spoofed).
+SCHED_FORWARDED_HOPS = int(os.getenv("SCHED_FORWARDED_HOPS", "0"))
+
+# Stub model instead of best.pt (backend/app/stub_model.py), e.g. for scripts/loadtest.py
+STUB_MODEL = os.getenv("STUB_MODEL", "false").lower() in ("1", "true", "yes")
+STUB_MODEL_LATENCY_MS = float(os.getenv("STUB_MODEL_LATENCY_MS", "0"))
+
+# Output directories are created by whatever writes into them (no import-time makedirs).
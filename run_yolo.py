@@ -1,23 +1,79 @@
 """Simple CLI to train YOLO model without FastAPI."""
 import argparse
 from backend.app.train_predict import train_model
-from parameters import IMG_SIZE, BATCH_SIZE, EPOCHS
+from parameters import (
+    IMG_SIZE,
+    BATCH_SIZE,
+    EPOCHS,
+    TRAIN_DEVICE,
+    TRAIN_KEEP_CHECKPOINTS,
+    LITE_WIDTH_RATIO,
+    LITE_PRUNE_RATIO,
+    LITE_FINETUNE_EPOCHS,
+)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--model", type=str, default="custom", choices=["custom"])
+    parser.add_argument("--model", type=str, default="custom", choices=["custom", "lite"],
+                        help="lite: distill a smaller student from best.pt (see backend/app/compress.py)")
     parser.add_argument("--epochs", type=int, default=EPOCHS)
     parser.add_argument("--batch", type=int, default=BATCH_SIZE)
     parser.add_argument("--img", type=int, default=IMG_SIZE)
-    parser.add_argument("--device", type=str, default="cpu", help="Device string passed to Ultralytics (e.g., cpu, 0)")
+    parser.add_argument("--device", type=str, default=TRAIN_DEVICE,
+                        help="auto, cpu, 0, cuda:0, mps; an unavailable GPU falls back to cpu")
+    parser.add_argument(
+        "--resume",
+        type=str,
+        nargs="?",
+        const="latest",
+        default=None,
+        help="Continue an interrupted run: experiment dir, last.pt path, or no value for the latest run.",
+    )
+    parser.add_argument(
+        "--keep-checkpoints",
+        type=int,
+        default=TRAIN_KEEP_CHECKPOINTS,
+        help="Best epoch snapshots kept besides last.pt and best.pt.",
+    )
+    lite = parser.add_argument_group("lite model compression")
+    lite.add_argument("--width", type=float, default=LITE_WIDTH_RATIO, help="Student width relative to best.pt.")
+    lite.add_argument("--prune", type=float, default=LITE_PRUNE_RATIO, help="Channel pruning ratio (0 = none).")
+    lite.add_argument("--finetune-epochs", type=int, default=LITE_FINETUNE_EPOCHS, help="Epochs after pruning.")
+    lite.add_argument("--no-eval", action="store_true", help="Skip the teacher/student test-split comparison.")
     args = parser.parse_args()
 
-    out = train_model(
-        model_name=args.model,
-        epochs=args.epochs,
-        batch_size=args.batch,
-        img_size=args.img,
-        device=args.device,
-    )
+    if args.model == "lite" and args.resume:
+        parser.error("--resume is not supported for --model lite; start a new run.")
+    if args.model == "lite":
+        from backend.app.compress import train_lite_model
+
+        out = train_lite_model(
+            args.epochs,
+            args.batch,
+            args.img,
+            device=args.device,
+            width_ratio=args.width,
+            prune_ratio=args.prune,
+            finetune_epochs=args.finetune_epochs,
+            evaluate=not args.no_eval,
+            keep_checkpoints=args.keep_checkpoints,
+        )
+    else:
+        out = train_model(
+            model_name=args.model,
+            epochs=args.epochs,
+            batch_size=args.batch,
+            img_size=args.img,
+            device=args.device,
+            resume=args.resume,
+            keep_checkpoints=args.keep_checkpoints,
+        )
     print("Training finished.")
     print("Best model:", out["best_model_path"])
+    comparison = out["metrics"].get("comparison")
+    if comparison:
+        for name in ("teacher", "student"):
+            entry = comparison[name]
+            print(f"{name}: {entry['latency_ms']:.1f} ms/image, sensitivity={entry.get('sensitivity')}, "
+                  f"dice={entry.get('mean_dice')}")
+        print(f"Speedup: {comparison.get('speedup', 0):.2f}x (serve it with LITE_MODEL_WEIGHTS)")
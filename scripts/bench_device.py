@@ -0,0 +1,141 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.device import parse_compile, resolve_device, resolve_precision
+from parameters import CONF_TH, CUSTOM_MODEL_WEIGHTS, IMG_SIZE, IOU_TH, MIN_MASK_AREA
+from yolotrainer.custom_predictor import YoloPredictor, load_image_bgr
+
+
+def default_configs() -> list[str]:
+    """Every option on CPU, plus the accelerator precisions when one is present."""
+    import torch
+
+    configs = ["cpu/fp32", "cpu/fp32+cl", "cpu/bf16", "cpu/bf16+cl", "cpu/fp32+compile"]
+    if torch.cuda.is_available():
+        configs += ["cuda/fp32", "cuda/fp16", "cuda/fp16+cl", "cuda/bf16"]
+    if resolve_device("auto") == "mps":
+        configs += ["mps/fp32", "mps/fp16"]
+    return configs
+
+
+def parse_config(text: str) -> dict:
+    """device/precision[+cl][+compile[=mode]], e.g. cpu/bf16+cl or cuda/fp16+compile=max-autotune."""
+    head, *flags = text.strip().split("+")
+    device, _, precision = head.partition("/")
+    options = {"device": device, "precision": precision or "fp32", "channels_last": False, "compile": False}
+    for flag in flags:
+        name, _, value = flag.partition("=")
+        if name == "cl":
+            options["channels_last"] = True
+        elif name == "compile":
+            options["compile"] = parse_compile(value or "true")
+        else:
+            raise ValueError(f"Unknown option '{flag}' in '{text}'")
+    return options
+
+
+def run_config(options: dict, images, args) -> dict:
+    import torch
+
+    predictor = YoloPredictor(weights_path=args.weights, **options)
+    tumor_class_idx = predictor._resolve_tumor_class_idx(default_idx=0)
+    kwargs = dict(img_size=args.img, conf_th=args.conf, iou_th=args.iou)
+    sync = torch.cuda.synchronize if options["device"].startswith("cuda") else (lambda: None)
+
+    start = time.perf_counter()
+    for i in range(args.warmup):
+        predictor.release(predictor.predict_image(images[i % len(images)], **kwargs))
+    warmup_s = time.perf_counter() - start
+
+    latencies, decisions, confs = [], [], []
+    for i in range(max(args.iters, len(images))):
+        t0 = time.perf_counter()
+        res = predictor.predict_image(images[i % len(images)], **kwargs)
+        sync()
+        latencies.append(time.perf_counter() - t0)
+        if i < len(images):
+            has_tumor, conf, _ = predictor.decide(res, tumor_class_idx, MIN_MASK_AREA)
+            decisions.append(has_tumor)
+            confs.append(conf)
+        predictor.release(res)
+    lat = np.asarray(latencies) * 1000.0
+    return {
+        "warmup_s": warmup_s,
+        "images": len(lat),
+        "throughput_ips": len(lat) / (lat.sum() / 1000.0),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "decisions": decisions,
+        "confidences": confs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark inference device / precision / channels-last / torch.compile options. "
+        "Options the hardware cannot run natively are reported as skipped."
+    )
+    parser.add_argument("--weights", type=str, default=CUSTOM_MODEL_WEIGHTS)
+    parser.add_argument("--images", type=str, required=True, help="Directory of sample images.")
+    parser.add_argument("--limit", type=int, default=16, help="Images loaded into memory (and compared).")
+    parser.add_argument("--img", type=int, default=IMG_SIZE)
+    parser.add_argument("--conf", type=float, default=CONF_TH)
+    parser.add_argument("--iou", type=float, default=IOU_TH)
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed runs per config (torch.compile traces here).")
+    parser.add_argument("--iters", type=int, default=32, help="Timed runs per config.")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads; 0 = torch default.")
+    parser.add_argument("--configs", type=str, default=None, help="Comma list like cpu/fp32,cpu/bf16+cl,cuda/fp16.")
+    parser.add_argument("--out", type=str, default=None, help="Write results as JSON.")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    images = [load_image_bgr(p.read_bytes()) for p in paths[: args.limit]]
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    import torch
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    configs = args.configs.split(",") if args.configs else default_configs()
+    print(f"{len(images)} images, {args.iters} timed runs per config, torch threads {torch.get_num_threads()}")
+    print("config\timg/s\tp50 ms\tp95 ms\twarmup s\tagree\tmax |dconf|")
+    results, baseline = [], None
+    for text in configs:
+        requested = parse_config(text)
+        device = resolve_device(requested["device"])
+        precision = resolve_precision(requested["precision"], device)
+        if device.split(":")[0] != requested["device"].split(":")[0] or precision != requested["precision"]:
+            print(f"{text}\tskipped (runs as {device}/{precision} here)")
+            results.append({"config": text, "skipped": True, "device": device, "precision": precision})
+            continue
+        row = run_config({**requested, "device": device}, images, args)
+        if baseline is None:
+            baseline = row
+        agree = float(np.mean(np.asarray(row["decisions"]) == np.asarray(baseline["decisions"])))
+        dconf = float(np.max(np.abs(np.asarray(row["confidences"]) - np.asarray(baseline["confidences"]))))
+        row.update({"config": text, "skipped": False, "agreement": agree, "max_conf_diff": dconf})
+        results.append(row)
+        print(
+            f"{text}\t{row['throughput_ips']:.2f}\t{row['p50_ms']:.1f}\t{row['p95_ms']:.1f}\t"
+            f"{row['warmup_s']:.1f}\t{agree:.3f}\t{dconf:.4f}"
+        )
+
+    ran = [r for r in results if not r["skipped"]]
+    if ran:
+        best = max(ran, key=lambda r: r["throughput_ips"])
+        print(
+            f"Best: {best['config']} ({best['throughput_ips']:.2f} img/s; "
+            f"baseline {ran[0]['config']} {ran[0]['throughput_ips']:.2f} img/s)"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps({"threads": torch.get_num_threads(), "results": results}, indent=2),
+                                  encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def proc_memory(pid: int) -> dict:
+    """Current and peak resident memory (bytes) from /proc/<pid>/status."""
+    out = {}
+    with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                out[key] = int(value.split()[0]) * 1024
+    return {"rss": out.get("VmRSS", 0), "peak_rss": out.get("VmHWM", 0)}
+
+
+def multipart(path: Path) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    content_type = "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{path.name}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + path.read_bytes() + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def post(url: str, body: bytes, content_type: str, client: str) -> tuple[int, float]:
+    req = urllib.request.Request(
+        url, data=body, headers={"Content-Type": content_type, "X-Client-Id": client}, method="POST"
+    )
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as exc:
+        status = exc.code
+    return status, time.perf_counter() - t0
+
+
+def wait_ready(base: str, proc: subprocess.Popen, timeout: float = 120.0) -> None:
+    stop = time.monotonic() + timeout
+    while time.monotonic() < stop:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with status {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base}/health", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit("server did not become ready")
+
+
+def run_level(concurrency: int, images: list[Path], args) -> dict:
+    """Fresh server per level so VmHWM is the peak of this level only."""
+    env = dict(os.environ, PREDICTION_STORE="false", SCHED_CLIENT_LIMIT="0", SCHED_MAX_QUEUE="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_ready(base, proc)
+        bodies = [multipart(p) for p in images]
+        # Warm-up: loads the model so the baseline includes it.
+        post(f"{base}/predict", *bodies[0], client="warmup")
+        baseline = proc_memory(proc.pid)
+
+        results = []
+        lock = threading.Lock()
+
+        def _client(slot: int) -> None:
+            for i in range(args.requests):
+                body, ctype = bodies[(slot + i * concurrency) % len(bodies)]
+                status, seconds = post(f"{base}/predict", body, ctype, client=f"bench-{slot}")
+                with lock:
+                    results.append((status, seconds))
+
+        threads = [threading.Thread(target=_client, args=(slot,)) for slot in range(concurrency)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+        after = proc_memory(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    lat = np.asarray([s for _, s in results]) * 1000.0
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": sum(1 for status, _ in results if status != 200),
+        "throughput_rps": len(results) / wall if wall > 0 else None,
+        "p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+        "p95_ms": float(np.percentile(lat, 95)) if len(lat) else None,
+        "baseline_rss_mb": baseline["rss"] / 2**20,
+        "peak_rss_mb": after["peak_rss"] / 2**20,
+        "final_rss_mb": after["rss"] / 2**20,
+        "peak_over_baseline_mb": (after["peak_rss"] - baseline["rss"]) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak server RSS under N concurrent /predict requests.")
+    parser.add_argument("--images", type=str, required=True, help="Directory of sample images.")
+    parser.add_argument("--limit", type=int, default=16, help="Images used.")
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8", help="Comma list of concurrent clients.")
+    parser.add_argument("--requests", type=int, default=4, help="Requests per client.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", type=str, default=None, help="Write results as JSON.")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    images = paths[: args.limit]
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    print("clients\treqs\terrors\treq/s\tp95 ms\tbase MiB\tpeak MiB\tpeak-base MiB")
+    rows = []
+    for level in [int(x) for x in args.concurrency.split(",")]:
+        row = run_level(level, images, args)
+        rows.append(row)
+        print(
+            f"{row['concurrency']}\t{row['requests']}\t{row['errors']}\t{row['throughput_rps']:.2f}\t"
+            f"{row['p95_ms']:.0f}\t{row['baseline_rss_mb']:.0f}\t\t{row['peak_rss_mb']:.0f}\t\t"
+            f"{row['peak_over_baseline_mb']:.0f}"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps({"results": rows}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
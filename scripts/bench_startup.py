@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("torch", "ultralytics", "cv2", "reportlab", "roboflow")
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Import `module` in a fresh interpreter and return its import time and loaded heavy deps."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (str(PROJECT_ROOT), env.get("PYTHONPATH")) if p)
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=str(PROJECT_ROOT),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the API module.")
+    parser.add_argument("--module", type=str, default="backend.app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print a JSON summary instead of text.")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    times = [r["seconds"] for r in runs]
+    summary = {
+        "module": args.module,
+        "runs": args.runs,
+        "median_seconds": statistics.median(times),
+        "min_seconds": min(times),
+        "max_seconds": max(times),
+        "heavy_modules_loaded": runs[-1]["loaded"],
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{args.module}: median {summary['median_seconds']:.3f}s, min {summary['min_seconds']:.3f}s, "
+          f"max {summary['max_seconds']:.3f}s over {args.runs} runs")
+    print(f"Heavy modules loaded at import: {', '.join(summary['heavy_modules_loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.cpu_tuning import available_cores, cores_for_worker
+from parameters import CUSTOM_MODEL_WEIGHTS, CONF_TH, IMG_SIZE, IOU_TH
+from yolotrainer.custom_predictor import YoloPredictor, load_image_bgr
+
+
+def default_grid(n_cores: int, oversubscribe: bool) -> list[tuple[int, int]]:
+    """workers x threads splits that use every core once (plus each worker on all cores if asked)."""
+    grid = []
+    workers = 1
+    while workers <= n_cores:
+        grid.append((workers, max(1, n_cores // workers)))
+        if oversubscribe and workers > 1:
+            grid.append((workers, n_cores))
+        workers *= 2
+    return grid
+
+
+def parse_grid(text: str) -> list[tuple[int, int]]:
+    out = []
+    for item in text.split(","):
+        w, t = item.lower().split("x")
+        out.append((int(w), int(t)))
+    return out
+
+
+def _worker(predictor, images, slot, workers, threads, pin, barrier, deadline_s, args, queue):
+    import torch
+
+    if pin:
+        os.sched_setaffinity(0, cores_for_worker(slot, workers))
+    torch.set_num_threads(threads)
+    barrier.wait()
+    stop = time.perf_counter() + deadline_s
+    latencies = []
+    i = slot
+    while time.perf_counter() < stop:
+        t0 = time.perf_counter()
+        predictor.predict_image(images[i % len(images)], img_size=args.img, conf_th=args.conf, iou_th=args.iou)
+        latencies.append(time.perf_counter() - t0)
+        i += workers
+    queue.put(latencies)
+
+
+def run_config(predictor, images, workers, threads, args) -> dict:
+    ctx = mp.get_context("fork")
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(
+            target=_worker,
+            args=(predictor, images, slot, workers, threads, args.pin, barrier, args.duration, args, queue),
+        )
+        for slot in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    latencies = []
+    for _ in procs:
+        latencies.extend(queue.get())
+    for p in procs:
+        p.join()
+    lat = np.asarray(latencies) * 1000.0
+    return {
+        "workers": workers,
+        "threads": threads,
+        "images": len(lat),
+        "throughput_ips": len(lat) / args.duration,
+        "p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+        "p95_ms": float(np.percentile(lat, 95)) if len(lat) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best workers x torch-threads split for this machine.")
+    parser.add_argument("--weights", type=str, default=CUSTOM_MODEL_WEIGHTS)
+    parser.add_argument("--images", type=str, required=True, help="Directory of sample images.")
+    parser.add_argument("--limit", type=int, default=32, help="Images loaded into memory.")
+    parser.add_argument("--img", type=int, default=IMG_SIZE)
+    parser.add_argument("--conf", type=float, default=CONF_TH)
+    parser.add_argument("--iou", type=float, default=IOU_TH)
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per configuration.")
+    parser.add_argument("--grid", type=str, default=None, help="Comma list like 1x32,2x16,4x8 (workers x threads).")
+    parser.add_argument("--oversubscribe", action="store_true", help="Also run every worker count on all cores.")
+    parser.add_argument("--pin", action="store_true", help="Pin each worker to its own core slice.")
+    parser.add_argument("--out", type=str, default=None, help="Write results as JSON.")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    images = [load_image_bgr(p.read_bytes()) for p in paths[: args.limit]]
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    import torch
+
+    predictor = YoloPredictor(weights_path=args.weights)
+    # Warm up single-threaded so the OpenMP pool first starts inside the forked workers.
+    torch.set_num_threads(1)
+    predictor.predict_image(images[0], img_size=args.img, conf_th=args.conf, iou_th=args.iou)
+
+    n_cores = len(available_cores())
+    grid = parse_grid(args.grid) if args.grid else default_grid(n_cores, args.oversubscribe)
+    print(f"{n_cores} usable cores, {len(images)} images, {args.duration:.0f}s per config")
+    print("workers\tthreads\timg/s\tp50 ms\tp95 ms")
+    results = []
+    for workers, threads in grid:
+        row = run_config(predictor, images, workers, threads, args)
+        results.append(row)
+        print(f"{workers}\t{threads}\t{row['throughput_ips']:.2f}\t{row['p50_ms']:.1f}\t{row['p95_ms']:.1f}")
+
+    best = max(results, key=lambda r: r["throughput_ips"])
+    print(
+        f"Best: SERVE_WORKERS={best['workers']} INFER_THREADS={best['threads']} "
+        f"({best['throughput_ips']:.2f} img/s)"
+    )
+    if args.out:
+        Path(args.out).write_text(
+            json.dumps({"cores": n_cores, "pinned": args.pin, "results": results, "best": best}, indent=2),
+            encoding="utf-8",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from parameters import (
+    CALIBRATION_FILE,
+    CONF_TH,
+    CUSTOM_MODEL_WEIGHTS,
+    DATASET_DIR,
+    GATE_IMG_SIZE,
+    IMG_SIZE,
+    IOU_TH,
+    MIN_MASK_AREA,
+    RESULTS_DIR,
+)
+from yolotrainer.calibration import (
+    collect_gate_scores,
+    image_scores,
+    load_or_collect,
+    select_gate_threshold,
+    write_gate_calibration,
+)
+from yolotrainer.custom_predictor import YoloPredictor
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calibrate the early-exit gate against the production thresholds on the validation split. "
+        "Re-run after calibrate_thresholds.py, which rewrites the calibration file."
+    )
+    parser.add_argument("--data", type=str, default=str(Path(DATASET_DIR) / "data.yaml"))
+    parser.add_argument("--split", type=str, default="val")
+    parser.add_argument("--weights", type=str, default=CUSTOM_MODEL_WEIGHTS)
+    parser.add_argument("--img", type=int, default=IMG_SIZE, help="Full pipeline image size.")
+    parser.add_argument("--gate-img", type=int, default=GATE_IMG_SIZE, help="Gate image size.")
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--cache", type=str, default=str(Path(RESULTS_DIR) / "calibration_candidates.npz"))
+    parser.add_argument("--refresh", action="store_true", help="Ignore the candidate cache.")
+    parser.add_argument("--min-recall", type=float, default=0.995, help="Share of pipeline positives the gate keeps.")
+    parser.add_argument("--out", type=str, default=CALIBRATION_FILE)
+    parser.add_argument("--dry-run", action="store_true", help="Report only; do not write the calibration file.")
+    args = parser.parse_args()
+
+    predictor = YoloPredictor(weights_path=args.weights)
+    cands = load_or_collect(
+        args.cache,
+        predictor,
+        args.weights,
+        args.data,
+        split=args.split,
+        img_size=args.img,
+        batch_size=args.batch,
+        refresh=args.refresh,
+    )
+    positives = image_scores(cands, [IOU_TH], [MIN_MASK_AREA])[0, 0] > CONF_TH
+    gate_scores = collect_gate_scores(predictor, args.data, split=args.split, img_size=args.gate_img,
+                                      batch_size=args.batch)
+    labels = np.asarray(cands["labels"], dtype=bool)
+    print(f"Images: {len(labels)} (labelled tumor {int(labels.sum())}, pipeline positive {int(positives.sum())})")
+
+    gate = select_gate_threshold(gate_scores, positives, args.min_recall)
+    bypassed = gate_scores < gate["gate_threshold"]
+    gate["labelled_tumor_bypassed"] = int((bypassed & labels).sum())
+    print(
+        f"Gate threshold {gate['gate_threshold']:.4f} at {args.gate_img}px: bypass rate {gate['bypass_rate']:.1%} "
+        f"({gate['negatives_bypassed']}/{gate['negatives']} pipeline negatives), "
+        f"pipeline positives bypassed {gate['positives_bypassed']}/{gate['positives']}, "
+        f"labelled tumors bypassed {gate['labelled_tumor_bypassed']}/{int(labels.sum())}"
+    )
+    if args.dry_run:
+        return
+    path = write_gate_calibration(
+        args.out,
+        gate,
+        meta={
+            "weights": args.weights,
+            "data_yaml": args.data,
+            "split": args.split,
+            "gate_img_size": args.gate_img,
+            "reference": {"conf_th": CONF_TH, "iou_th": IOU_TH, "min_mask_area": MIN_MASK_AREA, "img_size": args.img},
+            "min_recall": args.min_recall,
+        },
+    )
+    print(f"Gate calibration saved to: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from parameters import (
+    CALIBRATION_FILE,
+    CUSTOM_MODEL_WEIGHTS,
+    DATASET_DIR,
+    IMG_SIZE,
+    RESULTS_DIR,
+)
+from yolotrainer.calibration import load_or_collect, pareto_front, search_grid, select_point, write_calibration
+from yolotrainer.custom_predictor import YoloPredictor
+
+
+def _floats(text: str) -> list[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def _ints(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate conf/iou/min_mask_area on the validation split.")
+    parser.add_argument("--data", type=str, default=str(Path(DATASET_DIR) / "data.yaml"))
+    parser.add_argument("--split", type=str, default="val")
+    parser.add_argument("--weights", type=str, default=CUSTOM_MODEL_WEIGHTS)
+    parser.add_argument("--img", type=int, default=IMG_SIZE)
+    parser.add_argument("--conf-floor", type=float, default=0.001)
+    parser.add_argument("--max-candidates", type=int, default=100, help="Boxes kept per image with NMS off.")
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--cache", type=str, default=str(Path(RESULTS_DIR) / "calibration_candidates.npz"))
+    parser.add_argument("--refresh", action="store_true", help="Ignore the candidate cache.")
+    parser.add_argument("--conf-grid", type=str, default=None, help="Comma list; default 0.005..0.95")
+    parser.add_argument("--iou-grid", type=str, default="0.2,0.3,0.4,0.5,0.6,0.7")
+    parser.add_argument("--area-grid", type=str, default="0,50,100,200,400,800")
+    parser.add_argument("--max-det", type=int, default=50)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--out", type=str, default=CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    if args.conf_grid:
+        conf_grid = _floats(args.conf_grid)
+    else:
+        conf_grid = np.round(np.concatenate([[0.005], np.arange(0.01, 0.1, 0.01), np.arange(0.1, 0.96, 0.05)]), 4)
+    conf_grid = [c for c in conf_grid if c >= args.conf_floor]
+
+    predictor = YoloPredictor(weights_path=args.weights)
+    cands = load_or_collect(
+        args.cache,
+        predictor,
+        args.weights,
+        args.data,
+        split=args.split,
+        img_size=args.img,
+        conf_floor=args.conf_floor,
+        max_candidates=args.max_candidates,
+        batch_size=args.batch,
+        refresh=args.refresh,
+    )
+    labels = cands["labels"]
+    print(f"Images: {len(labels)} (positive {int(labels.sum())}), candidates: {len(cands['conf'])}")
+    capped = int((np.bincount(cands["image_idx"], minlength=len(labels)) >= args.max_candidates).sum())
+    if capped:
+        print(f"{capped} images hit --max-candidates {args.max_candidates}; their replay is approximate "
+              f"when NMS leaves fewer than --max-det boxes (raise --max-candidates to make it exact)")
+
+    points = search_grid(cands, conf_grid, _floats(args.iou_grid), _ints(args.area_grid), max_det=args.max_det)
+    front = pareto_front(points)
+    selected = select_point(front, args.min_recall)
+
+    print(f"Grid points: {len(points)}, Pareto-optimal: {len(front)}")
+    print("conf\tiou\tmin_area\trecall\tFP")
+    for p in front:
+        print(f"{p['conf_th']:.3f}\t{p['iou_th']:.2f}\t{p['min_mask_area']}\t{p['recall']:.3f}\t{p['false_positives']}")
+
+    path = write_calibration(
+        args.out,
+        selected,
+        front,
+        meta={
+            "weights": args.weights,
+            "data_yaml": args.data,
+            "split": args.split,
+            "img_size": args.img,
+            "min_recall": args.min_recall,
+        },
+    )
+    print(
+        f"Selected conf={selected['conf_th']} iou={selected['iou_th']} min_mask_area={selected['min_mask_area']} "
+        f"(recall {selected['recall']:.3f}, FP {selected['false_positives']})"
+    )
+    print(f"Calibration saved to: {path}")
+
+
+if __name__ == "__main__":
+    main()
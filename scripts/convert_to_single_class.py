@@ -4,6 +4,8 @@ from pathlib import Path
 
 import yaml
 
+from yolotrainer.labels import load_labels
+
 NOTUMOR_NAMES = {"notumor", "no_tumor", "no-tumor", "no tumor", "background"}
 
 
@@ -85,8 +87,13 @@ def main() -> None:
     for label_dir in label_dirs:
         if not label_dir.exists():
             continue
-        for label_path in label_dir.rglob("*.txt"):
-            removed_total += convert_label_file(label_path, notumor_ids)
+        # Well-formed files whose polygons are all class 0 and not notumor stay as they are.
+        for sub in [label_dir, *sorted(p for p in label_dir.rglob("*") if p.is_dir())]:
+            labels = load_labels(sub)
+            changed = (labels.bad_lines > 0) | labels.files_with_class(notumor_ids)
+            changed[labels.poly_file[labels.poly_class != 0]] = True
+            for name in labels.names[changed].tolist():
+                removed_total += convert_label_file(sub / name, notumor_ids)
 
     data["nc"] = 1
     data["names"] = ["tumor"]
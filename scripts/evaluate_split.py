@@ -0,0 +1,82 @@
+import argparse
+import json
+from pathlib import Path
+
+from parameters import (
+    CONF_TH,
+    CUSTOM_MODEL_WEIGHTS,
+    DATASET_DIR,
+    IMG_SIZE,
+    IOU_TH,
+    MIN_MASK_AREA,
+)
+from yolotrainer.custom_predictor import YoloPredictor
+from yolotrainer.evaluation import evaluate_split
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the /predict decision rule on a dataset split.")
+    parser.add_argument("--data", type=str, default=str(Path(DATASET_DIR) / "data.yaml"))
+    parser.add_argument("--split", type=str, default="test", help="train, val/valid or test")
+    parser.add_argument("--weights", type=str, default=CUSTOM_MODEL_WEIGHTS)
+    parser.add_argument("--img", type=int, default=IMG_SIZE)
+    parser.add_argument("--conf", type=float, default=CONF_TH)
+    parser.add_argument("--iou", type=float, default=IOU_TH)
+    parser.add_argument("--min-mask-area", type=int, default=MIN_MASK_AREA)
+    parser.add_argument(
+        "--conf-floor",
+        type=float,
+        default=0.001,
+        help="Confidence used for the single inference pass; ROC points start here.",
+    )
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--out", type=str, default=None, help="Write the full JSON report here.")
+    parser.add_argument("--min-sensitivity", type=float, default=None, help="Exit non-zero below this.")
+    parser.add_argument("--min-dice", type=float, default=None, help="Exit non-zero below this mean Dice.")
+    args = parser.parse_args()
+
+    predictor = YoloPredictor(weights_path=args.weights)
+    report = evaluate_split(
+        predictor,
+        args.data,
+        split=args.split,
+        img_size=args.img,
+        conf_th=args.conf,
+        iou_th=args.iou,
+        min_mask_area=args.min_mask_area,
+        conf_floor=min(args.conf_floor, args.conf),
+        batch_size=args.batch,
+    )
+    report["weights"] = args.weights
+
+    image_level = report["image_level"]
+    seg = report["segmentation"]
+    print(f"Split: {args.split} ({report['images']} images)")
+    print(f"Weights: {args.weights}")
+    print(f"conf={args.conf} iou={args.iou} min_mask_area={args.min_mask_area} img={args.img}")
+    print(f"TP={image_level['tp']} FN={image_level['fn']} TN={image_level['tn']} FP={image_level['fp']}")
+    print(f"Sensitivity: {image_level['sensitivity']}")
+    print(f"Specificity: {image_level['specificity']}")
+    print(f"Mean Dice: {seg['mean_dice']:.4f} (positives: {seg['mean_dice_positive']})")
+    print(f"Mean IoU: {seg['mean_iou']:.4f} (positives: {seg['mean_iou_positive']})")
+    print(f"ROC AUC: {report['roc']['auc']:.4f}")
+
+    if args.out:
+        out_path = Path(args.out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Report saved to: {out_path}")
+
+    failed = False
+    if args.min_sensitivity is not None and (image_level["sensitivity"] or 0.0) < args.min_sensitivity:
+        print(f"FAIL: sensitivity below {args.min_sensitivity}")
+        failed = True
+    if args.min_dice is not None and seg["mean_dice"] < args.min_dice:
+        print(f"FAIL: mean Dice below {args.min_dice}")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+ENDPOINTS = ("predict", "report", "health")
+
+
+def parse_mix(text: str) -> dict:
+    """'predict=8,report=1,health=1' -> normalized weights."""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint {name!r}; use {ENDPOINTS}")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    return {k: v / total for k, v in mix.items() if v > 0}
+
+
+def proc_memory(pid: int) -> dict:
+    """Current and peak resident memory (bytes) from /proc/<pid>/status."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    out[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return {"rss": out.get("VmRSS", 0), "peak_rss": out.get("VmHWM", 0)}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, body: bytes | None = None, content_type: str | None = None, client: str = "loadtest"):
+    headers = {"X-Client-Id": client}
+    if content_type:
+        headers["Content-Type"] = content_type
+    req = urllib.request.Request(url, data=body, headers=headers, method="POST" if body is not None else "GET")
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            payload = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as exc:
+        payload, status = exc.read(), exc.code
+    except OSError:
+        payload, status = b"", 0
+    return status, time.perf_counter() - t0, payload
+
+
+class Payloads:
+    """Pre-built request bodies so the client side costs as little as possible."""
+
+    def __init__(self, images: list[Path]):
+        self.predict = []
+        self.originals = []
+        for path in images:
+            content_type = "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
+            data = path.read_bytes()
+            boundary = uuid.uuid4().hex
+            body = (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="file"; filename="{path.name}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n"
+            ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+            self.predict.append((body, f"multipart/form-data; boundary={boundary}"))
+            self.originals.append((path.name, f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"))
+        self.reports = []
+
+    def prime_reports(self, base: str) -> None:
+        """One /predict per image gives the overlay (or stored prediction id) /report needs."""
+        for (body, ctype), (name, original) in zip(self.predict, self.originals):
+            status, _, payload = request(f"{base}/predict", body, ctype, client="loadtest-prime")
+            if status != 200:
+                continue
+            pred = json.loads(payload)
+            if pred.get("prediction_id"):
+                report = {"prediction_id": pred["prediction_id"]}
+            else:
+                report = {
+                    "filename": name,
+                    "has_tumor": pred["has_tumor"],
+                    "confidence": pred["confidence"],
+                    "image_original": original,
+                    "image_overlay": pred.get("overlay_image"),
+                }
+            self.reports.append(json.dumps(report).encode())
+
+
+def run_level(base: str, payloads: Payloads, mix: dict, concurrency: int, args, server_pid: int | None) -> dict:
+    samples = {name: [] for name in mix}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+    names, weights = list(mix), list(mix.values())
+
+    def _client(slot: int) -> None:
+        rng = random.Random(args.seed + slot)
+        while time.perf_counter() < stop_at:
+            name = rng.choices(names, weights)[0]
+            if name == "predict":
+                body, ctype = rng.choice(payloads.predict)
+                out = request(f"{base}/predict", body, ctype, client=f"loadtest-{slot}")
+            elif name == "report" and payloads.reports:
+                out = request(f"{base}/report", rng.choice(payloads.reports), "application/json", f"loadtest-{slot}")
+            else:
+                out = request(f"{base}/health", client=f"loadtest-{slot}")
+            with lock:
+                samples[name].append(out[:2])
+
+    threads = [threading.Thread(target=_client, args=(slot,), daemon=True) for slot in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    def _summary(rows):
+        lat = np.asarray([s for _, s in rows]) * 1000.0
+        errors = sum(1 for status, _ in rows if status != 200)
+        return {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "status": {str(code): sum(1 for status, _ in rows if status == code) for code in {s for s, _ in rows}},
+            "throughput_rps": len(rows) / wall if wall > 0 else 0.0,
+            "p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+            "p90_ms": float(np.percentile(lat, 90)) if len(lat) else None,
+            "p99_ms": float(np.percentile(lat, 99)) if len(lat) else None,
+            "max_ms": float(lat.max()) if len(lat) else None,
+        }
+
+    row = {"concurrency": concurrency, "duration_s": wall}
+    row.update(_summary([s for rows in samples.values() for s in rows]))
+    row["endpoints"] = {name: _summary(rows) for name, rows in samples.items()}
+    if server_pid is not None:
+        mem = proc_memory(server_pid)
+        row["server_rss_mb"] = mem["rss"] / 2**20
+        row["server_peak_rss_mb"] = mem["peak_rss"] / 2**20
+    return row
+
+
+def start_inprocess(port: int):
+    """uvicorn in a thread of this process; RSS is then read from our own pid."""
+    import uvicorn
+    from backend.app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def start_subprocess(port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+
+
+def wait_ready(base: str, timeout: float = 120.0, proc: subprocess.Popen | None = None) -> None:
+    stop = time.monotonic() + timeout
+    while time.monotonic() < stop:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"server exited with status {proc.returncode}")
+        status, _, _ = request(f"{base}/health")
+        if status == 200:
+            return
+        time.sleep(0.5)
+    raise SystemExit(f"{base} did not become ready")
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API with a mix of /predict, /report and /health.")
+    parser.add_argument(
+        "--mode",
+        choices=("inprocess", "subprocess", "url"),
+        default="inprocess",
+        help="inprocess: uvicorn in a thread here; subprocess: spawn a local uvicorn; url: an already running server.",
+    )
+    parser.add_argument("--url", type=str, default=None, help="Base URL for --mode url.")
+    parser.add_argument("--server-pid", type=int, default=None, help="Server pid to read RSS from in --mode url.")
+    parser.add_argument("--images", type=str, default=None, help="Image directory (default: the dataset test split).")
+    parser.add_argument("--limit", type=int, default=32, help="Images used.")
+    parser.add_argument("--mix", type=str, default="predict=8,report=1,health=1")
+    parser.add_argument("--concurrency", type=str, default="1,4,16", help="Comma list of concurrent clients.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level.")
+    parser.add_argument("--stub", action="store_true", help="Use the stub model (STUB_MODEL=true) instead of best.pt.")
+    parser.add_argument(
+        "--store", action="store_true", help="Keep the prediction store on (repeat images then hit its cache)."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=str, default=None, help="Write results as JSON.")
+    args = parser.parse_args()
+
+    if args.mode == "url" and not args.url:
+        raise SystemExit("--mode url needs --url")
+    env = dict(os.environ)
+    if args.stub:
+        env["STUB_MODEL"] = "true"
+        os.environ["STUB_MODEL"] = "true"  # before parameters is imported in-process
+    if not args.store:
+        env["PREDICTION_STORE"] = os.environ["PREDICTION_STORE"] = "false"
+    # A load test measures the serving path, not the per-client fairness limits.
+    for key in ("SCHED_CLIENT_LIMIT", "SCHED_MAX_QUEUE"):
+        env.setdefault(key, "0")
+        os.environ.setdefault(key, "0")
+
+    import parameters
+
+    image_dir = Path(args.images or os.path.join(parameters.DATASET_DIR, "test", "images"))
+    paths = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))[: args.limit]
+    if not paths:
+        raise SystemExit(f"No images found in {image_dir}")
+    mix = parse_mix(args.mix)
+
+    proc = None
+    server = None
+    if args.mode == "url":
+        base, server_pid = args.url.rstrip("/"), args.server_pid
+    else:
+        port = free_port()
+        base = f"http://127.0.0.1:{port}"
+        if args.mode == "subprocess":
+            proc = start_subprocess(port, env)
+            server_pid = proc.pid
+        else:
+            server, _ = start_inprocess(port)
+            server_pid = os.getpid()
+
+    try:
+        wait_ready(base, proc=proc)
+        payloads = Payloads(paths)
+        if "report" in mix:
+            payloads.prime_reports(base)
+        print(f"{base}: {len(paths)} images, mix {args.mix}, {args.duration:.0f}s per level")
+        print("clients\treqs\terr%\treq/s\tp50 ms\tp99 ms\trss MiB")
+        levels = []
+        for concurrency in [int(x) for x in args.concurrency.split(",")]:
+            row = run_level(base, payloads, mix, concurrency, args, server_pid)
+            levels.append(row)
+            print(
+                f"{concurrency}\t{row['requests']}\t{100 * row['error_rate']:.1f}\t{row['throughput_rps']:.2f}\t"
+                f"{row['p50_ms'] or 0:.0f}\t{row['p99_ms'] or 0:.0f}\t{row.get('server_rss_mb', 0):.0f}"
+            )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if server is not None:
+            server.should_exit = True
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.time(),
+        "mode": args.mode,
+        "url": base,
+        "stub_model": env.get("STUB_MODEL", "false").lower() in ("1", "true", "yes"),
+        "prediction_store": args.store,
+        "images": len(paths),
+        "mix": mix,
+        "levels": levels,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
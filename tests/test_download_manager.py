@@ -0,0 +1,58 @@
+import hashlib
+import io
+import zipfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from dataset_sanity_check import label_path_for_image, resolve_split_images
+from yolotrainer.dataset_index import get_index
+from yolotrainer.download_manager import DatasetKey, DownloadManager, verify_dataset
+
+ROBOFLOW_YAML = """\
+train: ../train/images
+val: ../valid/images
+test: ../test/images
+nc: 1
+names: ['tumor']
+"""
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _seed_archive(manager: DownloadManager) -> None:
+    archive = manager.archive_path
+    archive.parent.mkdir(parents=True)
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("data.yaml", ROBOFLOW_YAML)
+        for split, count in (("train", 2), ("valid", 1), ("test", 1)):
+            for i in range(count):
+                zf.writestr(f"{split}/images/{split}{i}.png", _png())
+                zf.writestr(f"{split}/labels/{split}{i}.txt", "0 0.1 0.1 0.2 0.1 0.2 0.2\n")
+    digest = hashlib.sha256(archive.read_bytes()).hexdigest()
+    archive.with_suffix(".zip.sha256").write_text(digest, encoding="ascii")
+
+
+def test_installed_roboflow_export_resolves_splits(tmp_path: Path):
+    key = DatasetKey("ws", "brain", 1, "yolov8")
+    manager = DownloadManager(key=key, cache_dir=str(tmp_path / "cache"))
+    _seed_archive(manager)
+    target = tmp_path / "dataset"
+
+    manager.install(str(target))
+
+    assert verify_dataset(str(target), key, full=True)
+    data_yaml = target / "data.yaml"
+    train = resolve_split_images(data_yaml, "train")
+    val = resolve_split_images(data_yaml, "valid")
+    assert [p.name for p in train] == ["train0.png", "train1.png"]
+    assert [p.name for p in val] == ["valid0.png"]
+    assert all(label_path_for_image(p).exists() for p in train + val)
+    index = get_index(str(target))
+    assert index.ready
+    assert index.splits["train"]["images"] == 2
@@ -0,0 +1,49 @@
+import asyncio
+import io
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from backend.app import main
+from backend.app.scheduler import get_scheduler
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(np.full((64, 64, 3), 128, dtype=np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_follower_resubmits_when_leader_is_shed():
+    raw = _png()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+
+            async def post(client_id, headers=None, delay=0.0):
+                await asyncio.sleep(delay)
+                return await http.post(
+                    "/predict",
+                    files={"file": ("slice.png", raw, "image/png")},
+                    headers={"X-Client-Id": client_id, **(headers or {})},
+                )
+
+            # keep the single inference lane busy so the leader's deadline passes while queued
+            blocker = asyncio.ensure_future(
+                get_scheduler().submit(lambda: time.sleep(0.5), client="blocker")
+            )
+            await asyncio.sleep(0.01)
+            leader, follower = await asyncio.gather(
+                post("a", {"X-Deadline-Ms": "100"}),
+                post("b", delay=0.05),
+            )
+            await blocker
+            return leader, follower
+
+    leader, follower = asyncio.run(scenario())
+    assert leader.status_code == 504
+    assert follower.status_code == 200
+    assert follower.json()["filename"] == "slice.png"
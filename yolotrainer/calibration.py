@@ -0,0 +1,333 @@
+"""
+Offline (conf, iou, min_mask_area) calibration from one cached inference pass.
+
+The pass runs with NMS disabled (iou=1.0) and a low confidence floor, storing every
+candidate box, class, confidence and retina-mask area. Any grid point is then
+replayed without the model: per-class greedy NMS at the grid IoU, the `max_det`
+cap, the confidence cut and the production area/class rule. The pass keeps at most
+`max_candidates` boxes per image (highest confidence first), so the replay matches
+production except on images that hit that cap and keep fewer than `max_det` boxes
+after NMS; scripts/calibrate_thresholds.py reports how many images hit it.
+
+The same pass gives the production decision per image, against which the early-exit
+gate threshold (a low-resolution score below which segmentation is skipped) is set.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from dataset_sanity_check import label_path_for_image, resolve_split_images
+from .custom_predictor import YoloPredictor, resolve_tumor_class_idx, to_numpy
+from .labels import polygons_for_labels
+
+CACHE_VERSION = 1
+
+
+def _weights_signature(weights_path: str) -> str:
+    try:
+        st = os.stat(weights_path)
+    except OSError:
+        return str(weights_path)
+    return f"{Path(weights_path).resolve()}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def collect_candidates(
+    predictor: YoloPredictor,
+    data_yaml: str,
+    split: str = "val",
+    img_size: int = 256,
+    conf_floor: float = 0.001,
+    max_candidates: int = 100,
+    batch_size: int = 4,
+) -> dict:
+    """Run the single inference pass and return flat per-candidate arrays."""
+    data_yaml = Path(data_yaml)
+    data = yaml.safe_load(data_yaml.read_text(encoding="utf-8")) or {}
+    gt_tumor_idx = resolve_tumor_class_idx(data.get("names"))
+    images = resolve_split_images(data_yaml, split)
+    if not images:
+        raise RuntimeError(f"No images found for split '{split}'.")
+
+    gt_polygons = polygons_for_labels(label_path_for_image(p) for p in images)
+    image_idx, classes, confs, boxes, areas = [], [], [], [], []
+    labels = np.zeros(len(images), dtype=bool)
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        results = predictor.predict_batch(
+            [str(p) for p in batch],
+            img_size=img_size,
+            conf_th=conf_floor,
+            iou_th=1.0,
+            retina_masks=True,
+            max_det=max_candidates,
+        )
+        for offset, (img_path, res) in enumerate(zip(batch, results)):
+            i = start + offset
+            labels[i] = any(cls_id == gt_tumor_idx for cls_id, _ in gt_polygons[i])
+            cand = predictor.extract_candidates(res, with_areas=True)
+            n = len(cand["conf"])
+            if n == 0:
+                continue
+            image_idx.append(np.full(n, i, dtype=np.int32))
+            classes.append(cand["cls"].astype(np.int16))
+            confs.append(cand["conf"].astype(np.float32))
+            boxes.append(to_numpy(res.boxes.xyxy).astype(np.float32))
+            area = cand["area"] if cand["area"] is not None else np.zeros(n, dtype=np.int64)
+            areas.append(area.astype(np.int32))
+        del results
+
+    def _cat(parts, dtype, shape=(0,)):
+        return np.concatenate(parts) if parts else np.zeros(shape, dtype=dtype)
+
+    return {
+        "image_idx": _cat(image_idx, np.int32),
+        "cls": _cat(classes, np.int16),
+        "conf": _cat(confs, np.float32),
+        "xyxy": _cat(boxes, np.float32, (0, 4)),
+        "area": _cat(areas, np.int32),
+        "labels": labels,
+        "images": np.asarray([p.name for p in images]),
+        "tumor_class_idx": np.int32(predictor._resolve_tumor_class_idx(default_idx=0)),
+    }
+
+
+def load_or_collect(
+    cache_path: str,
+    predictor: YoloPredictor,
+    weights_path: str,
+    data_yaml: str,
+    split: str = "val",
+    img_size: int = 256,
+    conf_floor: float = 0.001,
+    max_candidates: int = 100,
+    batch_size: int = 4,
+    refresh: bool = False,
+) -> dict:
+    meta = {
+        "version": CACHE_VERSION,
+        "weights": _weights_signature(weights_path),
+        "data_yaml": str(Path(data_yaml).resolve()),
+        "split": split,
+        "img_size": img_size,
+        "conf_floor": conf_floor,
+        "max_candidates": max_candidates,
+    }
+    cache = Path(cache_path)
+    if cache.exists() and not refresh:
+        with np.load(cache, allow_pickle=False) as npz:
+            if json.loads(str(npz["meta"])) == meta:
+                return {k: npz[k] for k in npz.files if k != "meta"}
+
+    cands = collect_candidates(
+        predictor,
+        data_yaml,
+        split=split,
+        img_size=img_size,
+        conf_floor=conf_floor,
+        max_candidates=max_candidates,
+        batch_size=batch_size,
+    )
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache.with_suffix(".tmp.npz")
+    np.savez_compressed(tmp, meta=json.dumps(meta), **cands)
+    os.replace(tmp, cache)
+    return cands
+
+
+def _box_iou(xyxy: np.ndarray) -> np.ndarray:
+    x1, y1, x2, y2 = xyxy.T
+    area = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    iw = (np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :])).clip(0)
+    ih = (np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :])).clip(0)
+    inter = iw * ih
+    return inter / np.maximum(area[:, None] + area[None, :] - inter, 1e-9)
+
+
+def _greedy_nms(iou: np.ndarray, classes: np.ndarray, iou_th: float) -> np.ndarray:
+    """Per-class greedy NMS over candidates already sorted by descending confidence."""
+    n = len(classes)
+    suppress = (iou > iou_th) & (classes[:, None] == classes[None, :])
+    keep = np.ones(n, dtype=bool)
+    for i in range(n):
+        if keep[i]:
+            keep[i + 1:] &= ~suppress[i, i + 1:]
+    return keep
+
+
+def image_scores(
+    cands: dict,
+    iou_values,
+    area_values,
+    max_det: int = 50,
+) -> np.ndarray:
+    """
+    Return scores[iou, area, image]: best tumor confidence surviving NMS, `max_det`
+    and the area rule. An image is positive at conf_th exactly when score > conf_th.
+    """
+    n_images = len(cands["labels"])
+    iou_values = list(iou_values)
+    area_values = np.asarray(list(area_values), dtype=np.int64)
+    scores = np.zeros((len(iou_values), len(area_values), n_images), dtype=np.float64)
+    tumor_idx = int(cands["tumor_class_idx"])
+
+    order = np.lexsort((-cands["conf"], cands["image_idx"]))
+    image_idx = cands["image_idx"][order]
+    bounds = np.searchsorted(image_idx, np.arange(n_images + 1))
+    for img in range(n_images):
+        sl = order[bounds[img]:bounds[img + 1]]
+        if len(sl) == 0:
+            continue
+        conf = cands["conf"][sl].astype(np.float64)
+        cls = cands["cls"][sl].astype(np.int64)
+        area = cands["area"][sl].astype(np.int64)
+        pairwise = _box_iou(cands["xyxy"][sl].astype(np.float64))
+        is_tumor = cls == tumor_idx
+        for a, iou_th in enumerate(iou_values):
+            keep = _greedy_nms(pairwise, cls, iou_th)
+            keep &= np.cumsum(keep) <= max_det
+            eligible = keep & is_tumor
+            # min_mask_area == 0 disables the area rule, as in the API.
+            passes = (area[None, :] >= area_values[:, None]) | (area_values[:, None] <= 0)
+            masked = np.where(eligible[None, :] & passes, conf[None, :], 0.0)
+            scores[a, :, img] = masked.max(axis=1)
+    return scores
+
+
+def pareto_front(points: list[dict]) -> list[dict]:
+    """Points not dominated on (higher recall, fewer false positives)."""
+    ranked = sorted(points, key=lambda p: (p["false_positives"], -p["recall"], -p["conf_th"]))
+    front = []
+    best_recall = -1.0
+    for p in ranked:
+        if p["recall"] > best_recall:
+            front.append(p)
+            best_recall = p["recall"]
+    return front
+
+
+def search_grid(
+    cands: dict,
+    conf_values,
+    iou_values,
+    area_values,
+    max_det: int = 50,
+) -> list[dict]:
+    conf_values = np.asarray(list(conf_values), dtype=np.float64)
+    iou_values = list(iou_values)
+    area_values = list(area_values)
+    labels = np.asarray(cands["labels"], dtype=bool)
+    n_pos = max(int(labels.sum()), 1)
+    n_neg = int((~labels).sum())
+
+    scores = image_scores(cands, iou_values, area_values, max_det=max_det)
+    # positive[iou, area, conf, image]
+    positive = scores[:, :, None, :] > conf_values[None, None, :, None]
+    tp = (positive & labels).sum(axis=-1)
+    fp = (positive & ~labels).sum(axis=-1)
+
+    points = []
+    for a, iou_th in enumerate(iou_values):
+        for b, min_area in enumerate(area_values):
+            for c, conf_th in enumerate(conf_values):
+                points.append(
+                    {
+                        "conf_th": float(conf_th),
+                        "iou_th": float(iou_th),
+                        "min_mask_area": int(min_area),
+                        "recall": int(tp[a, b, c]) / n_pos,
+                        "false_positives": int(fp[a, b, c]),
+                        "false_positive_rate": int(fp[a, b, c]) / n_neg if n_neg else 0.0,
+                    }
+                )
+    return points
+
+
+def select_point(front: list[dict], min_recall: float) -> dict:
+    eligible = [p for p in front if p["recall"] >= min_recall]
+    if eligible:
+        return min(eligible, key=lambda p: (p["false_positives"], -p["conf_th"]))
+    return max(front, key=lambda p: (p["recall"], -p["false_positives"]))
+
+
+def collect_gate_scores(
+    predictor: YoloPredictor,
+    data_yaml: str,
+    split: str = "val",
+    img_size: int = 128,
+    batch_size: int = 4,
+) -> np.ndarray:
+    """Early-exit gate score of every split image, in `collect_candidates` order."""
+    images = resolve_split_images(Path(data_yaml), split)
+    scores = [
+        predictor.gate_scores([str(p) for p in images[start:start + batch_size]], img_size=img_size)
+        for start in range(0, len(images), batch_size)
+    ]
+    return np.concatenate(scores) if scores else np.zeros(0)
+
+
+def select_gate_threshold(gate_scores: np.ndarray, positives: np.ndarray, min_recall: float) -> dict:
+    """
+    Largest gate threshold that still passes `min_recall` of the images the full pipeline
+    calls positive (bypass when score < threshold), with the bypass rate it buys.
+    """
+    gate_scores = np.asarray(gate_scores, dtype=np.float64)
+    positives = np.asarray(positives, dtype=bool)
+    pos_scores = np.sort(gate_scores[positives])
+    if len(pos_scores) == 0:
+        raise RuntimeError("No positive images at the production thresholds; cannot calibrate the gate.")
+    allowed_misses = int(np.floor((1.0 - min_recall) * len(pos_scores) + 1e-9))
+    threshold = float(pos_scores[min(allowed_misses, len(pos_scores) - 1)])
+    bypassed = gate_scores < threshold
+    return {
+        "gate_threshold": threshold,
+        "bypass_rate": float(bypassed.mean()),
+        "negatives_bypassed": int((bypassed & ~positives).sum()),
+        "negatives": int((~positives).sum()),
+        "positives_bypassed": int((bypassed & positives).sum()),
+        "positives": int(positives.sum()),
+        "recall": float(1.0 - (bypassed & positives).sum() / len(pos_scores)),
+    }
+
+
+def write_gate_calibration(path: str, gate: dict, meta: dict) -> str:
+    """Add the gate settings to an existing calibration file's `selected` block."""
+    out = Path(path)
+    try:
+        payload = json.loads(out.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        payload = {}
+    selected = payload.get("selected") or {}
+    selected.update({"gate_threshold": gate["gate_threshold"], "gate_img_size": meta["gate_img_size"]})
+    payload["selected"] = selected
+    payload["gate"] = {**gate, **meta, "created": datetime.datetime.now().isoformat(timespec="seconds")}
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    os.replace(tmp, out)
+    return str(out)
+
+
+def write_calibration(path: str, selected: dict, front: list[dict], meta: dict) -> str:
+    payload = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "selected": {
+            "conf_th": selected["conf_th"],
+            "iou_th": selected["iou_th"],
+            "min_mask_area": selected["min_mask_area"],
+        },
+        "selected_metrics": selected,
+        "pareto": front,
+        **meta,
+    }
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    os.replace(tmp, out)
+    return str(out)
@@ -1,23 +1,14 @@
-import os
 from pathlib import Path
 import yaml
 
-def find_data_yaml(dataset_dir: str) -> str:
-    dataset_dir = Path(dataset_dir)
-    top = dataset_dir / "data.yaml"
-    if top.exists():
-        return str(top)
-
-    candidates = []
-    for root, dirs, files in os.walk(dataset_dir):
-        for f in files:
-            if f.endswith(".yaml") or f.endswith(".yml"):
-                candidates.append(Path(root) / f)
+from .dataset_index import get_index
 
-    if not candidates:
+def find_data_yaml(dataset_dir: str) -> str:
+    data_yaml = get_index(dataset_dir).data_yaml
+    if data_yaml is None:
         raise FileNotFoundError("No .yaml data file found in dataset directory.")
 
-    return str(candidates[0])
+    return str(data_yaml)
 
 def override_class_names(data_yaml_path: str, new_names):
     data_yaml_path = Path(data_yaml_path)
@@ -1,56 +1,215 @@
 import base64
 import io
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-from ultralytics import YOLO
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from .mask_codec import encode_rle, rle_area, rle_bbox
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+
+TUMOR_ALIASES = {"tumor", "meningioma"}
+NON_TUMOR_ALIASES = {"notumor", "healthy", "normal", "background"}
+
+
+def normalize_class_name(name: str) -> str:
+    return str(name).strip().lower().replace("_", "").replace("-", "").replace(" ", "")
+
+
+def resolve_tumor_class_idx(names, default_idx: int = 0) -> int:
+    """Pick the positive (tumor) class index from a model or data.yaml `names` mapping."""
+    indexed_names = {}
+    if isinstance(names, dict):
+        for idx, name in names.items():
+            try:
+                indexed_names[int(idx)] = normalize_class_name(name)
+            except Exception:
+                continue
+    elif isinstance(names, list):
+        indexed_names = {idx: normalize_class_name(name) for idx, name in enumerate(names)}
+
+    if not indexed_names:
+        return default_idx
+
+    for idx, name in indexed_names.items():
+        if name in TUMOR_ALIASES:
+            return idx
+
+    # If this is a binary model and one class clearly means "no tumor",
+    # use the other class as the positive tumor class.
+    if len(indexed_names) == 2:
+        non_tumor_ids = {idx for idx, name in indexed_names.items() if name in NON_TUMOR_ALIASES}
+        if len(non_tumor_ids) == 1:
+            for idx in indexed_names:
+                if idx not in non_tumor_ids:
+                    return idx
+
+    if default_idx in indexed_names:
+        return default_idx
+    return sorted(indexed_names.keys())[0]
+
+
+def to_numpy(x) -> Optional[np.ndarray]:
+    if x is None:
+        return None
+    if hasattr(x, "cpu"):
+        x = x.cpu()
+    if hasattr(x, "numpy"):
+        return x.numpy()
+    return np.asarray(x)
+
+
+def load_image_bgr(data: bytes) -> np.ndarray:
+    """Decode uploaded image bytes into the HxWx3 BGR array Ultralytics expects."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        return np.ascontiguousarray(np.asarray(img)[..., ::-1])
+
+
+def encode_png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def encode_png_base64(img: Image.Image) -> str:
+    return base64.b64encode(encode_png(img)).decode("ascii")
+
+
+def decide_tumor(
+    classes,
+    confs,
+    areas,
+    tumor_class_idx: int,
+    min_mask_area: int = 0,
+    conf_th: Optional[float] = None,
+) -> dict:
+    """
+    Production tumor decision rule over per-detection arrays.
+
+    `conf_th` re-applies the confidence cut offline (Ultralytics keeps conf > th),
+    so one low-threshold inference pass can be scored at any higher threshold.
+    """
+    classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+    confs = np.asarray(confs, dtype=np.float64).reshape(-1)
+    if areas is not None:
+        areas = np.asarray(areas, dtype=np.int64).reshape(-1)
+    in_range = np.ones(len(confs), dtype=bool) if conf_th is None else confs > conf_th
+
+    is_tumor = in_range & (classes == tumor_class_idx)
+    kept = is_tumor
+    removed_by_area = 0
+    mask_areas = np.zeros(0, dtype=np.int64)
+    if areas is not None and min_mask_area > 0:
+        too_small = is_tumor & (areas < min_mask_area)
+        removed_by_area = int(too_small.sum())
+        kept = is_tumor & ~too_small
+        mask_areas = areas[kept]
+
+    best_conf = float(confs[kept].max()) if kept.any() else 0.0
+    return {
+        "has_tumor": bool(kept.any()),
+        "best_conf": best_conf,
+        "kept": kept,
+        "raw_detections": int(in_range.sum()),
+        "max_confidence_raw": float(confs[in_range].max()) if in_range.any() else 0.0,
+        "tumor_detections_before_filter": int(is_tumor.sum()),
+        "removed_by_min_area": removed_by_area,
+        "removed_by_class": int((in_range & ~is_tumor).sum()),
+        "tumor_detections_after_filter": int(kept.sum()),
+        "mask_count": int(len(mask_areas)),
+        "avg_mask_area": int(mask_areas.sum() / len(mask_areas)) if len(mask_areas) else 0,
+    }
+
+
+class LeanResult:
+    """
+    The parts of a Results object the API needs: boxes/classes/scores, RLE masks of
+    the kept instances and a downscaled preview with matching preview-size masks.
+    """
+
+    def __init__(self, orig_shape, xyxy, cls, conf, scale, preview, preview_masks, instances, union_rle, speed):
+        self.orig_shape = orig_shape
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+        self.scale = scale
+        self.preview = preview
+        self.preview_masks = preview_masks
+        self.instances = instances
+        self.union_rle = union_rle
+        self.speed = speed
 
 
 class YoloPredictor:
-    def __init__(self, weights_path: Optional[str] = None, model: Optional[YOLO] = None):
+    def __init__(
+        self,
+        weights_path: Optional[str] = None,
+        model: Optional["YOLO"] = None,
+        device: Optional[str] = None,
+        precision: str = "fp32",
+        channels_last: bool = False,
+        compile=False,
+    ):
+        """
+        `device`/`precision` (fp32, fp16, bf16) should come from backend.app.device, which only
+        enables what the hardware supports; None keeps ultralytics' own device choice.
+        `compile` is False, True or a torch.compile mode.
+        """
         if model is None and not weights_path:
             raise ValueError("Provide either an initialized YOLO model or a weights_path.")
-        self.model = model or YOLO(weights_path)
+        if model is None:
+            from ultralytics import YOLO
 
-    @staticmethod
-    def _normalize_class_name(name: str) -> str:
-        return str(name).strip().lower().replace("_", "").replace("-", "").replace(" ", "")
+            model = YOLO(weights_path)
+        self.model = model
+        self.device = device
+        self.precision = precision
+        self.channels_last = channels_last
+        self.compile = compile
 
-    def _resolve_tumor_class_idx(self, default_idx: int = 0) -> int:
-        names = getattr(self.model, "names", None)
-        indexed_names = {}
-        if isinstance(names, dict):
-            for idx, name in names.items():
-                try:
-                    indexed_names[int(idx)] = self._normalize_class_name(name)
-                except Exception:
-                    continue
-        elif isinstance(names, list):
-            indexed_names = {idx: self._normalize_class_name(name) for idx, name in enumerate(names)}
+    def _predict(self, source, **kwargs):
+        """model.predict with the configured device, precision, memory format and compile mode."""
+        if self.device is not None:
+            kwargs["device"] = self.device
+        if self.precision == "fp16":
+            kwargs["half"] = True
+        if self.compile:
+            kwargs["compile"] = self.compile
+        if self.precision == "bf16":
+            import torch
 
-        if not indexed_names:
-            return default_idx
+            with torch.autocast((self.device or "cpu").split(":")[0], dtype=torch.bfloat16):
+                results = self.model.predict(source=source, **kwargs)
+        else:
+            results = self.model.predict(source=source, **kwargs)
+        if self.channels_last:
+            self._to_channels_last()
+        return results
 
-        tumor_aliases = {"tumor", "meningioma"}
-        non_tumor_aliases = {"notumor", "healthy", "normal", "background"}
+    def _to_channels_last(self) -> None:
+        """
+        Convert the predictor's (already fused) network once; converting the YOLO model
+        up front is lost when ultralytics fuses Conv+BN while setting up the predictor.
+        """
+        predictor = getattr(self.model, "predictor", None)
+        backend = getattr(predictor, "model", None)
+        if backend is None or getattr(predictor, "channels_last", False):
+            return
+        import torch
 
-        for idx, name in indexed_names.items():
-            if name in tumor_aliases:
-                return idx
+        backend.to(memory_format=torch.channels_last)
+        predictor.channels_last = True
 
-        # If this is a binary model and one class clearly means "no tumor",
-        # use the other class as the positive tumor class.
-        if len(indexed_names) == 2:
-            non_tumor_ids = {idx for idx, name in indexed_names.items() if name in non_tumor_aliases}
-            if len(non_tumor_ids) == 1:
-                for idx in indexed_names:
-                    if idx not in non_tumor_ids:
-                        return idx
+    @staticmethod
+    def _normalize_class_name(name: str) -> str:
+        return normalize_class_name(name)
 
-        if default_idx in indexed_names:
-            return default_idx
-        return sorted(indexed_names.keys())[0]
+    def _resolve_tumor_class_idx(self, default_idx: int = 0) -> int:
+        return resolve_tumor_class_idx(getattr(self.model, "names", None), default_idx=default_idx)
 
     def predict_image(
         self,
@@ -61,8 +220,8 @@ class YoloPredictor:
         retina_masks: bool = True,
         max_det: int = 50,
     ):
-        results = self.model.predict(
-            source=image_path,
+        results = self._predict(
+            image_path,
             imgsz=img_size,
             conf=conf_th,
             iou=iou_th,
@@ -74,6 +233,75 @@ class YoloPredictor:
         )
         return results[0]
 
+    def predict_batch(
+        self,
+        sources,
+        img_size: int = 256,
+        conf_th: float = 0.25,
+        iou_th: float = 0.7,
+        retina_masks: bool = True,
+        max_det: int = 50,
+    ):
+        """Run one forward pass over a list of images; returns one Results per source."""
+        if not sources:
+            return []
+        return self._predict(
+            list(sources),
+            imgsz=img_size,
+            conf=conf_th,
+            iou=iou_th,
+            retina_masks=retina_masks,
+            max_det=max_det,
+            batch=len(sources),
+            save=False,
+            verbose=False,
+            task="segment",
+        )
+
+    def gate_scores(self, sources, img_size: int = 128, conf_floor: float = 0.001, max_det: int = 10) -> np.ndarray:
+        """
+        Early-exit gate: best tumor-class confidence per image from a low-resolution pass of
+        the same model (detection head only, masks left at prototype resolution). Images
+        scoring below a calibrated threshold can skip full-resolution segmentation.
+        """
+        results = self.predict_batch(
+            sources,
+            img_size=img_size,
+            conf_th=conf_floor,
+            iou_th=0.7,
+            retina_masks=False,
+            max_det=max_det,
+        )
+        tumor_class_idx = self._resolve_tumor_class_idx(default_idx=0)
+        scores = np.zeros(len(results), dtype=np.float64)
+        for i, res in enumerate(results):
+            cand = self.extract_candidates(res, with_areas=False)
+            is_tumor = cand["cls"] == tumor_class_idx
+            if is_tumor.any():
+                scores[i] = float(cand["conf"][is_tumor].max())
+        del results
+        self.release()
+        return scores
+
+    @staticmethod
+    def extract_candidates(result, with_areas: bool = True) -> dict:
+        """
+        Pull per-detection class ids, confidences and (optionally) mask pixel areas
+        out of a Results object as NumPy arrays.
+        """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            empty = np.zeros(0)
+            return {"cls": empty.astype(np.int64), "conf": empty, "area": None}
+        classes = to_numpy(boxes.cls).astype(np.int64)
+        confs = to_numpy(boxes.conf).astype(np.float64)
+        areas = None
+        if with_areas and result.masks is not None and result.masks.data is not None:
+            data = result.masks.data
+            # Reduce on the tensor's own device; only N integers cross to NumPy.
+            areas = to_numpy((data > 0.5).sum(axis=(1, 2))).astype(np.int64)
+        return {"cls": classes, "conf": confs, "area": areas}
+
     def predict_tumor_binary(
         self,
         image_path: str,
@@ -93,91 +321,173 @@ class YoloPredictor:
             retina_masks=retina_masks,
             max_det=max_det,
         )
-        has_tumor = False
-        best_conf = 0.0
-        max_conf = 0.0
-        raw_count = int(len(res.boxes)) if res.boxes is not None else 0
-        tumor_count_before = 0
-        removed_by_area = 0
-        removed_by_class = 0
-        tumor_count_after = 0
-        mask_areas = []
-
-        # Prefer segmentation masks if present.
-        if res.masks is not None and res.boxes is not None and len(res.boxes) > 0:
-            masks = res.masks.data
-            for i, b in enumerate(res.boxes):
-                cls_id = int(b.cls.item())
-                conf = float(b.conf.item())
-                if conf > max_conf:
-                    max_conf = conf
-                if cls_id != tumor_class_idx:
-                    removed_by_class += 1
-                    continue
-                tumor_count_before += 1
-                if min_mask_area > 0 and masks is not None and i < len(masks):
-                    mask = masks[i]
-                    area = int((mask > 0.5).sum().item())
-                    if area < min_mask_area:
-                        removed_by_area += 1
-                        continue
-                    mask_areas.append(area)
-                tumor_count_after += 1
-                if conf > best_conf:
-                    best_conf = conf
-                    has_tumor = True
-        elif res.boxes is not None and len(res.boxes) > 0:
-            for b in res.boxes:
-                cls_id = int(b.cls.item())
-                conf = float(b.conf.item())
-                if conf > max_conf:
-                    max_conf = conf
-                if cls_id != tumor_class_idx:
-                    removed_by_class += 1
-                    continue
-                tumor_count_before += 1
-                if conf > best_conf:
-                    best_conf = conf
-                    has_tumor = True
-                tumor_count_after += 1
-
-        classes_present = []
-        if res.boxes is not None and len(res.boxes) > 0:
-            try:
-                classes_present = sorted({int(c) for c in res.boxes.cls.tolist()})
-            except Exception:
-                classes_present = []
+        has_tumor, best_conf, debug_info = self.decide(res, tumor_class_idx, min_mask_area)
+        return has_tumor, best_conf, res, debug_info
 
-        avg_mask_area = int(sum(mask_areas) / len(mask_areas)) if mask_areas else 0
+    def decide(self, res, tumor_class_idx: int, min_mask_area: int):
+        """Apply the production decision rule to an already computed Results object."""
+        cand = self.extract_candidates(res, with_areas=min_mask_area > 0)
+        decision = decide_tumor(
+            cand["cls"],
+            cand["conf"],
+            cand["area"],
+            tumor_class_idx,
+            min_mask_area=min_mask_area,
+        )
+        classes_present = sorted({int(c) for c in cand["cls"].tolist()})
 
         debug_info = {
-            "raw_detections": raw_count,
-            "tumor_detections_before_filter": tumor_count_before,
-            "removed_by_min_area": removed_by_area,
-            "removed_by_class": removed_by_class,
-            "tumor_detections_after_filter": tumor_count_after,
-            "max_confidence_raw": max_conf,
-            "max_confidence_tumor": best_conf,
-            "mask_count": len(mask_areas),
-            "avg_mask_area": avg_mask_area,
+            "raw_detections": decision["raw_detections"],
+            "tumor_detections_before_filter": decision["tumor_detections_before_filter"],
+            "removed_by_min_area": decision["removed_by_min_area"],
+            "removed_by_class": decision["removed_by_class"],
+            "tumor_detections_after_filter": decision["tumor_detections_after_filter"],
+            "max_confidence_raw": decision["max_confidence_raw"],
+            "max_confidence_tumor": decision["best_conf"],
+            "mask_count": decision["mask_count"],
+            "avg_mask_area": decision["avg_mask_area"],
             "tumor_class_idx": tumor_class_idx,
             "model_names": getattr(self.model, "names", None),
             "classes_present": classes_present,
+            "kept_indices": np.flatnonzero(decision["kept"]).tolist(),
         }
 
-        return has_tumor, best_conf, res, debug_info
+        return decision["has_tumor"], decision["best_conf"], debug_info
+
+    @staticmethod
+    def union_mask(result, indices) -> Optional[np.ndarray]:
+        """Boolean union of the selected instance masks, or None without masks."""
+        if result.masks is None or result.masks.data is None or not len(indices):
+            return None
+        return (to_numpy(result.masks.data[list(indices)]) > 0.5).any(axis=0)
+
+    def encode_masks(self, result, indices) -> list:
+        """
+        COCO RLE per selected instance (class, confidence, area, bbox, rle). Masks are
+        binarized and encoded one at a time, so only one dense HxW array is alive at once.
+        """
+        if result.masks is None or result.masks.data is None:
+            return []
+        boxes = result.boxes
+        names = getattr(self.model, "names", None) or {}
+        instances = []
+        for i in indices:
+            rle = encode_rle(to_numpy(result.masks.data[int(i)] > 0.5))
+            cls_id = int(boxes.cls[int(i)]) if boxes is not None else -1
+            instances.append(
+                {
+                    "class_id": cls_id,
+                    "class_name": str(names.get(cls_id, "")) if isinstance(names, dict) else "",
+                    "confidence": float(boxes.conf[int(i)]) if boxes is not None else 0.0,
+                    "area": rle_area(rle),
+                    "bbox": rle_bbox(rle),
+                    "rle": rle,
+                }
+            )
+        return instances
+
+    def release(self, result=None) -> None:
+        """
+        Free a Results object's tensors and the references ultralytics keeps to the
+        last batch (predictor.results / predictor.batch) until the next call.
+        """
+        if result is not None:
+            result.masks = None
+            result.orig_img = None
+        predictor = getattr(self.model, "predictor", None)
+        if predictor is not None:
+            predictor.results = None
+            predictor.batch = None
+
+    def to_lean(self, result, kept_indices, preview_max_side: int = 512) -> LeanResult:
+        """
+        Pull out boxes, scores, RLE masks and a preview (longest side <= preview_max_side,
+        0 keeps full size). Masks are binarized and downsampled on their own device, so
+        only preview-size arrays and the RLE counts reach NumPy.
+        """
+        h, w = result.orig_shape[:2]
+        scale = min(1.0, preview_max_side / max(h, w)) if preview_max_side > 0 else 1.0
+        pw, ph = max(1, round(w * scale)), max(1, round(h * scale))
+
+        boxes = result.boxes
+        if boxes is not None and len(boxes):
+            xyxy = to_numpy(boxes.xyxy).astype(np.float32)
+            cls = to_numpy(boxes.cls).astype(np.int64)
+            conf = to_numpy(boxes.conf).astype(np.float32)
+        else:
+            xyxy, cls, conf = np.zeros((0, 4), np.float32), np.zeros(0, np.int64), np.zeros(0, np.float32)
+
+        preview = Image.fromarray(result.orig_img[..., ::-1])
+        if scale < 1.0:
+            preview = preview.resize((pw, ph), Image.BILINEAR)
+
+        preview_masks = None
+        instances, union_rle = [], None
+        if result.masks is not None and result.masks.data is not None:
+            data = result.masks.data
+            mh, mw = data.shape[1:]
+            rows = (np.arange(preview.height) * mh // preview.height).tolist()
+            cols = (np.arange(preview.width) * mw // preview.width).tolist()
+            preview_masks = to_numpy(data[:, rows][:, :, cols] > 0.5)
+            instances = self.encode_masks(result, kept_indices)
+            union = self.union_mask(result, kept_indices)
+            union_rle = encode_rle(union) if union is not None else None
+
+        return LeanResult(
+            orig_shape=(int(h), int(w)),
+            xyxy=xyxy,
+            cls=cls,
+            conf=conf,
+            scale=preview.width / w,
+            preview=preview,
+            preview_masks=preview_masks,
+            instances=instances,
+            union_rle=union_rle,
+            speed=dict(getattr(result, "speed", None) or {}),
+        )
 
     def render_overlay_base64(self, result) -> Optional[str]:
         """
         Render the YOLO result with boxes/masks and return a base64 PNG string.
         """
+        img = self.render_overlay(result)
+        if img is None:
+            return None
+        return encode_png_base64(img)
+
+    def render_overlay(self, result) -> Optional[Image.Image]:
+        """Render the YOLO result with boxes/masks as an RGBA image."""
         if result is None or result.orig_img is None:
             return None
 
         # Start from the original image to ensure consistent styling.
-        base_bgr = result.orig_img
-        img = Image.fromarray(base_bgr[..., ::-1]).convert("RGBA")  # BGR -> RGBA
+        img = Image.fromarray(result.orig_img[..., ::-1]).convert("RGBA")  # BGR -> RGBA
+        masks = None
+        if result.masks is not None and result.masks.data is not None:
+            masks = to_numpy(result.masks.data) > 0.5
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return self._draw_overlay(img, masks, np.zeros((0, 4)), [], [])
+        return self._draw_overlay(
+            img,
+            masks,
+            to_numpy(boxes.xyxy),
+            to_numpy(boxes.cls).tolist(),
+            to_numpy(boxes.conf).tolist(),
+        )
 
+    def render_preview(self, lean: "LeanResult") -> Image.Image:
+        """Render boxes/masks of a LeanResult onto its downscaled preview."""
+        img = lean.preview.convert("RGBA")
+        return self._draw_overlay(
+            img,
+            lean.preview_masks,
+            lean.xyxy * lean.scale,
+            lean.cls.tolist(),
+            lean.conf.tolist(),
+        )
+
+    def _draw_overlay(self, img: Image.Image, masks, boxes, classes, confs) -> Image.Image:
         def _class_name(cls_id: int) -> str:
             names = getattr(self.model, "names", None)
             if isinstance(names, dict):
@@ -195,42 +505,22 @@ class YoloPredictor:
         blue_rgb = (30, 144, 255, 255)
 
         # Overlay segmentation masks with per-class color (tumor red, others blue).
-        if result.masks is not None and result.masks.data is not None and result.boxes is not None:
-            masks = result.masks.data
-            try:
-                masks = masks.cpu().numpy()
-            except Exception:
-                masks = np.asarray(masks)
-
-            try:
-                classes = result.boxes.cls.cpu().tolist()
-            except Exception:
-                classes = result.boxes.cls.tolist()
-
-            for i, mask in enumerate(masks):
-                mask_bool = mask > 0.5
+        if masks is not None and len(classes):
+            for i, mask_bool in enumerate(masks):
                 if not mask_bool.any():
                     continue
                 cls_id = int(classes[i]) if i < len(classes) else 0
                 color = red_rgba if _is_meningioma(cls_id) else blue_rgba
-                overlay = np.zeros((mask.shape[0], mask.shape[1], 4), dtype=np.uint8)
+                overlay = np.zeros((mask_bool.shape[0], mask_bool.shape[1], 4), dtype=np.uint8)
                 overlay[mask_bool] = color
                 overlay_img = Image.fromarray(overlay, "RGBA")
                 img = Image.alpha_composite(img, overlay_img)
 
         # Draw bounding boxes with per-class color and label (class + conf).
-        if result.boxes is not None and len(result.boxes) > 0:
+        if len(boxes) > 0:
             draw = ImageDraw.Draw(img)
             font = ImageFont.load_default()
-            try:
-                boxes = result.boxes.xyxy.cpu().tolist()
-                classes = result.boxes.cls.cpu().tolist()
-                confs = result.boxes.conf.cpu().tolist()
-            except Exception:
-                boxes = result.boxes.xyxy.tolist()
-                classes = result.boxes.cls.tolist()
-                confs = result.boxes.conf.tolist()
-            for i, box in enumerate(boxes):
+            for i, box in enumerate(np.asarray(boxes).tolist()):
                 x1, y1, x2, y2 = box
                 cls_id = int(classes[i]) if i < len(classes) else 0
                 outline = red_rgb if _is_meningioma(cls_id) else blue_rgb
@@ -254,6 +544,4 @@ class YoloPredictor:
                 draw.rectangle([tx, ty, tx + tw + 4, ty + th + 4], fill=(0, 0, 0, 160))
                 draw.text((tx + 2, ty + 2), text, fill=(255, 255, 255, 255), font=font)
 
-        buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("ascii")
+        return img
@@ -0,0 +1,192 @@
+"""
+One cached view of a dataset directory: data.yaml path, split directories and
+image/label counts.
+
+Health checks, training and the download manager used to walk the whole tree to
+find a YAML file. The index is built once per directory and reused until the
+modification time of the directory, data.yaml or a split's images/labels
+directory changes, which costs a handful of stat calls instead of a walk.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+SPLIT_KEYS = {"train": "train", "val": "val", "valid": "val", "test": "test"}
+CACHE_DIR = ".cache"
+
+
+def _mtime(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _count(directory: Path, suffixes) -> int:
+    """Files with one of `suffixes` under `directory` (recursive, scandir-based)."""
+    total = 0
+    stack = [str(directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in suffixes:
+                    total += 1
+    return total
+
+
+def labels_dir_for(images_dir: Path) -> Path:
+    """Ultralytics convention: the last `images` path component becomes `labels`."""
+    parts = list(images_dir.parts)
+    if "images" in parts:
+        idx = len(parts) - 1 - parts[::-1].index("images")
+        parts[idx] = "labels"
+        return Path(*parts)
+    return images_dir.parent / "labels"
+
+
+def find_yaml(root: Path) -> Optional[Path]:
+    """root/data.yaml, else the first data.yaml, else the first *.yaml/*.yml under `root`."""
+    top = root / "data.yaml"
+    if top.is_file():
+        return top
+    first_yaml = None
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name == "data.yaml":
+                return Path(dirpath) / name
+            if first_yaml is None and name.endswith((".yaml", ".yml")):
+                first_yaml = Path(dirpath) / name
+    return first_yaml
+
+
+def cache_dir(root: Path) -> Path:
+    """Where derived files (stats, hash index) live: writes there leave the root's mtime, and so the index, alone."""
+    return root / CACHE_DIR
+
+
+def split_dirs(data_yaml: Path, data: dict, entry) -> List[Path]:
+    """Paths named by a data.yaml split entry, resolved the way ultralytics resolves them."""
+    base = data_yaml.parent
+    if data.get("path"):
+        base_path = Path(str(data["path"]))
+        base = base_path if base_path.is_absolute() else base / base_path
+    values = entry if isinstance(entry, (list, tuple)) else [entry]
+    out = []
+    for value in values:
+        path = Path(str(value))
+        if not path.is_absolute():
+            candidate = base / path
+            # Roboflow exports write "../train/images" relative to a parent that is not there locally.
+            if not candidate.exists() and str(value).startswith("../"):
+                candidate = base / str(value)[3:]
+            path = candidate
+        out.append(path)
+    return out
+
+
+class DatasetIndex:
+    def __init__(self, root: Path, data_yaml: Optional[Path], splits: Dict[str, Dict[str, object]], signature):
+        self.root = root
+        self.data_yaml = data_yaml
+        self.splits = splits
+        self.signature = signature
+
+    @property
+    def ready(self) -> bool:
+        """data.yaml at the root and a non-empty train split."""
+        train = self.splits.get("train")
+        return (
+            self.data_yaml is not None
+            and self.data_yaml.parent == self.root
+            and train is not None
+            and bool(train["images"])
+        )
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "root": str(self.root),
+            "data_yaml": str(self.data_yaml) if self.data_yaml else None,
+            "splits": {
+                name: {
+                    "images_dirs": [str(p) for p in split["images_dirs"]],
+                    "labels_dirs": [str(p) for p in split["labels_dirs"]],
+                    "images": split["images"],
+                    "labels": split["labels"],
+                }
+                for name, split in self.splits.items()
+            },
+        }
+
+
+def _signature(root: Path, data_yaml: Optional[Path], splits: Dict[str, Dict[str, object]]):
+    paths = [root] + ([data_yaml] if data_yaml else [])
+    for split in splits.values():
+        paths.extend(split["images_dirs"])
+        paths.extend(split["labels_dirs"])
+    return tuple(_mtime(p) for p in paths)
+
+
+def build_index(dataset_dir: str) -> DatasetIndex:
+    root = Path(dataset_dir).resolve()
+    data_yaml = find_yaml(root) if root.is_dir() else None
+    splits: Dict[str, Dict[str, object]] = {}
+    if data_yaml is not None:
+        try:
+            data = yaml.safe_load(data_yaml.read_text(encoding="utf-8")) or {}
+        except (OSError, yaml.YAMLError):
+            data = {}
+        for key, split in SPLIT_KEYS.items():
+            if split in splits or not data.get(key):
+                continue
+            images_dirs = [p for p in split_dirs(data_yaml, data, data[key]) if p.is_dir()]
+            labels_dirs = [labels_dir_for(p) for p in images_dirs]
+            splits[split] = {
+                "images_dirs": images_dirs,
+                "labels_dirs": labels_dirs,
+                "images": sum(_count(p, IMG_EXTS) for p in images_dirs),
+                "labels": sum(_count(p, {".txt"}) for p in labels_dirs),
+            }
+    return DatasetIndex(root, data_yaml, splits, _signature(root, data_yaml, splits))
+
+
+_cache: Dict[str, DatasetIndex] = {}
+_lock = threading.Lock()
+
+
+def get_index(dataset_dir: str, refresh: bool = False) -> DatasetIndex:
+    """Cached index for `dataset_dir`, rebuilt when one of the indexed paths changed."""
+    key = os.path.abspath(dataset_dir)
+    with _lock:
+        index = _cache.get(key)
+    if (
+        index is not None
+        and not refresh
+        and _signature(index.root, index.data_yaml, index.splits) == index.signature
+    ):
+        return index
+    index = build_index(dataset_dir)
+    with _lock:
+        _cache[key] = index
+    return index
+
+
+def invalidate(dataset_dir: Optional[str] = None) -> None:
+    with _lock:
+        if dataset_dir is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(dataset_dir), None)
@@ -0,0 +1,252 @@
+"""
+Per-split dataset statistics for spotting class imbalance before training.
+
+Everything comes from one pass over the columnar label arrays (yolotrainer.labels)
+plus one parallel read of image headers: image and empty-label counts, polygons
+and images per class, mask-area histograms (fraction of the image, per class)
+and image-size distributions. The result is cached in `.cache/dataset_stats.json`
+under the dataset root and recomputed when an image or label file is added, removed
+or modified, or data.yaml changes.
+
+    python -m yolotrainer.dataset_stats --out stats.json
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import yaml
+from PIL import Image
+
+import parameters
+from .dataset_index import IMG_EXTS, cache_dir, get_index
+from .labels import LabelSet, load_labels
+
+STATS_VERSION = 1
+CACHE_NAME = "dataset_stats.json"
+AREA_BINS = np.concatenate([[0.0], np.logspace(-4, 0, 17)])  # fraction of the image
+IMBALANCE_WARN_RATIO = 3.0
+
+
+def _image_entries(images_dir: Path) -> List[os.DirEntry]:
+    try:
+        with os.scandir(images_dir) as it:
+            entries = [e for e in it if os.path.splitext(e.name)[1].lower() in IMG_EXTS and e.is_file()]
+    except OSError:
+        return []
+    return sorted(entries, key=lambda e: e.name)
+
+
+def _image_size(path: str):
+    try:
+        with Image.open(path) as img:  # header only
+            return img.size
+    except OSError:
+        return (0, 0)
+
+
+def polygon_areas(labels: LabelSet) -> np.ndarray:
+    """Shoelace area of every polygon (normalized units, i.e. fraction of the image)."""
+    if labels.n_polygons == 0:
+        return np.zeros(0, dtype=np.float64)
+    pts = labels.points().astype(np.float64)
+    starts = labels.poly_offsets[:-1]
+    nxt = np.arange(1, len(pts) + 1)
+    nxt[labels.poly_offsets[1:] - 1] = starts  # last point of each polygon wraps to its first
+    cross = pts[:, 0] * pts[nxt, 1] - pts[nxt, 0] * pts[:, 1]
+    return 0.5 * np.abs(np.add.reduceat(cross, starts))
+
+
+def _class_names(data_yaml: Optional[Path]) -> Dict[int, str]:
+    try:
+        data = yaml.safe_load(data_yaml.read_text(encoding="utf-8")) or {}
+    except (AttributeError, OSError, yaml.YAMLError):
+        return {}
+    names = data.get("names") or {}
+    if isinstance(names, list):
+        return {i: str(n) for i, n in enumerate(names)}
+    return {int(k): str(v) for k, v in names.items()}
+
+
+def _summary(values: np.ndarray) -> Dict[str, Optional[float]]:
+    if len(values) == 0:
+        return {"min": None, "max": None, "mean": None, "p50": None}
+    return {
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": float(values.mean()),
+        "p50": float(np.median(values)),
+    }
+
+
+def split_stats(images_dirs: List[Path], labels_dirs: List[Path], names: Dict[int, str], workers: int) -> dict:
+    entries = [e for d in images_dirs for e in _image_entries(d)]
+    label_sets = [load_labels(d) for d in labels_dirs]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sizes = np.asarray(list(pool.map(_image_size, [e.path for e in entries])), dtype=np.int64).reshape(-1, 2)
+
+    classes, areas, poly_stem, bad_lines, label_stems = [], [], [], 0, set()
+    for labels in label_sets:
+        stems = np.asarray([n[: -len(".txt")] for n in labels.names.tolist()], dtype=object)
+        label_stems.update(stems.tolist())
+        classes.append(labels.poly_class)
+        areas.append(polygon_areas(labels))
+        poly_stem.append(stems[labels.poly_file] if labels.n_polygons else np.zeros(0, dtype=object))
+        bad_lines += int(labels.bad_lines.sum())
+    classes = np.concatenate(classes) if classes else np.zeros(0, dtype=np.int32)
+    areas = np.concatenate(areas) if areas else np.zeros(0)
+    poly_stem = np.concatenate(poly_stem) if poly_stem else np.zeros(0, dtype=object)
+
+    image_stems = [os.path.splitext(e.name)[0] for e in entries]
+    stems_with_polygons = set(poly_stem.tolist())
+    missing = sum(1 for s in image_stems if s not in label_stems)
+    empty = sum(1 for s in image_stems if s not in stems_with_polygons)
+
+    class_ids = sorted(set(names) | set(np.unique(classes).tolist()))
+    per_class, images_per_class, area_hist, area_quantiles = {}, {}, {}, {}
+    for cls_id in class_ids:
+        name = names.get(cls_id, str(cls_id))
+        sel = classes == cls_id
+        per_class[name] = int(sel.sum())
+        images_per_class[name] = len(set(poly_stem[sel].tolist()))
+        area_hist[name] = np.histogram(areas[sel], bins=AREA_BINS)[0].tolist()
+        area_quantiles[name] = (
+            dict(zip(("p5", "p50", "p95"), np.percentile(areas[sel], [5, 50, 95]).tolist())) if sel.any() else None
+        )
+
+    size_counts = Counter(f"{w}x{h}" for w, h in sizes.tolist())
+    return {
+        "images": len(entries),
+        "label_files": sum(len(s) for s in label_sets),
+        "missing_labels": missing,
+        "empty_labels": empty,
+        "malformed_lines": bad_lines,
+        "polygons": int(len(classes)),
+        "polygons_per_class": per_class,
+        "images_per_class": images_per_class,
+        "mask_area": {"bins": AREA_BINS.tolist(), "per_class": area_hist, "quantiles": area_quantiles},
+        "image_size": {
+            "distinct": len(size_counts),
+            "most_common": dict(size_counts.most_common(10)),
+            "width": _summary(sizes[:, 0]),
+            "height": _summary(sizes[:, 1]),
+        },
+    }
+
+
+def _signature(index) -> str:
+    """Names, sizes and mtimes of every image and label file, plus data.yaml."""
+    digest = hashlib.sha1(f"v{STATS_VERSION}".encode())
+    paths = [index.data_yaml] if index.data_yaml else []
+    for split in index.splits.values():
+        paths.extend(split["images_dirs"])
+        paths.extend(split["labels_dirs"])
+    for path in paths:
+        digest.update(f"{path}\n".encode())
+        if path.is_file():
+            st = path.stat()
+            digest.update(f"{st.st_size}\0{st.st_mtime_ns}\n".encode())
+            continue
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        for entry in entries:
+            st = entry.stat()
+            digest.update(f"{entry.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _warnings(splits: Dict[str, dict]) -> List[str]:
+    out = []
+    for name, split in splits.items():
+        counts = {k: v for k, v in split["images_per_class"].items()}
+        present = [v for v in counts.values() if v > 0]
+        if counts and len(present) < len(counts):
+            missing = sorted(k for k, v in counts.items() if v == 0)
+            out.append(f"{name}: no images with class {', '.join(missing)}")
+        if len(present) >= 2 and max(present) / min(present) > IMBALANCE_WARN_RATIO:
+            out.append(f"{name}: class imbalance {max(present) / min(present):.1f}x ({counts})")
+        if split["missing_labels"]:
+            out.append(f"{name}: {split['missing_labels']} images without a label file")
+        if split["malformed_lines"]:
+            out.append(f"{name}: {split['malformed_lines']} malformed label lines")
+    return out
+
+
+def dataset_stats(dataset_dir: Optional[str] = None, refresh: bool = False, workers: Optional[int] = None) -> dict:
+    """Statistics for every split of `dataset_dir` (default DATASET_DIR), cached on disk."""
+    dataset_dir = dataset_dir or parameters.DATASET_DIR
+    index = get_index(dataset_dir)
+    if index.data_yaml is None:
+        raise FileNotFoundError(f"No data.yaml found in {dataset_dir}.")
+    signature = _signature(index)
+    cache = cache_dir(index.root) / CACHE_NAME
+    if not refresh:
+        try:
+            cached = json.loads(cache.read_text(encoding="utf-8"))
+            if cached.get("signature") == signature:
+                return cached
+        except (OSError, ValueError):
+            pass
+
+    names = _class_names(index.data_yaml)
+    workers = workers or min(16, (os.cpu_count() or 1) * 4)
+    splits = {
+        name: split_stats(split["images_dirs"], split["labels_dirs"], names, workers)
+        for name, split in index.splits.items()
+    }
+    totals = Counter()
+    for split in splits.values():
+        totals.update(split["polygons_per_class"])
+    stats = {
+        "signature": signature,
+        "dataset_dir": str(index.root),
+        "data_yaml": str(index.data_yaml),
+        "class_names": {str(k): v for k, v in names.items()},
+        "splits": splits,
+        "polygons_per_class": dict(totals),
+        "warnings": _warnings(splits),
+    }
+    try:
+        cache.parent.mkdir(exist_ok=True)
+        tmp = cache.with_suffix(".tmp")
+        tmp.write_text(json.dumps(stats, indent=2), encoding="utf-8")
+        os.replace(tmp, cache)
+    except OSError:
+        pass
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-split dataset statistics and class balance.")
+    parser.add_argument("--data-dir", type=str, default=None, help="Dataset directory (default DATASET_DIR).")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached result.")
+    parser.add_argument("--workers", type=int, default=None, help="Threads reading image headers.")
+    parser.add_argument("--out", type=str, default=None, help="Write the full result as JSON.")
+    args = parser.parse_args()
+
+    stats = dataset_stats(args.data_dir, refresh=args.refresh, workers=args.workers)
+    class_names = sorted({c for s in stats["splits"].values() for c in s["polygons_per_class"]})
+    print("split\timages\tempty\tmissing\t" + "\t".join(f"{c} (img/poly)" for c in class_names))
+    for name, split in stats["splits"].items():
+        per_class = "\t".join(
+            f"{split['images_per_class'].get(c, 0)}/{split['polygons_per_class'].get(c, 0)}" for c in class_names
+        )
+        print(f"{name}\t{split['images']}\t{split['empty_labels']}\t{split['missing_labels']}\t{per_class}")
+    for warning in stats["warnings"]:
+        print(f"warning: {warning}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(stats, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Duplicate and near-duplicate image detection across dataset splits.
+
+Every image gets a 64-bit perceptual hash (DCT of a 32x32 grayscale thumbnail,
+sign of the 8x8 low-frequency block against its median), computed in a process
+pool and kept in `.cache/image_hashes.npz` under the dataset root so unchanged
+files are not hashed again. Unreadable and flat (single-colour) images get no hash and are
+never reported as duplicates. Near-duplicates within `max_distance` bits are found by
+multi-index hashing: the hash is cut into max_distance + 1 bit blocks, and by
+the pigeonhole principle two hashes that close agree exactly on at least one
+block. Only pairs sharing a block value are compared, so the search stays far
+below O(n^2) for large datasets.
+
+    python -m yolotrainer.dedup --max-distance 4 --out leaks.json
+    python -m yolotrainer.dedup --remove-from train --apply
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import parameters
+from dataset_sanity_check import label_path_for_image, resolve_split_images
+from .dataset_index import cache_dir, get_index
+
+INDEX_NAME = "image_hashes.npz"
+QUARANTINE_NAME = ".dedup_removed"
+HASH_VERSION = 2
+SPLITS = ("train", "val", "test")
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+_BITS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def phash(path: str) -> Optional[int]:
+    """64-bit DCT perceptual hash; None for unreadable files and flat images."""
+    try:
+        with Image.open(path) as img:
+            img.draft("L", (64, 64))  # JPEG: decode at reduced scale
+            pixels = np.asarray(img.convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    except OSError:
+        return None
+    if np.ptp(pixels) < 1.0:
+        return None  # no structure to hash; the bits would be rounding noise
+    low = (_DCT32 @ pixels @ _DCT32.T)[:8, :8].ravel()
+    bits = low > np.median(low[1:])  # DC term excluded from the median
+    return int(np.bitwise_or.reduce(_BITS[bits])) if bits.any() else 0
+
+
+def _hash_chunk(paths: List[str]) -> List[Optional[int]]:
+    return [phash(p) for p in paths]
+
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).astype(np.int64)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+    return table[x.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+class HashIndex:
+    """Per image: path, split, hash and whether the hash is valid (readable, not flat)."""
+
+    def __init__(self, paths: np.ndarray, splits: np.ndarray, hashes: np.ndarray, valid: np.ndarray):
+        self.paths = paths
+        self.splits = splits
+        self.hashes = hashes
+        self.valid = valid
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+def build_hash_index(
+    data_yaml: Path,
+    root: Path,
+    splits=SPLITS,
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+) -> HashIndex:
+    """Hashes for every image of `splits`, re-hashing only files whose size or mtime changed."""
+    paths, split_of = [], []
+    for split in splits:
+        try:
+            images = resolve_split_images(data_yaml, split)
+        except ValueError:
+            continue  # split not in data.yaml
+        paths.extend(str(p) for p in images)
+        split_of.extend([split] * len(images))
+    stats = [os.stat(p) for p in paths]
+    keys = [f"{p}\0{st.st_size}\0{st.st_mtime_ns}" for p, st in zip(paths, stats)]
+
+    cached: Dict[str, Tuple[int, bool]] = {}
+    cache = cache_dir(root) / INDEX_NAME
+    if use_cache and cache.exists():
+        try:
+            with np.load(cache, allow_pickle=False) as data:
+                if int(data["version"]) == HASH_VERSION:
+                    cached = dict(zip(data["keys"].tolist(), zip(data["hashes"].tolist(), data["valid"].tolist())))
+        except (OSError, KeyError, ValueError):
+            cached = {}
+
+    hashes = np.zeros(len(paths), dtype=np.uint64)
+    valid = np.zeros(len(paths), dtype=bool)
+    todo = []
+    for i, key in enumerate(keys):
+        if key in cached:
+            hashes[i], valid[i] = cached[key]
+        else:
+            todo.append(i)
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        todo_paths = [paths[i] for i in todo]
+        size = max(32, len(todo_paths) // (workers * 8))
+        chunks = [todo_paths[i:i + size] for i in range(0, len(todo_paths), size)]
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                computed = [h for chunk in pool.map(_hash_chunk, chunks) for h in chunk]
+        else:
+            computed = _hash_chunk(todo_paths)
+        hashes[todo] = np.asarray([0 if h is None else h for h in computed], dtype=np.uint64)
+        valid[todo] = np.asarray([h is not None for h in computed], dtype=bool)
+        if use_cache:
+            tmp = cache.with_name(f"{cache.stem}.tmp.npz")
+            try:
+                cache.parent.mkdir(exist_ok=True)
+                np.savez(tmp, version=np.int64(HASH_VERSION), keys=np.asarray(keys, dtype=str), hashes=hashes,
+                         valid=valid)
+                os.replace(tmp, cache)
+            except OSError:
+                pass
+    return HashIndex(np.asarray(paths, dtype=str), np.asarray(split_of, dtype=str), hashes, valid)
+
+
+def near_duplicate_pairs(hashes: np.ndarray, max_distance: int = 4) -> np.ndarray:
+    """(i, j, distance) rows, i < j, for every pair within `max_distance` bits."""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(hashes) < 2:
+        return np.zeros((0, 3), dtype=np.int64)
+    # Identical hashes are collapsed first so large groups of exact copies stay cheap.
+    uniq, inverse = np.unique(hashes, return_inverse=True)
+    blocks = max_distance + 1
+    width = max(1, 64 // blocks)
+    candidates = []
+    for b in range(blocks):
+        shift = np.uint64(b * width)
+        bits = 64 - b * width if b == blocks - 1 else width
+        mask = np.uint64((1 << bits) - 1)
+        key = (uniq >> shift) & mask
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        # Pair each entry with the ones k places later in sort order while the block matches.
+        for k in range(1, len(order)):
+            same = np.flatnonzero(sorted_key[k:] == sorted_key[:-k])
+            if not len(same):
+                break
+            candidates.append(np.stack([order[same], order[same + k]], axis=1))
+    pairs_u = np.zeros((0, 2), dtype=np.int64)
+    if candidates:
+        cand = np.sort(np.concatenate(candidates), axis=1).astype(np.int64)
+        codes = np.unique(cand[:, 0] * len(uniq) + cand[:, 1])
+        pairs_u = np.stack([codes // len(uniq), codes % len(uniq)], axis=1)
+        dist = popcount64(uniq[pairs_u[:, 0]] ^ uniq[pairs_u[:, 1]])
+        pairs_u = np.concatenate([pairs_u, dist[:, None]], axis=1)[dist <= max_distance]
+    else:
+        pairs_u = np.zeros((0, 3), dtype=np.int64)
+
+    # Expand unique-hash pairs back to images, plus distance-0 pairs inside each group.
+    members = np.argsort(inverse, kind="stable")
+    bounds = np.r_[0, np.cumsum(np.bincount(inverse, minlength=len(uniq)))]
+    out = []
+    for u in np.flatnonzero(np.diff(bounds) > 1).tolist():
+        group = members[bounds[u]:bounds[u + 1]]
+        a, c = np.triu_indices(len(group), k=1)
+        out.append(np.stack([group[a], group[c], np.zeros(len(a), dtype=np.int64)], axis=1))
+    for ua, ub, d in pairs_u.tolist():
+        ga, gb = members[bounds[ua]:bounds[ua + 1]], members[bounds[ub]:bounds[ub + 1]]
+        grid = np.stack(np.meshgrid(ga, gb, indexing="ij"), axis=-1).reshape(-1, 2)
+        out.append(np.concatenate([grid, np.full((len(grid), 1), d, dtype=np.int64)], axis=1))
+    if not out:
+        return np.zeros((0, 3), dtype=np.int64)
+    pairs = np.concatenate(out).astype(np.int64)
+    pairs[:, :2] = np.sort(pairs[:, :2], axis=1)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def clusters(n: int, pairs: np.ndarray) -> List[List[int]]:
+    """Connected components (size > 1) of the duplicate graph."""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, _ in pairs.tolist():
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups: Dict[int, List[int]] = {}
+    for i in {int(x) for x in pairs[:, :2].ravel().tolist()}:
+        groups.setdefault(find(i), []).append(i)
+    return [sorted(g) for g in sorted(groups.values(), key=min)]
+
+
+def find_duplicates(
+    dataset_dir: Optional[str] = None,
+    max_distance: int = 4,
+    workers: Optional[int] = None,
+    within_split: bool = False,
+) -> dict:
+    dataset_dir = dataset_dir or parameters.DATASET_DIR
+    index = get_index(dataset_dir)
+    if index.data_yaml is None:
+        raise FileNotFoundError(f"No data.yaml found in {dataset_dir}.")
+    hashes = build_hash_index(index.data_yaml, index.root, workers=workers)
+    ids = np.flatnonzero(hashes.valid)
+    pairs = near_duplicate_pairs(hashes.hashes[ids], max_distance)
+    pairs[:, :2] = ids[pairs[:, :2]]
+    cross = hashes.splits[pairs[:, 0]] != hashes.splits[pairs[:, 1]] if len(pairs) else np.zeros(0, dtype=bool)
+    reported = pairs if within_split else pairs[cross]
+
+    def _rel(i: int) -> str:
+        return os.path.relpath(hashes.paths[i], index.root)
+
+    leaks_by_splits: Dict[str, int] = {}
+    for i, j, _ in pairs[cross].tolist():
+        key = "/".join(sorted((str(hashes.splits[i]), str(hashes.splits[j]))))
+        leaks_by_splits[key] = leaks_by_splits.get(key, 0) + 1
+    return {
+        "dataset_dir": str(index.root),
+        "images": len(hashes),
+        "unhashed": [_rel(i) for i in np.flatnonzero(~hashes.valid).tolist()],
+        "max_distance": max_distance,
+        "duplicate_pairs": int(len(pairs)),
+        "cross_split_pairs": int(cross.sum()),
+        "cross_split_by_splits": leaks_by_splits,
+        "pairs": [
+            {"a": _rel(i), "split_a": str(hashes.splits[i]), "b": _rel(j), "split_b": str(hashes.splits[j]), "distance": d}
+            for i, j, d in reported.tolist()
+        ],
+        "clusters": [
+            [{"image": _rel(i), "split": str(hashes.splits[i])} for i in group]
+            for group in clusters(len(hashes), reported)
+        ],
+        "_index": hashes,
+        "_pairs": reported,
+    }
+
+
+def removal_plan(result: dict, remove_from: str) -> List[str]:
+    """Images of `remove_from` that duplicate an image of another split."""
+    hashes, pairs = result["_index"], result["_pairs"]
+    out = set()
+    for i, j, _ in pairs.tolist():
+        si, sj = str(hashes.splits[i]), str(hashes.splits[j])
+        if si == sj:
+            continue
+        if si == remove_from:
+            out.add(str(hashes.paths[i]))
+        if sj == remove_from:
+            out.add(str(hashes.paths[j]))
+    return sorted(out)
+
+
+def quarantine(paths: List[str], root: Path) -> int:
+    """Move images and their label files under `<root>/.dedup_removed/`, keeping relative paths."""
+    target = root / QUARANTINE_NAME
+    moved = 0
+    for path in map(Path, paths):
+        for src in (path, label_path_for_image(path)):
+            if not src.exists():
+                continue
+            dest = target / src.resolve().relative_to(root.resolve())
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(src), str(dest))
+        moved += 1
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate/near-duplicate images across dataset splits.")
+    parser.add_argument("--data-dir", type=str, default=None, help="Dataset directory (default DATASET_DIR).")
+    parser.add_argument("--max-distance", type=int, default=4, help="Hamming distance (bits of 64) for a match.")
+    parser.add_argument("--within-split", action="store_true", help="Also report duplicates inside one split.")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing processes (default: CPU count).")
+    parser.add_argument("--remove-from", choices=SPLITS, default=None, help="Split whose leaked copies to remove.")
+    parser.add_argument("--apply", action="store_true", help="Actually move them to .dedup_removed/.")
+    parser.add_argument("--out", type=str, default=None, help="Write the report as JSON.")
+    args = parser.parse_args()
+
+    result = find_duplicates(args.data_dir, args.max_distance, args.workers, args.within_split)
+    print(f"{result['images']} images, {result['duplicate_pairs']} duplicate pairs within {args.max_distance} bits")
+    if result["unhashed"]:
+        print(f"{len(result['unhashed'])} unreadable or flat images skipped")
+    print(f"cross-split pairs: {result['cross_split_pairs']} {result['cross_split_by_splits']}")
+    for pair in result["pairs"][:20]:
+        print(f"  [{pair['distance']}] {pair['split_a']}:{pair['a']}  <->  {pair['split_b']}:{pair['b']}")
+    if len(result["pairs"]) > 20:
+        print(f"  ... {len(result['pairs']) - 20} more")
+
+    if args.remove_from:
+        plan = removal_plan(result, args.remove_from)
+        if args.apply:
+            root = Path(result["dataset_dir"])
+            print(f"Moved {quarantine(plan, root)} {args.remove_from} images to {root / QUARANTINE_NAME}")
+        else:
+            print(f"Would remove {len(plan)} {args.remove_from} images (use --apply)")
+
+    if args.out:
+        report = {k: v for k, v in result.items() if not k.startswith("_")}
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
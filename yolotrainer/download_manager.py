@@ -0,0 +1,428 @@
+"""
+Roboflow dataset downloads: versioned, resumable, verified, promoted atomically.
+
+A dataset is identified by workspace/project/version/format. Its export archive
+is fetched from the Roboflow REST API (ROBOFLOW_API_URL, so a local stand-in
+server works too) in parallel HTTP range chunks into a `.part` file under
+DATASET_CACHE_DIR. Finished chunks are recorded with their SHA-256 in a state
+file, so an interrupted download resumes where it stopped. The completed
+archive is kept per version; it is extracted into a staging directory, a
+manifest with the size and SHA-256 of every file is written next to data.yaml,
+and the complete tree is moved next to the dataset directory before two renames
+swap it in, so the old dataset stays in place until the new one is ready.
+
+    python -m yolotrainer.download_manager --target Brain-Tumor-Segmentation-1
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import parameters
+from parameters import (
+    DATASET_CACHE_DIR,
+    DATASET_DOWNLOAD_CHUNK_MB,
+    DATASET_DOWNLOAD_WORKERS,
+    ROBOFLOW_API_KEY,
+    ROBOFLOW_API_URL,
+    ROBOFLOW_FORMAT,
+    ROBOFLOW_PROJECT,
+    ROBOFLOW_VERSION,
+    ROBOFLOW_WORKSPACE,
+)
+from .dataset_index import get_index, invalidate
+
+MANIFEST_NAME = ".dataset_manifest.json"
+MANIFEST_VERSION = 1
+RETRIES = 3
+
+# progress(phase, done, total): phase is "download", "verify", "extract" or "promote".
+ProgressFn = Callable[[str, int, int], None]
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+class DatasetKey:
+    def __init__(self, workspace: str, project: str, version: int, fmt: str):
+        self.workspace = workspace
+        self.project = project
+        self.version = int(version)
+        self.format = fmt
+
+    @classmethod
+    def default(cls) -> "DatasetKey":
+        return cls(ROBOFLOW_WORKSPACE, ROBOFLOW_PROJECT, ROBOFLOW_VERSION, ROBOFLOW_FORMAT)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"workspace": self.workspace, "project": self.project, "version": self.version, "format": self.format}
+
+    def __str__(self) -> str:
+        return f"{self.workspace}/{self.project}/{self.version}/{self.format}"
+
+
+def sha256_file(path: Path, start: int = 0, length: Optional[int] = None) -> str:
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining is None or remaining > 0:
+            block = f.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def read_manifest(dataset_dir: str) -> Optional[dict]:
+    try:
+        with open(Path(dataset_dir) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def verify_dataset(dataset_dir: str, key: Optional[DatasetKey] = None, full: bool = False) -> bool:
+    """
+    True when `dataset_dir` holds a complete managed download (of `key`, if given).
+    Sizes are always checked; `full` also re-hashes every file.
+    """
+    manifest = read_manifest(dataset_dir)
+    if manifest is None or manifest.get("manifest_version") != MANIFEST_VERSION:
+        return False
+    if key is not None and manifest.get("dataset") != key.as_dict():
+        return False
+    root = Path(dataset_dir)
+    for rel, (size, digest) in manifest.get("files", {}).items():
+        path = root / rel
+        try:
+            if path.stat().st_size != size:
+                return False
+        except OSError:
+            return False
+        if full and sha256_file(path) != digest:
+            return False
+    return True
+
+
+class DownloadManager:
+    def __init__(
+        self,
+        key: Optional[DatasetKey] = None,
+        api_url: str = ROBOFLOW_API_URL,
+        api_key: str = ROBOFLOW_API_KEY,
+        cache_dir: str = DATASET_CACHE_DIR,
+        workers: int = DATASET_DOWNLOAD_WORKERS,
+        chunk_bytes: int = int(DATASET_DOWNLOAD_CHUNK_MB * 1024 * 1024),
+        progress: Optional[ProgressFn] = None,
+    ):
+        self.key = key or DatasetKey.default()
+        self.api_url = api_url.rstrip("/")
+        self.api_key = api_key
+        self.cache = Path(cache_dir)
+        self.workers = max(1, workers)
+        self.chunk_bytes = max(1 << 16, chunk_bytes)
+        self.progress = progress or (lambda phase, done, total: None)
+
+    @property
+    def archive_path(self) -> Path:
+        k = self.key
+        return self.cache / k.workspace / k.project / f"{k.version}-{k.format}.zip"
+
+    # -- export archive -------------------------------------------------------------
+
+    def export_link(self) -> str:
+        """Ask the Roboflow API for the signed export URL of this version."""
+        k = self.key
+        query = urllib.parse.urlencode({"api_key": self.api_key})
+        url = f"{self.api_url}/{k.workspace}/{k.project}/{k.version}/{k.format}?{query}"
+        try:
+            with urllib.request.urlopen(url, timeout=60) as resp:
+                body = json.load(resp)
+        except (OSError, ValueError) as exc:
+            raise DownloadError(f"Export lookup for {k} failed: {exc}") from exc
+        link = (body.get("export") or {}).get("link")
+        if not link:
+            raise DownloadError(f"Roboflow returned no export link for {k}.")
+        return link
+
+    def _probe(self, link: str) -> tuple[int, bool, str]:
+        """(size, supports ranges, etag) from a one-byte range request."""
+        req = urllib.request.Request(link, headers={"Range": "bytes=0-0"})
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            etag = resp.headers.get("ETag", "")
+            if resp.status == 206:
+                total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                if total.isdigit():
+                    return int(total), True, etag
+            return int(resp.headers.get("Content-Length") or 0), False, etag
+
+    def _fetch_range(self, link: str, part: Path, start: int, end: int) -> str:
+        """Write bytes [start, end] at their offset in `part`; returns the chunk's SHA-256."""
+        last_exc = None
+        for attempt in range(RETRIES):
+            digest = hashlib.sha256()
+            offset = start
+            try:
+                req = urllib.request.Request(link, headers={"Range": f"bytes={start}-{end}"})
+                # one handle per chunk (no os.pwrite on Windows); chunks never overlap
+                with urllib.request.urlopen(req, timeout=120) as resp, open(part, "r+b") as f:
+                    if resp.status != 206:
+                        raise DownloadError(f"range request returned HTTP {resp.status}")
+                    f.seek(start)
+                    while True:
+                        block = resp.read(1 << 20)
+                        if not block:
+                            break
+                        f.write(block)
+                        digest.update(block)
+                        offset += len(block)
+                        self._advance(len(block))
+                if offset != end + 1:
+                    raise DownloadError(f"short read for bytes {start}-{end}")
+                return digest.hexdigest()
+            except (OSError, DownloadError) as exc:
+                last_exc = exc
+                self._advance(start - offset)
+                time.sleep(0.5 * (attempt + 1))
+        raise DownloadError(f"bytes {start}-{end}: {last_exc}")
+
+    def _advance(self, n: int) -> None:
+        with self._lock:
+            self._done += n
+            done = self._done
+        self.progress("download", done, self._total)
+
+    def _download_archive(self) -> Path:
+        archive = self.archive_path
+        part = archive.with_suffix(".zip.part")
+        state_path = archive.with_suffix(".zip.part.json")
+        archive.parent.mkdir(parents=True, exist_ok=True)
+
+        link = self.export_link()
+        size, ranged, etag = self._probe(link)
+        self._lock = threading.Lock()
+        self._total, self._done = size, 0
+
+        if not ranged or size <= 0:
+            # No range support: one plain stream, restarted from zero if interrupted.
+            with urllib.request.urlopen(link, timeout=120) as resp, open(part, "wb") as f:
+                while True:
+                    block = resp.read(1 << 20)
+                    if not block:
+                        break
+                    f.write(block)
+                    self._advance(len(block))
+            os.replace(part, archive)
+            return archive
+
+        state = {}
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if state.get("size") != size or state.get("etag") != etag or state.get("chunk_bytes") != self.chunk_bytes:
+            state = {"size": size, "etag": etag, "chunk_bytes": self.chunk_bytes, "chunks": {}}
+        chunks = [(s, min(s + self.chunk_bytes, size) - 1) for s in range(0, size, self.chunk_bytes)]
+
+        with open(part, "ab") as f:
+            f.truncate(size)
+        state_lock = threading.Lock()
+        # Chunks recorded as done are kept only if their bytes still hash the same.
+        pending = []
+        for start, end in chunks:
+            digest = state["chunks"].get(str(start))
+            if digest and sha256_file(part, start, end - start + 1) == digest:
+                self._advance(end - start + 1)
+            else:
+                state["chunks"].pop(str(start), None)
+                pending.append((start, end))
+
+        def _save_state() -> None:
+            tmp = state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state), encoding="utf-8")
+            os.replace(tmp, state_path)
+
+        def _job(span) -> None:
+            digest = self._fetch_range(link, part, *span)
+            with state_lock:
+                state["chunks"][str(span[0])] = digest
+                _save_state()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dataset-download") as pool:
+            for future in [pool.submit(_job, span) for span in pending]:
+                future.result()
+        with open(part, "r+b") as f:
+            os.fsync(f.fileno())
+
+        os.replace(part, archive)
+        state_path.unlink(missing_ok=True)
+        return archive
+
+    def fetch_archive(self, force: bool = False) -> Path:
+        """Cached export archive for this version, downloading (or resuming) it if needed."""
+        archive = self.archive_path
+        sidecar = archive.with_suffix(".zip.sha256")
+        if not force and archive.exists() and sidecar.exists():
+            self.progress("verify", 0, 1)
+            if sha256_file(archive) == sidecar.read_text(encoding="ascii").strip() and zipfile.is_zipfile(archive):
+                self.progress("verify", 1, 1)
+                return archive
+        archive.unlink(missing_ok=True)
+        self._download_archive()
+        if not zipfile.is_zipfile(archive):
+            archive.unlink(missing_ok=True)
+            raise DownloadError(f"Downloaded export for {self.key} is not a zip archive.")
+        sidecar.write_text(sha256_file(archive), encoding="ascii")
+        return archive
+
+    # -- extraction and promotion ------------------------------------------------------
+
+    def _extract(self, archive: Path, staging: Path) -> Dict[str, List]:
+        files = {}
+        root = staging.resolve()
+        with zipfile.ZipFile(archive) as zf:
+            members = [m for m in zf.infolist() if not m.is_dir()]
+            for i, member in enumerate(members, start=1):
+                dest = (staging / member.filename).resolve()
+                if root not in dest.parents:
+                    raise DownloadError(f"Archive member escapes the dataset directory: {member.filename}")
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                digest = hashlib.sha256()
+                with zf.open(member) as src, open(dest, "wb") as out:
+                    for block in iter(lambda: src.read(1 << 20), b""):
+                        digest.update(block)
+                        out.write(block)
+                files[dest.relative_to(root).as_posix()] = [member.file_size, digest.hexdigest()]
+                self.progress("extract", i, len(members))
+        return files
+
+    def install(self, target: str, force: bool = False) -> str:
+        """Make `target` hold this dataset version; returns `target`."""
+        target_path = Path(target)
+        if not force and verify_dataset(target, self.key):
+            return str(target_path)
+        archive = self.fetch_archive(force=force)
+
+        staging = self.cache / f"staging-{uuid.uuid4().hex[:8]}"
+        try:
+            files = self._extract(archive, staging)
+            if not (staging / "data.yaml").exists():
+                raise DownloadError(f"Export for {self.key} has no data.yaml at its root.")
+            manifest = {
+                "manifest_version": MANIFEST_VERSION,
+                "dataset": self.key.as_dict(),
+                "archive_sha256": archive.with_suffix(".zip.sha256").read_text(encoding="ascii").strip(),
+                "created_at": time.time(),
+                "files": files,
+            }
+            (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            self.progress("promote", 0, 1)
+            self._promote(staging, target_path)
+            invalidate(str(target_path))
+            self.progress("promote", 1, 1)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return str(target_path)
+
+    def _promote(self, staging: Path, target: Path) -> None:
+        """
+        Swap the staging directory in. The new tree is first put next to the target
+        (renamed, or copied when the cache is on another filesystem); only then is the
+        target renamed aside and the new tree renamed onto it. A failed swap restores it.
+        """
+        target.parent.mkdir(parents=True, exist_ok=True)
+        incoming = target.with_name(f".{target.name}.incoming")
+        shutil.rmtree(incoming, ignore_errors=True)
+        try:
+            try:
+                os.replace(staging, incoming)
+            except OSError:
+                shutil.copytree(staging, incoming)
+            aside = None
+            if target.exists():
+                aside = target.with_name(f".{target.name}.replaced-{uuid.uuid4().hex[:8]}")
+                os.replace(target, aside)
+            try:
+                os.replace(incoming, target)
+            except OSError:
+                if aside is not None:
+                    os.replace(aside, target)
+                raise
+        finally:
+            shutil.rmtree(incoming, ignore_errors=True)
+        if aside is not None:
+            shutil.rmtree(aside, ignore_errors=True)
+
+
+def dataset_present(dataset_dir: str) -> bool:
+    """
+    data.yaml at the root and train images (from the cached dataset index). A managed
+    download must also be of the configured version with every manifest file at its
+    recorded size (`verify_dataset`); a dataset without a manifest is taken as is.
+    """
+    if not get_index(dataset_dir).ready:
+        return False
+    if read_manifest(dataset_dir) is None:
+        return True
+    return verify_dataset(dataset_dir, DatasetKey.default())
+
+
+def ensure_dataset(target: Optional[str] = None, progress: Optional[ProgressFn] = None, force: bool = False) -> str:
+    target = target or parameters.DATASET_DIR
+    if not force and dataset_present(target):
+        return target
+    return DownloadManager(progress=progress).install(target, force=force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the Roboflow dataset (resumable, verified).")
+    parser.add_argument("--target", type=str, default=None, help="Dataset directory (default DATASET_DIR).")
+    parser.add_argument("--workspace", type=str, default=ROBOFLOW_WORKSPACE)
+    parser.add_argument("--project", type=str, default=ROBOFLOW_PROJECT)
+    parser.add_argument("--version", type=int, default=ROBOFLOW_VERSION)
+    parser.add_argument("--format", type=str, default=ROBOFLOW_FORMAT)
+    parser.add_argument("--api-url", type=str, default=ROBOFLOW_API_URL)
+    parser.add_argument("--workers", type=int, default=DATASET_DOWNLOAD_WORKERS)
+    parser.add_argument("--force", action="store_true", help="Re-download and replace even if present.")
+    parser.add_argument("--verify", action="store_true", help="Only check the target against its manifest.")
+    args = parser.parse_args()
+
+    key = DatasetKey(args.workspace, args.project, args.version, args.format)
+    target = args.target or parameters.DATASET_DIR
+    if args.verify:
+        ok = verify_dataset(target, key, full=True)
+        print(f"{target}: {'ok' if ok else 'missing or does not match the manifest'}")
+        raise SystemExit(0 if ok else 1)
+
+    last = {}
+
+    def _print_progress(phase: str, done: int, total: int) -> None:
+        pct = int(100 * done / total) if total else 0
+        if last.get(phase) != pct:
+            last[phase] = pct
+            print(f"\r{phase}: {pct:3d}%", end="\n" if pct == 100 else "", flush=True)
+
+    manager = DownloadManager(key, api_url=args.api_url, workers=args.workers, progress=_print_progress)
+    print(f"Installed {key} into {manager.install(target, force=args.force)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Score a dataset split with the exact `/predict` decision rule.
+
+One low-confidence inference pass is enough: Ultralytics keeps detections with
+conf > th and NMS is greedy by descending confidence, so the detections that survive
+a higher threshold are exactly the subset of the low-threshold output above it.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from dataset_sanity_check import label_path_for_image, resolve_split_images
+from .custom_predictor import YoloPredictor, decide_tumor, resolve_tumor_class_idx, to_numpy
+from .labels import parse_label_text, polygons_for_labels
+
+
+def load_yolo_polygons(label_path: Path) -> list[tuple[int, np.ndarray]]:
+    """Return (class_id, normalized (N, 2) float32 points) for every polygon line."""
+    if not label_path.exists():
+        return []
+    classes, lengths, coords, _ = parse_label_text(label_path.read_text(encoding="utf-8"))
+    points = np.asarray(coords, dtype=np.float32).reshape(-1, 2)
+    bounds = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    return [
+        (cls_id, points[bounds[i]:bounds[i + 1]])
+        for i, cls_id in enumerate(classes)
+        if lengths[i] >= 3
+    ]
+
+
+def rasterize_polygons(polygons, height: int, width: int) -> np.ndarray:
+    """
+    Even-odd scanline fill of pixel-space polygons into a (height, width) bool mask.
+
+    Edge/scanline intersections for a whole polygon are computed at once; each
+    intersection toggles a column and a cumulative sum along rows yields the parity.
+    """
+    mask = np.zeros((height, width), dtype=bool)
+    for pts in polygons:
+        pts = np.asarray(pts, dtype=np.float64)
+        if len(pts) < 3:
+            continue
+        x0, y0 = pts[:, 0], pts[:, 1]
+        x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+        row_lo = max(int(np.floor(y0.min() - 0.5)), 0)
+        row_hi = min(int(np.ceil(y0.max() - 0.5)) + 1, height)
+        if row_lo >= row_hi:
+            continue
+
+        ys = np.arange(row_lo, row_hi, dtype=np.float64) + 0.5
+        lo = np.minimum(y0, y1)
+        hi = np.maximum(y0, y1)
+        rows, edges = np.nonzero((ys[:, None] >= lo) & (ys[:, None] < hi))
+        if len(rows) == 0:
+            continue
+        t = (ys[rows] - y0[edges]) / (y1[edges] - y0[edges])
+        xs = x0[edges] + t * (x1[edges] - x0[edges])
+        # First pixel whose centre lies right of the crossing.
+        cols = np.clip(np.floor(xs - 0.5).astype(np.int64) + 1, 0, width)
+
+        toggles = np.zeros((row_hi - row_lo, width + 1), dtype=np.int32)
+        np.add.at(toggles, (rows, cols), 1)
+        mask[row_lo:row_hi] |= (np.cumsum(toggles[:, :width], axis=1) & 1).astype(bool)
+    return mask
+
+
+def ground_truth_mask(label_path: Path, tumor_class_idx: int, height: int, width: int) -> np.ndarray:
+    return polygons_mask(load_yolo_polygons(label_path), tumor_class_idx, height, width)
+
+
+def polygons_mask(polygons, tumor_class_idx: int, height: int, width: int) -> np.ndarray:
+    """Rasterize the tumor-class polygons from `load_yolo_polygons`-style (class, points) pairs."""
+    scale = np.array([width, height], dtype=np.float32)
+    return rasterize_polygons([pts * scale for cls_id, pts in polygons if cls_id == tumor_class_idx], height, width)
+
+
+def dice_iou(pred: np.ndarray, gt: np.ndarray) -> tuple[float, float]:
+    inter = int(np.count_nonzero(pred & gt))
+    total = int(np.count_nonzero(pred)) + int(np.count_nonzero(gt))
+    if total == 0:
+        return 1.0, 1.0
+    union = total - inter
+    return 2.0 * inter / total, inter / union
+
+
+def roc_sweep(scores: np.ndarray, labels: np.ndarray, thresholds: np.ndarray) -> dict:
+    """Image-level TPR/FPR for `score > t` at every threshold, plus trapezoidal AUC."""
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=bool)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    positive = scores[None, :] > thresholds[:, None]
+    n_pos = max(int(labels.sum()), 1)
+    n_neg = max(int((~labels).sum()), 1)
+    tp = (positive & labels).sum(axis=1)
+    fp = (positive & ~labels).sum(axis=1)
+    tpr = tp / n_pos
+    fpr = fp / n_neg
+
+    order = np.lexsort((tpr, fpr))  # ties in fpr must climb in tpr, or the area is undercounted
+    fpr_sorted = np.concatenate([[0.0], fpr[order], [1.0]])
+    tpr_sorted = np.concatenate([[0.0], tpr[order], [1.0]])
+    auc = float(np.sum(np.diff(fpr_sorted) * (tpr_sorted[1:] + tpr_sorted[:-1]) / 2.0))
+    return {
+        "thresholds": thresholds.tolist(),
+        "tpr": tpr.tolist(),
+        "fpr": fpr.tolist(),
+        "tp": tp.tolist(),
+        "fp": fp.tolist(),
+        "auc": auc,
+    }
+
+
+def _binary_stats(pred: np.ndarray, labels: np.ndarray) -> dict:
+    tp = int(np.count_nonzero(pred & labels))
+    fn = int(np.count_nonzero(~pred & labels))
+    tn = int(np.count_nonzero(~pred & ~labels))
+    fp = int(np.count_nonzero(pred & ~labels))
+    return {
+        "tp": tp,
+        "fn": fn,
+        "tn": tn,
+        "fp": fp,
+        "sensitivity": tp / (tp + fn) if tp + fn else None,
+        "specificity": tn / (tn + fp) if tn + fp else None,
+    }
+
+
+def evaluate_split(
+    predictor: YoloPredictor,
+    data_yaml: str,
+    split: str = "test",
+    img_size: int = 256,
+    conf_th: float = 0.25,
+    iou_th: float = 0.7,
+    min_mask_area: int = 0,
+    conf_floor: float = 0.001,
+    batch_size: int = 16,
+    thresholds=None,
+    max_det: int = 50,
+) -> dict:
+    if conf_floor > conf_th:
+        raise ValueError("conf_floor must not exceed conf_th.")
+    data_yaml = Path(data_yaml)
+    data = yaml.safe_load(data_yaml.read_text(encoding="utf-8")) or {}
+    gt_tumor_idx = resolve_tumor_class_idx(data.get("names"))
+    model_tumor_idx = predictor._resolve_tumor_class_idx(default_idx=0)
+    images = resolve_split_images(data_yaml, split)
+    if not images:
+        raise RuntimeError(f"No images found for split '{split}'.")
+    gt_polygons = polygons_for_labels(label_path_for_image(p) for p in images)
+
+    if thresholds is None:
+        thresholds = np.round(np.arange(0.0, 1.0, 0.01), 4)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    # Below the floor the pass never produced candidates, so those points are not exact.
+    thresholds = thresholds[thresholds >= conf_floor]
+
+    scores = np.zeros(len(images), dtype=np.float64)
+    labels = np.zeros(len(images), dtype=bool)
+    predicted = np.zeros(len(images), dtype=bool)
+    dice = np.zeros(len(images), dtype=np.float64)
+    iou = np.zeros(len(images), dtype=np.float64)
+    per_image = []
+
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        results = predictor.predict_batch(
+            [str(p) for p in batch],
+            img_size=img_size,
+            conf_th=conf_floor,
+            iou_th=iou_th,
+            retina_masks=True,
+            max_det=max_det,
+        )
+        for offset, (img_path, res) in enumerate(zip(batch, results)):
+            i = start + offset
+            height, width = res.orig_shape
+            cand = predictor.extract_candidates(res, with_areas=True)
+
+            # ROC score: the best tumor confidence that survives the area filter.
+            scored = decide_tumor(cand["cls"], cand["conf"], cand["area"], model_tumor_idx, min_mask_area)
+            decision = decide_tumor(
+                cand["cls"], cand["conf"], cand["area"], model_tumor_idx, min_mask_area, conf_th=conf_th
+            )
+            scores[i] = scored["best_conf"]
+            predicted[i] = decision["has_tumor"]
+
+            pred_mask = np.zeros((height, width), dtype=bool)
+            if res.masks is not None and decision["kept"].any():
+                masks = to_numpy(res.masks.data[np.flatnonzero(decision["kept"]).tolist()])
+                pred_mask = (masks > 0.5).any(axis=0)
+
+            gt_mask = polygons_mask(gt_polygons[i], gt_tumor_idx, height, width)
+            labels[i] = bool(gt_mask.any())
+            dice[i], iou[i] = dice_iou(pred_mask, gt_mask)
+            per_image.append(
+                {
+                    "image": img_path.name,
+                    "gt_tumor": bool(labels[i]),
+                    "has_tumor": bool(predicted[i]),
+                    "score": float(scores[i]),
+                    "dice": float(dice[i]),
+                    "iou": float(iou[i]),
+                }
+            )
+        del results
+
+    positives = labels
+    return {
+        "data_yaml": str(data_yaml),
+        "split": split,
+        "images": len(images),
+        "params": {
+            "img_size": img_size,
+            "conf_th": conf_th,
+            "iou_th": iou_th,
+            "min_mask_area": min_mask_area,
+            "conf_floor": conf_floor,
+            "max_det": max_det,
+        },
+        "image_level": _binary_stats(predicted, labels),
+        "segmentation": {
+            "mean_dice": float(dice.mean()),
+            "mean_iou": float(iou.mean()),
+            "mean_dice_positive": float(dice[positives].mean()) if positives.any() else None,
+            "mean_iou_positive": float(iou[positives].mean()) if positives.any() else None,
+        },
+        "roc": roc_sweep(scores, labels, thresholds),
+        "per_image": per_image,
+    }
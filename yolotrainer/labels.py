@@ -0,0 +1,203 @@
+"""
+Columnar YOLO label loading shared by the dataset tools.
+
+All `*.txt` files of a labels directory are parsed (in parallel for large sets)
+into flat arrays: polygon coordinates as float32 with point offsets, one class
+id and one file id per polygon, plus per-file polygon offsets and malformed-line
+counts. Files are ordered by name, so the result does not depend on worker
+scheduling. The arrays are cached next to the directory (`labels/` ->
+`labels.npz`) and reused while the names, sizes and mtimes of the label files
+are unchanged.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+CACHE_VERSION = 1
+PARALLEL_MIN_FILES = 512
+
+
+def parse_label_text(text: str) -> Tuple[List[int], List[int], List[float], int]:
+    """
+    (class ids, points per polygon, flat coordinates, malformed lines) for one file.
+    A line is kept when it is `cls x1 y1 ...` with numeric values and an even number of
+    coordinates; anything else counts as malformed.
+    """
+    classes, lengths, coords = [], [], []
+    bad = 0
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) < 3 or len(parts) % 2 == 0:
+            bad += 1
+            continue
+        try:
+            values = [float(x) for x in parts]
+        except ValueError:
+            bad += 1
+            continue
+        classes.append(int(values[0]))
+        lengths.append((len(values) - 1) // 2)
+        coords.extend(values[1:])
+    return classes, lengths, coords, bad
+
+
+def _parse_files(paths: List[str]):
+    out = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                out.append(parse_label_text(f.read()))
+        except (OSError, UnicodeDecodeError):
+            out.append(([], [], [], 1))
+    return out
+
+
+def _listing(labels_dir: Path) -> List[os.DirEntry]:
+    try:
+        with os.scandir(labels_dir) as it:
+            entries = [e for e in it if e.name.endswith(".txt") and e.is_file()]
+    except OSError:
+        return []
+    return sorted(entries, key=lambda e: e.name)
+
+
+def _signature(entries: Iterable[os.DirEntry]) -> str:
+    digest = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    for entry in entries:
+        st = entry.stat()
+        digest.update(f"{entry.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class LabelSet:
+    """
+    Polygons of one labels directory. Polygon p belongs to file `poly_file[p]`, has class
+    `poly_class[p]` and points `coords[2 * poly_offsets[p] : 2 * poly_offsets[p + 1]]`;
+    file f owns polygons `file_offsets[f] : file_offsets[f + 1]`.
+    """
+
+    ARRAYS = ("names", "file_offsets", "bad_lines", "poly_offsets", "poly_class", "poly_file", "coords")
+
+    def __init__(self, labels_dir: Path, arrays: Dict[str, np.ndarray]):
+        self.labels_dir = Path(labels_dir)
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self._index = {str(n): i for i, n in enumerate(self.names.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_polygons(self) -> int:
+        return len(self.poly_class)
+
+    def points(self) -> np.ndarray:
+        return self.coords.reshape(-1, 2)
+
+    def file_id(self, label_path) -> int:
+        """Index of a label file (by name) in this set, or -1."""
+        return self._index.get(Path(label_path).name, -1)
+
+    def polygons(self, file_id: int, min_points: int = 3) -> List[Tuple[int, np.ndarray]]:
+        """(class id, normalized (N, 2) float32 points) per polygon of one file."""
+        if file_id < 0:
+            return []
+        pts = self.points()
+        out = []
+        for p in range(self.file_offsets[file_id], self.file_offsets[file_id + 1]):
+            lo, hi = self.poly_offsets[p], self.poly_offsets[p + 1]
+            if hi - lo >= min_points:
+                out.append((int(self.poly_class[p]), pts[lo:hi]))
+        return out
+
+    def poly_out_of_range(self) -> np.ndarray:
+        """Per polygon: any coordinate outside [0, 1]."""
+        bad = ((self.coords < 0.0) | (self.coords > 1.0)).astype(np.int32)
+        counts = np.add.reduceat(bad, 2 * self.poly_offsets[:-1]) if len(bad) else np.zeros(0, np.int32)
+        # reduceat repeats the value at a start index for empty polygons; there are none (>= 1 point).
+        return counts > 0
+
+    def files_with_class(self, class_ids) -> np.ndarray:
+        """Boolean per file: has at least one polygon whose class is in `class_ids`."""
+        hit = np.isin(self.poly_class, list(class_ids))
+        out = np.zeros(len(self), dtype=bool)
+        out[self.poly_file[hit]] = True
+        return out
+
+
+def cache_path_for(labels_dir: Path) -> Path:
+    labels_dir = Path(labels_dir)
+    return labels_dir.parent / f"{labels_dir.name}.npz"
+
+
+def _build(labels_dir: Path, entries: List[os.DirEntry], workers: Optional[int]) -> Dict[str, np.ndarray]:
+    paths = [e.path for e in entries]
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers > 1 and len(paths) >= PARALLEL_MIN_FILES:
+        size = max(64, len(paths) // (workers * 4))
+        chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = [item for chunk in pool.map(_parse_files, chunks) for item in chunk]
+    else:
+        parsed = _parse_files(paths)
+
+    file_counts = np.asarray([len(c) for c, _, _, _ in parsed], dtype=np.int64)
+    lengths = [n for _, ls, _, _ in parsed for n in ls]
+    poly_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=poly_offsets[1:])
+    file_offsets = np.zeros(len(parsed) + 1, dtype=np.int64)
+    np.cumsum(file_counts, out=file_offsets[1:])
+    return {
+        "names": np.asarray([e.name for e in entries], dtype=str),
+        "file_offsets": file_offsets,
+        "bad_lines": np.asarray([b for _, _, _, b in parsed], dtype=np.int32),
+        "poly_offsets": poly_offsets,
+        "poly_class": np.asarray([c for cs, _, _, _ in parsed for c in cs], dtype=np.int32),
+        "poly_file": np.repeat(np.arange(len(parsed), dtype=np.int32), file_counts),
+        "coords": np.asarray([x for _, _, xs, _ in parsed for x in xs], dtype=np.float32),
+    }
+
+
+def load_labels(labels_dir, workers: Optional[int] = None, use_cache: bool = True) -> LabelSet:
+    """LabelSet for every `*.txt` directly in `labels_dir`, from the .npz cache when still valid."""
+    labels_dir = Path(labels_dir)
+    entries = _listing(labels_dir)
+    signature = _signature(entries)
+    cache = cache_path_for(labels_dir)
+    if use_cache and cache.exists():
+        try:
+            with np.load(cache, allow_pickle=False) as data:
+                if str(data["signature"]) == signature:
+                    return LabelSet(labels_dir, {name: data[name] for name in LabelSet.ARRAYS})
+        except (OSError, KeyError, ValueError):
+            pass
+    arrays = _build(labels_dir, entries, workers)
+    if use_cache and entries:
+        tmp = cache.with_name(f"{cache.stem}.tmp.npz")
+        try:
+            np.savez(tmp, signature=np.asarray(signature), **arrays)
+            os.replace(tmp, cache)
+        except OSError:
+            pass  # read-only dataset: still return the parsed set
+    return LabelSet(labels_dir, arrays)
+
+
+def polygons_for_labels(label_paths, min_points: int = 3) -> List[List[Tuple[int, np.ndarray]]]:
+    """Polygons per label path, loading each distinct labels directory once."""
+    sets: Dict[Path, LabelSet] = {}
+    out = []
+    for path in label_paths:
+        path = Path(path)
+        if path.parent not in sets:
+            sets[path.parent] = load_labels(path.parent)
+        label_set = sets[path.parent]
+        out.append(label_set.polygons(label_set.file_id(path), min_points=min_points))
+    return out
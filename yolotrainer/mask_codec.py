@@ -0,0 +1,107 @@
+"""
+Compact binary-mask encodings: COCO-style uncompressed RLE and simplified polygons.
+
+RLE follows the COCO convention: column-major (Fortran) order, counts alternate
+background/foreground runs and always start with a (possibly zero) background run.
+Polygons are COCO flat lists [x1, y1, x2, y2, ...] in pixel coordinates.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+MASK_FORMATS = ("rle", "polygon")
+
+
+def encode_rle(mask: np.ndarray) -> Dict[str, list]:
+    mask = np.asarray(mask, dtype=bool)
+    h, w = mask.shape
+    flat = mask.ravel(order="F")
+    if flat.size == 0:
+        return {"size": [h, w], "counts": []}
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate([[0], change, [flat.size]])
+    counts = np.diff(bounds)
+    if flat[0]:
+        counts = np.concatenate([[0], counts])
+    return {"size": [int(h), int(w)], "counts": counts.astype(np.int64).tolist()}
+
+
+def decode_rle(rle: Dict[str, list]) -> np.ndarray:
+    h, w = rle["size"]
+    counts = np.asarray(rle["counts"], dtype=np.int64)
+    values = np.zeros(len(counts), dtype=bool)
+    values[1::2] = True
+    flat = np.repeat(values, counts)
+    return flat.reshape((w, h)).T if flat.size == h * w else np.zeros((h, w), dtype=bool)
+
+
+def rle_area(rle: Dict[str, list]) -> int:
+    return int(sum(rle["counts"][1::2]))
+
+
+def rle_bbox(rle: Dict[str, list]) -> List[int]:
+    """[x, y, width, height] of the foreground, computed without decoding."""
+    h, _ = rle["size"]
+    counts = np.asarray(rle["counts"], dtype=np.int64)
+    if len(counts) < 2:
+        return [0, 0, 0, 0]
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    fg_start, fg_end = starts[1::2], ends[1::2] - 1
+    keep = fg_end >= fg_start
+    if not keep.any():
+        return [0, 0, 0, 0]
+    fg_start, fg_end = fg_start[keep], fg_end[keep]
+    x0, x1 = int(fg_start.min() // h), int(fg_end.max() // h)
+    # A run spanning whole columns covers every row in between.
+    spans = (fg_end // h) > (fg_start // h)
+    if spans.any():
+        y0, y1 = 0, h - 1
+    else:
+        y0, y1 = int((fg_start % h).min()), int((fg_end % h).max())
+    return [x0, y0, x1 - x0 + 1, y1 - y0 + 1]
+
+
+def mask_to_polygons(mask: np.ndarray, epsilon: float = 1.0, min_points: int = 3) -> List[List[float]]:
+    """Outer contours simplified with Douglas-Peucker (`epsilon` in pixels)."""
+    import cv2
+
+    mask = np.ascontiguousarray(mask, dtype=np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    polygons = []
+    for contour in contours:
+        if epsilon > 0:
+            contour = cv2.approxPolyDP(contour, epsilon, True)
+        if len(contour) >= min_points:
+            polygons.append(contour.reshape(-1).astype(float).tolist())
+    return polygons
+
+
+def polygons_to_mask(polygons: List[List[float]], height: int, width: int) -> np.ndarray:
+    from .evaluation import rasterize_polygons
+
+    return rasterize_polygons([np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in polygons], height, width)
+
+
+def rle_to_format(rle: Dict[str, list], fmt: str, epsilon: float = 1.0):
+    """Return `rle` unchanged or as polygons."""
+    if fmt == "rle":
+        return rle
+    if fmt == "polygon":
+        return mask_to_polygons(decode_rle(rle), epsilon=epsilon)
+    raise ValueError(f"mask format must be one of {MASK_FORMATS}")
+
+
+def format_instances(instances: List[dict], fmt: str, epsilon: float = 1.0) -> List[dict]:
+    """Instances as produced by YoloPredictor.encode_masks, with `rle` kept or replaced by `polygons`."""
+    if fmt not in MASK_FORMATS:
+        raise ValueError(f"mask format must be one of {MASK_FORMATS}")
+    out = []
+    for inst in instances:
+        item = {k: v for k, v in inst.items() if k != "rle"}
+        if fmt == "rle":
+            item["rle"] = inst["rle"]
+        else:
+            item["polygons"] = rle_to_format(inst["rle"], "polygon", epsilon=epsilon)
+        out.append(item)
+    return out